@@ -1,4 +1,6 @@
-from cyrasterize.base import CyRasterizer
+from cyrasterize.base import CyRasterizer, interpolate_barycentric
+from cyrasterize.cpu import CPURasterizer
+from cyrasterize.pool import RasterizerPool
 from .shader import FragmentShader, VertexShader
 
 from ._version import get_versions
@@ -1,6 +1,13 @@
+import zlib
 import numpy as np
 from functools import partial
-from .shader import FragmentShader, GeometryShader, VertexShader
+from .normals import (DEFAULT_NORMALS_CACHE_SIZE, NormalsCache,
+                      vertex_normals)
+
+
+# the images that can be requested from a rasterization
+OUTPUTS = ('rgb', 'f3v', 'mask', 'depth')
+DEFAULT_OUTPUTS = ('rgb', 'f3v', 'mask')
 
 
 class CyUniformBase(object):
@@ -56,6 +63,77 @@ class CyRasterizerBase(object):
     verbose : `bool`, optional
         If ``True``, print information about setting up the rendering buffer.
         Error information is always printed.
+    texture_cache_bytes : `int`, optional
+        The budget (in bytes) of the GPU texture cache. Textures rendered
+        with a ``texture_key`` are kept resident on the GPU between renders
+        and evicted in least recently used order once the budget is
+        exceeded. ``0`` disables the cache.
+
+        Default None - the rasterizer's default budget (256MB) is used.
+    texture_filter : {'nearest', 'linear', 'mipmap'}, optional
+        How textures are filtered when sampled. See
+        :meth:`set_texture_sampling`.
+    texture_wrap : {'clamp', 'repeat'}, optional
+        How texture coordinates outside of [0, 1] are handled. See
+        :meth:`set_texture_sampling`.
+    rgb_dtype : {np.float32, np.float16, np.uint8}, optional
+        The dtype of the colour framebuffer and so of the rgb images
+        returned. uint8 images are in the range [0, 255] and cost a quarter
+        of the float32 readback.
+
+        Default np.float32.
+    backend : {'glfw', 'egl', 'osmesa'}, optional
+        How the OpenGL context is created. 'glfw' uses a hidden window and so
+        needs a display server (e.g. Xvfb on headless machines). 'egl' makes
+        a headless context directly on the GPU driver (or on Mesa's llvmpipe
+        on CPU-only machines) and 'osmesa' renders in software with Mesa.
+        Both of these have to be enabled when building cyrasterize, by
+        setting ``CYRASTERIZE_EGL=1`` or ``CYRASTERIZE_OSMESA=1``.
+
+        Default 'glfw'.
+    profile : `bool`, optional
+        If ``True``, gather timings of each stage of rendering from the
+        start. See :meth:`set_profiling`.
+    normals_cache_size : `int`, optional
+        The number of meshes whose computed vertex normals are kept, so that
+        rendering the same ``(points, trilist)`` arrays again doesn't
+        recompute them. Meshes are identified by the address, shape and
+        dtype of their arrays and a sample of their values, so most changes
+        made to points in place go unnoticed - call
+        :meth:`clear_normals_cache` after making any.
+
+        Default 0 - normals are computed on every render.
+    program_cache_dir : `str`, optional
+        A directory to save the binaries of the linked shader programs in,
+        and to load them from in later processes rather than compiling the
+        shaders again. Ignored where the driver doesn't support program
+        binaries.
+
+        Default None - programs are only cached in memory.
+    camera_block : `bool`, optional
+        If ``True``, the default vertex shader takes the model, view and
+        projection matrices from a ``Camera`` uniform block, so that all
+        three are uploaded with one buffer write when they change. Custom
+        shaders can opt in the same way by declaring the block (see
+        ``shaders/blinnphong_camera.vert``).
+
+        Default ``False``.
+    gpu_normals : `bool`, optional
+        If ``True``, vertex normals that aren't given are computed on the GPU
+        (see :meth:`GLScene.compute_normals`) rather than on the CPU and
+        cached. This is the faster choice for meshes whose points change
+        every frame, e.g. in fitting loops, as nothing is cached and no
+        normals are uploaded.
+
+        Default ``False``.
+    alpha_mask : `bool`, optional
+        If ``True``, the mask is taken from the alpha channel of the colour
+        framebuffer whenever the rgb image is also requested, for shaders
+        that mark pixels as background through their alpha. The colour is
+        then read as RGBA and the rgb image copied out of it.
+
+        Default ``False`` - the mask is where the depth buffer was drawn to,
+        and the colour is read straight into the rgb image.
 
     Notes
     -----
@@ -95,12 +173,41 @@ class CyRasterizerBase(object):
     """
 
     def __init__(self, width=1024, height=768, model_matrix=None,
-                 view_matrix=None, projection_matrix=None, verbose=False):
+                 view_matrix=None, projection_matrix=None, verbose=False,
+                 texture_cache_bytes=None, texture_filter='nearest',
+                 texture_wrap='clamp', rgb_dtype=np.float32, backend='glfw',
+                 profile=False, normals_cache_size=DEFAULT_NORMALS_CACHE_SIZE,
+                 gpu_normals=False, program_cache_dir=None,
+                 camera_block=False, alpha_mask=False):
         # delay import so we only check for GL setup at first initialization
-        from .glrasterizer import GLRasterizer
-        self._opengl = GLRasterizer(width, height, verbose=int(verbose))
+        from .glrasterizer import GLRasterizer, CAMERA_VERTEX_SHADER_SRC
+        self._opengl = GLRasterizer(width, height, verbose=int(verbose),
+                                    rgb_dtype=rgb_dtype, backend=backend,
+                                    program_cache_dir=program_cache_dir)
         if not self._opengl.successfully_initialized():
             raise RuntimeError("Failed to initialize CyRasterizer")
+        if camera_block:
+            self._opengl.set_shader_sources(vertex=CAMERA_VERTEX_SHADER_SRC)
+        if texture_cache_bytes is not None:
+            self._opengl.texture_cache.resize(texture_cache_bytes)
+        self.set_texture_sampling(filter=texture_filter, wrap=texture_wrap)
+        if profile:
+            self.set_profiling(True)
+        self._normals_cache = NormalsCache(normals_cache_size)
+        self.gpu_normals = gpu_normals
+        # the mesh that arrays are rasterized from when their normals are
+        # computed on the GPU, and its triangles - kept so that rasterizing
+        # the same topology again only uploads the vertex data
+        self._gpu_normals_mesh = None
+        self._gpu_normals_trilist = None
+        self._alpha_mask = alpha_mask
+        # (rgb, f3v, depth, alpha) - which framebuffers OpenGL is
+        # writing/reading, and whether the colour is read with its alpha
+        self._gl_outputs = (True, True, False, False)
+        # the RGBA or depth framebuffer a mask is computed from when it isn't
+        # returned itself
+        self._mask_rgba = None
+        self._mask_depth = None
         if model_matrix is not None:
             self.set_model_matrix(model_matrix)
         if view_matrix is not None:
@@ -118,6 +225,14 @@ class CyRasterizerBase(object):
     def height(self):
         return self._opengl.get_height()
 
+    @property
+    def rgb_dtype(self):
+        return self._opengl.rgb_dtype
+
+    @property
+    def backend(self):
+        return self._opengl.backend
+
     @property
     def model_matrix(self):
         return self._opengl.get_model_matrix()
@@ -131,15 +246,14 @@ class CyRasterizerBase(object):
         return self._opengl.get_projection_matrix()
 
     def set_shaders(self, geometry=None, vertex=None, fragment=None, use_last_uniforms=True):
-
-        self._opengl.attach_shaders(
-            [c(x) for x, c in
-                zip(
-                    (geometry, vertex, fragment),
-                    (GeometryShader, VertexShader, FragmentShader)
-                ) if x is not None
-             ]
-        )
+        r"""Replaces the given shaders (sources) of the program. Each set of
+        shaders is only compiled and linked once per rasterizer (or loaded
+        from ``program_cache_dir``), so switching between a few sets is
+        cheap.
+        """
+        self._opengl.set_shader_sources(vertex=vertex, fragment=fragment,
+                                        geometry=geometry,
+                                        use_last_uniforms=use_last_uniforms)
 
         self.uniforms = CyUniformBase(self._opengl)
 
@@ -152,6 +266,60 @@ class CyRasterizerBase(object):
         else:
             self._opengl.reset_view()
 
+    @property
+    def program(self):
+        r"""The name of the program in use - ``'default'`` unless another
+        has been selected with :meth:`use_program`.
+        """
+        return self._opengl.program_name
+
+    def add_program(self, name, vertex=None, fragment=None, geometry=None):
+        r"""Sets up a named program that can be switched to (with
+        :meth:`use_program` or ``rasterize(..., program=name)``) for the
+        cost of a ``glUseProgram``, e.g. to alternate between a textured and
+        a shaded pass.
+
+        Parameters
+        ----------
+        name : `str`
+            The name of the program.
+        vertex, fragment, geometry : `str`, optional
+            The sources of the program's shaders.
+
+            Default None - the shader of the program in use.
+
+        Each program keeps its own uniform values, starting from those of
+        the program in use. :meth:`set_shaders` and the uniform setters only
+        affect the program in use.
+        """
+        self._opengl.add_program(name, vertex=vertex, fragment=fragment,
+                                 geometry=geometry)
+
+    def use_program(self, name):
+        r"""Selects the named program (see :meth:`add_program`) for all
+        subsequent rendering.
+        """
+        if name != self._opengl.program_name:
+            self._opengl.use_program(name)
+            self.uniforms = CyUniformBase(self._opengl)
+
+    def set_texture_sampling(self, filter='nearest', wrap='clamp'):
+        r"""Sets how textures are sampled in subsequent rasterizations.
+
+        The OpenGL samplers are built once and reused for every render.
+
+        Parameters
+        ----------
+        filter : {'nearest', 'linear', 'mipmap'}, optional
+            'nearest' returns the closest texel, 'linear' bilinearly
+            interpolates texels and 'mipmap' uses trilinear filtering across
+            mipmaps (which are built the first time a texture is used).
+        wrap : {'clamp', 'repeat'}, optional
+            Whether texture coordinates outside of [0, 1] are clamped to the
+            edge of the texture or repeat it.
+        """
+        self._opengl.set_texture_sampling(filter, wrap)
+
     # we don't use setters here as we want to be clear on when we give C a
     # new matrix (e.g. rasterizer.model_matrix[:, 2] = 2 would not be caught
     # by the setter)
@@ -167,8 +335,179 @@ class CyRasterizerBase(object):
         value = _verify_opengl_homogeneous_matrix(value)
         self._opengl.set_projection_matrix(value)
 
+    def set_camera(self, model=None, view=None, projection=None):
+        r"""Sets the model, view and projection matrices in one call, e.g.
+        once per frame. The matrices are checked and converted together and
+        all uploaded at the next rasterization.
+
+        Parameters
+        ----------
+        model, view, projection : ndarray, shape (4, 4), optional
+            The new matrices.
+
+            Default None - that matrix is left as it is.
+        """
+        self._opengl.set_camera(*_verify_opengl_homogeneous_matrices(
+            (model, view, projection)))
+
+    def _texture(self, texture, texture_key=None):
+        r"""Returns the texture as uploaded to the GPU. Textures with a key
+        are only uploaded if they are not already in the texture cache.
+
+        Parameters
+        ----------
+        texture: ndarray, shape (texture_width, texture_height, 3)
+            An RGB texture - a floating point image (pixel values in range
+            [0, 1]) or a uint8 image. uint8, float16 and float32 textures are
+            uploaded as they are, anything else as float32.
+        texture_key: hashable, optional
+            The key the texture is cached against.
+
+            Default None - the texture is uploaded afresh and not cached.
+
+        Returns
+        -------
+        texture : GLTexture
+            The uploaded texture.
+        """
+        cache = self._opengl.texture_cache
+        gl_texture = None if texture_key is None else cache.get(texture_key)
+        if gl_texture is None:
+            '''
+                We need to flipud the texture when passing it to OpenGL.
+                OpenGL's coordinate system maps textures down to up where
+                (0,0) is in the bottom left and (1,1) is in the top right.
+            '''
+            texture = np.asarray(texture)
+            dtype = (texture.dtype if texture.dtype.name in _PIXEL_DTYPES
+                     else np.float32)
+            texture = np.require(np.flipud(texture), dtype=dtype,
+                                 requirements='c')
+            gl_texture = self._opengl.upload_texture(texture)
+            # an uncached texture is freed once the render lets go of it
+            if texture_key is not None:
+                cache.insert(texture_key, gl_texture)
+        return gl_texture
+
+    def clear_texture_cache(self):
+        r"""Frees all the textures currently cached on the GPU."""
+        self._opengl.texture_cache.clear()
+
+    def _normals(self, points, trilist):
+        r"""The vertex normals of a mesh, only computed if they are not
+        already in the normals cache.
+
+        Parameters
+        ----------
+        points : ndarray, shape (n_points, 3)
+            The points of the mesh, as passed by the caller (the cache key is
+            taken from this array, not a converted copy of it).
+        trilist: ndarray, shape (n_tris, 3)
+            The connectivity of the mesh, as passed by the caller.
+
+        Returns
+        -------
+        normals : ndarray, shape (n_points, 3)
+            The float32 vertex normals.
+        """
+        if self._normals_cache.max_size == 0:
+            return vertex_normals(points, trilist)
+        key = (_array_fingerprint(points), _array_fingerprint(trilist))
+        return self._normals_cache.get(key, points, trilist)
+
+    def clear_normals_cache(self):
+        r"""Forgets all the vertex normals computed so far."""
+        self._normals_cache.clear()
+
+    def _set_outputs(self, outputs):
+        r"""Configures OpenGL to only draw to and read back the framebuffers
+        required for the requested outputs.
+
+        The mask is taken from the depth buffer, unless the rasterizer was
+        built with ``alpha_mask`` and the colour framebuffer is being read
+        anyway, in which case it is its alpha channel.
+
+        Parameters
+        ----------
+        outputs : iterable of {'rgb', 'f3v', 'mask', 'depth'}
+            The images requested.
+
+        Returns
+        -------
+        outputs : tuple of str
+            The validated outputs.
+        """
+        outputs = _verify_outputs(outputs)
+        rgb = 'rgb' in outputs
+        f3v = 'f3v' in outputs
+        alpha = self._alpha_mask and rgb and 'mask' in outputs
+        depth = 'depth' in outputs or ('mask' in outputs and not alpha)
+        if (rgb, f3v, depth, alpha) != self._gl_outputs:
+            self._opengl.set_outputs(rgb=rgb, f3v=f3v, depth=depth,
+                                     alpha=alpha)
+            self._gl_outputs = (rgb, f3v, depth, alpha)
+        return outputs
+
+    def _output_buffers(self, outputs, out, n_views=None):
+        r"""Splits the arrays provided by the caller for each output into
+        the ``(rgb, f3v, depth)`` framebuffers that OpenGL reads into and the
+        mask and rgb arrays that are built from them.
+
+        Parameters
+        ----------
+        outputs : tuple of str
+            The validated outputs.
+        out : sequence of (ndarray or None) or None
+            An array to write each output into, in the order of ``outputs``.
+        n_views : `int`, optional
+            The number of views stacked in each array, if any.
+
+        Returns
+        -------
+        framebuffers : tuple of (ndarray or None)
+            The ``(rgb, f3v, depth)`` arrays to read into. ``None`` entries
+            are allocated by the rasterizer.
+        mask : ndarray or None
+            The array to write the mask into.
+        rgb : ndarray or None
+            The array to copy the colour into, if it is read as RGBA.
+        """
+        buffers = _output_arrays(outputs, out)
+        rgb = buffers.get('rgb')
+        depth = buffers.get('depth')
+        mask = buffers.get('mask')
+        shape = (self.height, self.width)
+        if n_views is not None:
+            shape = (n_views,) + shape
+        if mask is not None:
+            mask = _output_array(mask, shape, bool)
+        if 'mask' not in outputs:
+            return (rgb, buffers.get('f3v'), depth), mask, None
+        if self._alpha_mask and 'rgb' in outputs:
+            # the mask is the alpha channel, so OpenGL reads RGBA pixels that
+            # the rgb image is copied out of
+            if rgb is not None:
+                rgb = _output_array(rgb, shape + (3,), self.rgb_dtype)
+            rgba = None
+            if n_views is None:
+                # only needed to build the images, so reuse the same scratch
+                # array every frame
+                if self._mask_rgba is None:
+                    self._mask_rgba = np.empty(shape + (4,),
+                                               dtype=self.rgb_dtype)
+                rgba = self._mask_rgba
+            return (rgba, buffers.get('f3v'), depth), mask, rgb
+        if 'depth' not in outputs and n_views is None:
+            # the depth buffer is only needed to build the mask, so reuse
+            # the same scratch array every frame
+            if self._mask_depth is None:
+                self._mask_depth = np.empty(shape, dtype=np.float32)
+            depth = self._mask_depth
+        return (rgb, buffers.get('f3v'), depth), mask, None
+
     def _rasterize(self, points, trilist, texture, tcoords,
-                   normals=None, per_vertex_f3v=None):
+                   normals=None, per_vertex_f3v=None, texture_key=None,
+                   outputs=DEFAULT_OUTPUTS, out=None):
         r"""Rasterizes a textured mesh along with some float interpolant data
         through OpenGL.
 
@@ -192,6 +531,23 @@ class CyRasterizerBase(object):
             and returned in the f3v image.
 
             Default None - points (shape information) used instead.
+        texture_key: hashable, optional
+            The key the texture is cached against on the GPU.
+
+            Default None - the texture is uploaded for this render only.
+        outputs: iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+            The images to return, in order. Framebuffers that are not needed
+            are neither drawn to nor read back from the GPU.
+
+            Default ('rgb', 'f3v', 'mask').
+        out: sequence of ndarray, optional
+            Preallocated (possibly memory mapped) arrays to write each of the
+            ``outputs`` into, with ``None`` for any that should be allocated.
+            The rgb (of :attr:`rgb_dtype`) and f3v (float32) images must be
+            C contiguous arrays of shape (height, width, 3), depth a float32
+            and mask a bool array of shape (height, width).
+
+            Default None - new arrays are returned.
 
         Returns
         -------
@@ -212,37 +568,387 @@ class CyRasterizerBase(object):
         mask : ndarray
             Mask showing what true values the rasterizer wrote to.
 
-        """
+        depth : ndarray
+            The window space depth ([0, 1]) of each pixel. Only returned if
+            requested in ``outputs``.
 
-        '''
-            We need to flipud the texture when passing it to OpenGL.
-            OpenGL's coordinate system maps textures down to up where (0,0)
-            is in the bottom left and (1,1) is in the top right.
-
-            When we retrieve back the pixels from the rasterizer we
-            flip them back to our coordinate system.
-        '''
+        """
 
+        if normals is None and self.gpu_normals:
+            # the normals are computed on the GPU as the mesh is uploaded
+            mesh = self._gpu_normals_mesh_of(points, trilist, tcoords,
+                                             per_vertex_f3v=per_vertex_f3v)
+            return self._rasterize_mesh(mesh, texture,
+                                        texture_key=texture_key,
+                                        outputs=outputs, out=out)
+
+        outputs = self._set_outputs(outputs)
+        framebuffers, mask, rgb = self._output_buffers(outputs, out)
+        if normals is None:
+            normals = self._normals(points, trilist)
+        normals = np.require(normals, dtype=np.float32, requirements='c')
         points = np.require(points, dtype=np.float32, requirements='c')
         trilist = np.require(trilist, dtype=np.uint32, requirements='c')
-        texture = np.require(np.flipud(texture), dtype=np.float32, requirements='c')
+        texture = self._texture(texture, texture_key=texture_key)
         tcoords = np.require(tcoords, dtype=np.float32, requirements='c')
+
+        if per_vertex_f3v is None:
+            per_vertex_f3v = points
+        interp = np.require(per_vertex_f3v, dtype=np.float32, requirements='c')
+
+        framebuffers = self._opengl.render_offscreen_rgb_custom_vertex_normals(
+            points, normals, interp, trilist, tcoords, texture,
+            out=framebuffers)
+        return self._images(framebuffers, outputs, mask, rgb)
+
+    def _gpu_normals_mesh_of(self, points, trilist, tcoords,
+                             per_vertex_f3v=None):
+        r"""The mesh to rasterize the given arrays from when their normals
+        are computed on the GPU. The mesh of the previous call is updated in
+        place if it has the same triangles, rather than a new one being
+        uploaded.
+        """
+        points = np.asarray(points)
+        trilist = np.require(trilist, dtype=np.uint32, requirements='c')
+        mesh = self._gpu_normals_mesh
+        if (mesh is not None and mesh.is_uploaded() and
+                mesh.n_points == points.shape[0] and
+                np.array_equal(self._gpu_normals_trilist, trilist)):
+            if per_vertex_f3v is None:
+                per_vertex_f3v = points
+            mesh.update(points=points, f3v_data=per_vertex_f3v,
+                        tcoords=tcoords)
+            return mesh
+        if mesh is not None:
+            mesh.free()
+        self._gpu_normals_mesh = self.upload_mesh(
+            points, trilist, tcoords, per_vertex_f3v=per_vertex_f3v)
+        self._gpu_normals_trilist = trilist.copy()
+        return self._gpu_normals_mesh
+
+    def _images(self, framebuffers, outputs, mask, rgb):
+        # builds the outputs from the framebuffers, timed if profiling
+        render_stats = self._opengl.render_stats
+        if render_stats is None:
+            return _framebuffers_to_images(*framebuffers, outputs=outputs,
+                                           mask=mask, rgb=rgb)
+        with render_stats.time('postprocess'):
+            return _framebuffers_to_images(*framebuffers, outputs=outputs,
+                                           mask=mask, rgb=rgb)
+
+    def upload_mesh(self, points, trilist, tcoords, normals=None,
+                    per_vertex_f3v=None):
+        r"""Uploads the geometry of a mesh to the GPU so that it can be
+        rasterized many times (e.g. under different camera matrices) without
+        being sent to OpenGL again.
+
+        Parameters
+        ----------
+        points : ndarray, shape (n_points, 3)
+            The coordinates of points that need to be rasterized
+        trilist: ndarray, shape (n_tris, 3)
+            The connectivity information of the triangulation
+        tcoords: ndarray, shape (n_points, 2)
+            Per vertex texture coordinates given in the normalized range [0, 1]
+        normals: ndarray, shape (n_points, 3), optional
+            A matrix specifying custom per-vertex normals.
+
+            Default None - vertex normals will be computed from the topology
+            (on the GPU if :attr:`gpu_normals` is set).
+        per_vertex_f3v: ndarray, shape (n_points, 3), optional
+            A matrix specifying arbitrary 3 floating point numbers per
+            vertex.
+
+            Default None - points (shape information) used instead.
+
+        Returns
+        -------
+        mesh : GLMesh
+            A handle to the mesh on the GPU. The buffers are released when
+            ``mesh.free()`` is called or the handle is garbage collected.
+            Per-vertex data that changes (e.g. the points of a deforming
+            mesh) can be replaced with ``mesh.update(points=...)``, which
+            only uploads the arrays given.
+        """
+        if normals is None and not self.gpu_normals:
+            normals = self._normals(points, trilist)
         if normals is not None:
             normals = np.require(normals, dtype=np.float32, requirements='c')
+        points = np.require(points, dtype=np.float32, requirements='c')
+        trilist = np.require(trilist, dtype=np.uint32, requirements='c')
+        tcoords = np.require(tcoords, dtype=np.float32, requirements='c')
 
         if per_vertex_f3v is None:
             per_vertex_f3v = points
         interp = np.require(per_vertex_f3v, dtype=np.float32, requirements='c')
 
-        if normals is not None:
-            # Custom normals - use the special function call that allows us to customize
-            rgb_fb, f3v_fb = self._opengl.render_offscreen_rgb_custom_vertex_normals(
-                points, normals, interp, trilist, tcoords, texture)
-        else:
-            rgb_fb, f3v_fb = self._opengl.render_offscreen_rgb(
-                points, interp, trilist, tcoords, texture)
-        mask = rgb_fb[..., 3].astype(np.bool)
-        return np.flipud(rgb_fb[..., :3]).copy(), np.flipud(f3v_fb), np.flipud(mask)
+        return self._opengl.upload_mesh(points, normals, interp, trilist,
+                                        tcoords, gpu_normals=self.gpu_normals)
+
+    def _rasterize_mesh(self, mesh, texture, texture_key=None,
+                        outputs=DEFAULT_OUTPUTS, out=None):
+        r"""Rasterizes a mesh previously uploaded with :meth:`upload_mesh`.
+
+        Parameters
+        ----------
+        mesh : GLMesh
+            The uploaded mesh handle
+        texture: ndarray, shape (texture_width, texture_height, 3)
+            An RGB texture floating point image (pixel values in range [0, 1]
+        texture_key: hashable, optional
+            The key the texture is cached against on the GPU.
+
+            Default None - the texture is uploaded for this render only.
+        outputs: iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+            The images to return, in order.
+
+            Default ('rgb', 'f3v', 'mask').
+        out: sequence of ndarray, optional
+            Preallocated arrays to write the outputs into, as for
+            :meth:`_rasterize`.
+
+        Returns
+        -------
+        images : tuple of ndarray
+            As for :meth:`_rasterize`
+        """
+        outputs = self._set_outputs(outputs)
+        framebuffers, mask, rgb = self._output_buffers(outputs, out)
+        texture = self._texture(texture, texture_key=texture_key)
+        framebuffers = self._opengl.render_offscreen_rgb_mesh(
+            mesh, texture, out=framebuffers)
+        return self._images(framebuffers, outputs, mask, rgb)
+
+    def _rasterize_barycentric(self, points, trilist=None, out=None):
+        r"""Rasterizes the index of the triangle covering each pixel and the
+        barycentric coordinates of the pixel within it.
+
+        Parameters
+        ----------
+        points : ndarray, shape (n_points, 3) or GLMesh
+            The coordinates of the points, or a mesh returned by
+            :meth:`upload_mesh`.
+        trilist : ndarray, shape (n_tris, 3), optional
+            The connectivity of the triangulation (if points are given).
+        out : (ndarray, ndarray), optional
+            Preallocated int32 (height, width) and float32
+            (height, width, 3) arrays to write into.
+
+        Returns
+        -------
+        triangle_index : ndarray, shape (height, width)
+            The index into trilist of the triangle at each pixel, -1 where
+            there is none.
+        barycentric : ndarray, shape (height, width, 3)
+            The barycentric coordinates within that triangle.
+        """
+        if trilist is None:
+            return self._opengl.render_barycentric(points, out=out)
+        # the barycentric shaders only read the positions, so only they and
+        # the triangles are uploaded
+        points = np.require(points, dtype=np.float32, requirements='c')
+        trilist = np.require(trilist, dtype=np.uint32, requirements='c')
+        mesh = self._opengl.upload_mesh(points, None, None, trilist, None,
+                                        with_normals=False)
+        try:
+            return self._opengl.render_barycentric(mesh, out=out)
+        finally:
+            mesh.free()
+
+    def _rasterize_async(self, mesh, texture, texture_key=None,
+                         outputs=DEFAULT_OUTPUTS):
+        r"""Submits the rasterization of a mesh previously uploaded with
+        :meth:`upload_mesh` and returns without waiting for the result.
+
+        Parameters
+        ----------
+        mesh : GLMesh
+            The uploaded mesh handle
+        texture: ndarray, shape (texture_width, texture_height, 3)
+            An RGB texture floating point image (pixel values in range [0, 1]
+        texture_key: hashable, optional
+            The key the texture is cached against on the GPU.
+
+            Default None - the texture is uploaded for this render only.
+        outputs: iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+            The images to return, in order.
+
+            Default ('rgb', 'f3v', 'mask').
+
+        Returns
+        -------
+        future : RasterizationFuture
+            A handle whose ``result()`` is the tuple of images requested in
+            ``outputs``.
+        """
+        outputs = self._set_outputs(outputs)
+        texture = self._texture(texture, texture_key=texture_key)
+        readback = self._opengl.render_offscreen_rgb_async(mesh, texture)
+        return RasterizationFuture(readback, outputs=outputs)
+
+    def _rasterize_views(self, mesh, view_matrices, texture,
+                         projection_matrices=None, texture_key=None,
+                         outputs=DEFAULT_OUTPUTS, out=None, layered=False):
+        r"""Rasterizes a mesh previously uploaded with :meth:`upload_mesh`
+        under many view (and optionally projection) matrices in one call.
+
+        Parameters
+        ----------
+        mesh : GLMesh
+            The uploaded mesh handle
+        view_matrices : ndarray, shape (n_views, 4, 4)
+            The view matrix of each rendering
+        texture: ndarray, shape (texture_width, texture_height, 3)
+            An RGB texture image
+        projection_matrices : ndarray, shape (n_views, 4, 4), optional
+            The projection matrix of each rendering.
+
+            Default None - the current projection matrix is used throughout.
+        texture_key: hashable, optional
+            The key the texture is cached against on the GPU.
+
+            Default None - the texture is uploaded for this render only.
+        outputs: iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+            The images to return, in order.
+
+            Default ('rgb', 'f3v', 'mask').
+        out: sequence of ndarray, optional
+            Preallocated arrays to write the outputs into, as for
+            :meth:`_rasterize` but with a leading n_views axis.
+        layered: `bool`, optional
+            If ``True``, render batches of views with a single instanced draw
+            into a layered framebuffer.
+
+        Returns
+        -------
+        images : tuple of ndarray
+            As for :meth:`_rasterize`, stacked to shape (n_views, height,
+            width, ...).
+        """
+        view_matrices = np.require(view_matrices, dtype=np.float32,
+                                   requirements='C')
+        if view_matrices.ndim != 3 or view_matrices.shape[1:] != (4, 4):
+            raise ValueError('view_matrices must have shape (n_views, 4, 4)')
+        n_views = view_matrices.shape[0]
+        if projection_matrices is not None:
+            projection_matrices = np.require(projection_matrices,
+                                             dtype=np.float32,
+                                             requirements='C')
+            if projection_matrices.shape != view_matrices.shape:
+                raise ValueError('projection_matrices must have shape '
+                                 '{}'.format(view_matrices.shape))
+        outputs = self._set_outputs(outputs)
+        framebuffers, mask, rgb = self._output_buffers(outputs, out,
+                                                       n_views=n_views)
+        texture = self._texture(texture, texture_key=texture_key)
+        framebuffers = self._opengl.render_views(
+            mesh, texture, view_matrices,
+            projection_matrices=projection_matrices, out=framebuffers,
+            layered=layered)
+        return self._images(framebuffers, outputs, mask, rgb)
+
+    def set_readback_buffers(self, n_buffers):
+        r"""Sets how many asynchronous rasterizations can be in flight at
+        once. Submitting more than this waits on the oldest one.
+
+        Parameters
+        ----------
+        n_buffers : `int`
+            The number of pixel buffer pairs in the readback ring (default 2).
+        """
+        self._opengl.set_readback_buffers(n_buffers)
+
+    def set_profiling(self, enabled=True):
+        r"""Starts (or stops) gathering the time taken by each stage of
+        rendering, and the bytes transferred to and from the GPU.
+
+        Mesh and texture uploads, readbacks and the building of the output
+        images are timed by the wall clock, and draws on the GPU by timer
+        queries (so that only the GPU's own work is counted). Profiling adds
+        little overhead, but is off by default.
+
+        Parameters
+        ----------
+        enabled : `bool`, optional
+            Whether to profile subsequent rendering. Stopping discards
+            everything gathered so far.
+        """
+        self._opengl.set_profiling(enabled)
+
+    def stats(self):
+        r"""The timings and transfer volumes gathered since profiling was
+        enabled (or the stats were last reset).
+
+        Returns
+        -------
+        stats : `dict`
+            ``'stages'`` maps each of ``'upload_mesh'``, ``'upload_texture'``,
+            ``'draw'``, ``'readback'`` and ``'postprocess'`` to a `dict` of
+            the ``'count'``, ``'total'``, ``'mean'``, ``'min'`` and ``'max'``
+            seconds taken, along with a ``'histogram'`` of ``(upper_bound,
+            count)`` pairs. ``'bytes_uploaded'`` and ``'bytes_read_back'``
+            count the data transferred.
+
+        Raises
+        ------
+        RuntimeError
+            If profiling is not enabled.
+        """
+        render_stats = self._opengl.stats()
+        if render_stats is None:
+            raise RuntimeError('Profiling is not enabled - see set_profiling')
+        return render_stats.summary()
+
+    def reset_stats(self):
+        r"""Forgets the stats gathered so far, if profiling."""
+        render_stats = self._opengl.stats()
+        if render_stats is not None:
+            render_stats.reset()
+
+    def make_current(self):
+        r"""Makes this rasterizer's OpenGL context current on the calling
+        thread. A rasterizer can only be used from the thread its context is
+        current on - which to begin with is the thread that built it.
+        """
+        self._opengl.make_current()
+
+    def release_current(self):
+        r"""Releases this rasterizer's OpenGL context from the calling
+        thread, so it can be made current on another.
+        """
+        self._opengl.release_current()
+
+
+class RasterizationFuture(object):
+    r"""The result of an asynchronous rasterization.
+
+    The framebuffers are transferred from the GPU in the background. Calling
+    :meth:`result` waits for the transfer (if it has not already finished)
+    and returns the images.
+
+    Parameters
+    ----------
+    readback : GLReadback
+        The low level readback handle
+    outputs : tuple of str, optional
+        The images to build from the framebuffers.
+    """
+    def __init__(self, readback, outputs=DEFAULT_OUTPUTS):
+        self._readback = readback
+        self._outputs = outputs
+        self._images = None
+
+    def done(self):
+        r"""``True`` if :meth:`result` can return without waiting."""
+        return self._images is not None or self._readback.done()
+
+    def result(self):
+        r"""The images, as returned by :meth:`CyRasterizer.rasterize`."""
+        if self._images is None:
+            self._images = _framebuffers_to_images(*self._readback.result(),
+                                                   outputs=self._outputs)
+            self._readback = None
+        return self._images
 
 
 # Maintain a subclass here to allow other subclasses of CyRasterizerBase that
@@ -250,20 +956,27 @@ class CyRasterizerBase(object):
 # rasterize() in a more intelligent manor in Menpo)
 class CyRasterizer(CyRasterizerBase):
 
-    def rasterize(self, points, trilist, texture, tcoords, per_vertex_f3v=None):
+    def rasterize(self, points, trilist=None, texture=None, tcoords=None,
+                  per_vertex_f3v=None, texture_key=None,
+                  outputs=DEFAULT_OUTPUTS, out=None, program=None, model=None,
+                  view=None, projection=None):
         r"""Rasterizes a textured mesh along with some float interpolant data
         through OpenGL.
 
         Parameters
         ----------
-        points : ndarray, shape (n_points, 3)
-            The coordinates of points that need to be rasterized
+        points : ndarray, shape (n_points, 3) or GLMesh
+            The coordinates of points that need to be rasterized, or a mesh
+            previously returned by :meth:`upload_mesh`. In the latter case
+            only ``texture`` should be provided.
 
         trilist: ndarray, shape (n_tris, 3)
             The connectivity information of the triangulation
 
         texture: ndarray, shape (texture_width, texture_height, 3)
             An RGB texture floating point image (pixel values in range [0, 1]
+            or uint8 image. uint8, float16 and float32 textures are sent to
+            OpenGL as they are - 8-bit textures upload 4 times faster.
 
         tcoords: ndarray, shape (n_points, 2)
             Per vertex texture coordinates given in the normalized range [0, 1]
@@ -275,6 +988,44 @@ class CyRasterizer(CyRasterizerBase):
 
             Default None - points (shape information) used instead.
 
+        texture_key: hashable, optional
+            The key the texture is cached against on the GPU. Rendering
+            again with the same key reuses the uploaded texture, so a
+            texture that is modified in place needs a new key.
+
+            Default None - the texture is uploaded for this render only.
+
+        outputs: iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+            The images to return, in the order given. Only the framebuffers
+            needed for these are drawn to and transferred back from the GPU,
+            so e.g. ``outputs=('mask',)`` reads a quarter of the data that
+            the colour framebuffer alone would need.
+
+            Default ('rgb', 'f3v', 'mask').
+
+        out: sequence of ndarray, optional
+            Preallocated (e.g. memory mapped) arrays that each of the
+            ``outputs`` is written straight into, avoiding any per-frame
+            allocation, e.g. ``out=(rgb, f3v, mask)`` for the default
+            outputs. Entries may be ``None`` to have that image allocated.
+            rgb (of :attr:`rgb_dtype`) and f3v (float32) must be C contiguous
+            arrays of shape (height, width, 3), depth a float32 and mask a
+            bool array of shape (height, width). The arrays passed are the ones returned.
+
+            Default None - new arrays are returned.
+
+        program: `str`, optional
+            The name of the program to render with (see
+            :meth:`add_program`). It stays in use afterwards.
+
+            Default None - the program in use.
+
+        model, view, projection: ndarray, shape (4, 4), optional
+            New model, view and projection matrices to render with, set
+            together as by :meth:`set_camera`. They stay set afterwards.
+
+            Default None - the matrices already set.
+
         Returns
         -------
         rgb_image : ndarray
@@ -294,12 +1045,300 @@ class CyRasterizer(CyRasterizerBase):
         mask : ndarray
             Mask showing what true values the rasterizer wrote to.
 
+        depth : ndarray
+            The window space depth ([0, 1]) of each pixel.
+
+        Only the images named in ``outputs`` are returned.
+
         """
+        if texture is None:
+            raise ValueError('A texture must be provided')
+        if program is not None:
+            self.use_program(program)
+        if model is not None or view is not None or projection is not None:
+            self.set_camera(model=model, view=view, projection=projection)
+        if trilist is None:
+            # points is a mesh that has already been uploaded
+            return self._rasterize_mesh(points, texture,
+                                        texture_key=texture_key,
+                                        outputs=outputs, out=out)
         return self._rasterize(points, trilist, texture, tcoords,
-                               per_vertex_f3v=per_vertex_f3v)
+                               per_vertex_f3v=per_vertex_f3v,
+                               texture_key=texture_key, outputs=outputs,
+                               out=out)
+
+    def rasterize_views(self, mesh, view_matrices, texture=None,
+                        projection_matrices=None, texture_key=None,
+                        outputs=DEFAULT_OUTPUTS, out=None, layered=False):
+        r"""Rasterizes a mesh from many viewpoints at once.
+
+        The mesh is uploaded once (see :meth:`upload_mesh`) and each view
+        then costs only a uniform update, a draw and a readback straight into
+        its slice of the stacked output arrays - there is no Python or
+        OpenGL setup per view. The model matrix and the view and projection
+        matrices set on the rasterizer are left unchanged.
+
+        Parameters
+        ----------
+        mesh : GLMesh
+            A mesh returned by :meth:`upload_mesh`.
+
+        view_matrices : ndarray, shape (n_views, 4, 4)
+            The view matrix of each rendering.
+
+        texture: ndarray, shape (texture_width, texture_height, 3)
+            An RGB texture image, as for :meth:`rasterize`.
+
+        projection_matrices : ndarray, shape (n_views, 4, 4), optional
+            The projection matrix of each rendering.
+
+            Default None - the current projection matrix is used for every
+            view.
+
+        texture_key: hashable, optional
+            The key the texture is cached against on the GPU.
+
+        outputs: iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+            The images to return, in the order given.
+
+            Default ('rgb', 'f3v', 'mask').
+
+        out: sequence of ndarray, optional
+            Preallocated arrays to write each output into, as for
+            :meth:`rasterize` but with a leading n_views axis.
+
+        layered: `bool`, optional
+            If ``True``, up to 128 views at a time are drawn by one instanced
+            draw call into the layers of a layered framebuffer and read back
+            together. The attached fragment shader must accept the outputs of
+            the default vertex shader (``blinnphong.vert``), as the views are
+            transformed by a dedicated instanced vertex shader.
+
+            Default False - each view is drawn and read back in turn.
+
+        Returns
+        -------
+        images : tuple of ndarray
+            The images of :meth:`rasterize` for every view, stacked to shape
+            (n_views, height, width, 3) for rgb and f3v and
+            (n_views, height, width) for mask and depth.
+        """
+        if texture is None:
+            raise ValueError('A texture must be provided')
+        return self._rasterize_views(mesh, view_matrices, texture,
+                                     projection_matrices=projection_matrices,
+                                     texture_key=texture_key,
+                                     outputs=outputs, out=out,
+                                     layered=layered)
+
+    def rasterize_barycentric(self, points, trilist=None, out=None):
+        r"""Rasterizes which triangle covers each pixel, and where.
+
+        Rather than rendering each per-vertex attribute of interest (as the
+        f3v image of :meth:`rasterize`) the index of the triangle and the
+        pixel's barycentric coordinates within it are rendered once, after
+        which any per-vertex data can be interpolated on the CPU with
+        :func:`interpolate_barycentric`. No texture is needed.
+
+        Parameters
+        ----------
+        points : ndarray, shape (n_points, 3) or GLMesh
+            The coordinates of points that need to be rasterized, or a mesh
+            previously returned by :meth:`upload_mesh`.
+
+        trilist: ndarray, shape (n_tris, 3), optional
+            The connectivity information of the triangulation. Not needed
+            for an uploaded mesh.
+
+        out: (ndarray, ndarray), optional
+            Preallocated C contiguous arrays to write the images straight
+            into - int32 of shape (height, width) and float32 of shape
+            (height, width, 3).
+
+            Default None - new arrays are returned.
+
+        Returns
+        -------
+        triangle_index : ndarray, shape (height, width)
+            The index into ``trilist`` of the triangle rasterized at each
+            pixel, or -1 where there is none.
+
+        barycentric : ndarray, shape (height, width, 3)
+            The (perspective correct) weights of the triangle's three
+            vertices at each pixel, so that for any per-vertex data ``x``
+            the interpolated value is
+            ``(x[trilist[triangle_index]] * barycentric[..., None]).sum(-2)``.
+            0 where no triangle was rasterized.
+        """
+        return self._rasterize_barycentric(points, trilist=trilist, out=out)
+
+    def rasterize_async(self, points, trilist=None, texture=None,
+                        tcoords=None, per_vertex_f3v=None, texture_key=None,
+                        outputs=DEFAULT_OUTPUTS):
+        r"""Submits a rasterization and returns straight away with a future.
+
+        The arguments are those of :meth:`rasterize` (bar ``out``). While the frame
+        is being transferred back from the GPU the next one can be submitted
+        (see :meth:`set_readback_buffers`), overlapping drawing, transfer and
+        any Python post-processing, e.g.::
+
+            futures = [r.rasterize_async(mesh, texture=t) for t in textures]
+            images = [f.result() for f in futures]
+
+        Returns
+        -------
+        future : RasterizationFuture
+            ``future.result()`` returns the images of :meth:`rasterize`,
+            waiting if required.
+        """
+        if texture is None:
+            raise ValueError('A texture must be provided')
+        if trilist is None:
+            return self._rasterize_async(points, texture,
+                                         texture_key=texture_key,
+                                         outputs=outputs)
+        mesh = self.upload_mesh(points, trilist, tcoords,
+                                per_vertex_f3v=per_vertex_f3v)
+        try:
+            return self._rasterize_async(mesh, texture,
+                                         texture_key=texture_key,
+                                         outputs=outputs)
+        finally:
+            # OpenGL keeps the buffers alive until the queued draw is done
+            mesh.free()
+
+
+# the texture dtypes OpenGL is given as they are (see glrasterizer)
+_PIXEL_DTYPES = ('uint8', 'float16', 'float32')
+
+# the number of elements sampled from an array to fingerprint its contents
+_N_FINGERPRINT_SAMPLES = 4096
+
+
+def interpolate_barycentric(per_vertex, trilist, triangle_index, barycentric):
+    r"""Interpolates per-vertex data across the image, given the output of
+    :meth:`CyRasterizer.rasterize_barycentric`. Any number of attributes can
+    be interpolated from a single rasterization this way.
+
+    Parameters
+    ----------
+    per_vertex : ndarray, shape (n_points, ...)
+        The data at each vertex of the mesh.
+    trilist : ndarray, shape (n_tris, 3)
+        The connectivity of the mesh that was rasterized.
+    triangle_index : ndarray, shape (height, width)
+        The triangle at each pixel, -1 where there is none.
+    barycentric : ndarray, shape (height, width, 3)
+        The barycentric coordinates of each pixel.
+
+    Returns
+    -------
+    image : ndarray, shape (height, width, ...)
+        The interpolated data, 0 where no triangle was rasterized.
+    """
+    per_vertex = np.asarray(per_vertex)
+    trilist = np.asarray(trilist)
+    mask = triangle_index >= 0
+    image = np.zeros(triangle_index.shape + per_vertex.shape[1:],
+                     dtype=np.result_type(per_vertex, barycentric))
+    # (n_pixels, 3, ...) - the data at the three vertices of each pixel
+    corners = per_vertex[trilist[triangle_index[mask]]]
+    weights = barycentric[mask].reshape(barycentric[mask].shape +
+                                        (1,) * (per_vertex.ndim - 1))
+    image[mask] = (corners * weights).sum(axis=1)
+    return image
+
+
+def _array_fingerprint(array):
+    r"""A cheap key identifying an array (e.g. the points of a mesh).
+    Rather than hashing the whole (possibly very large) buffer we combine
+    the array's identity (data address, shape, strides and dtype) with a
+    checksum of an evenly spaced sample of its values.
+    """
+    array = np.asarray(array)
+    flat = array.ravel()
+    step = max(1, flat.size // _N_FINGERPRINT_SAMPLES)
+    return (array.__array_interface__['data'][0], array.shape,
+            array.strides, array.dtype.str,
+            zlib.crc32(flat[::step].tobytes()))
+
+
+def _framebuffers_to_images(rgb_fb, f3v_fb, depth_fb,
+                            outputs=DEFAULT_OUTPUTS, mask=None, rgb=None):
+    r"""Builds the requested outputs from the framebuffers, which are
+    already the right way up (they are flipped as they are read back).
+
+    The mask is the alpha channel of an RGBA colour framebuffer, whose
+    colour is copied into ``rgb`` (if given), or otherwise where the depth
+    buffer was drawn to. It is written into ``mask`` if given.
+    """
+    images = {'rgb': rgb_fb, 'f3v': f3v_fb, 'depth': depth_fb}
+    if rgb_fb is not None and rgb_fb.shape[-1] == 4:
+        if rgb is None:
+            rgb = np.empty(rgb_fb.shape[:-1] + (3,), dtype=rgb_fb.dtype)
+        np.copyto(rgb, rgb_fb[..., :3])
+        images['rgb'] = rgb
+        if 'mask' in outputs:
+            images['mask'] = np.not_equal(rgb_fb[..., 3], 0, out=mask)
+    elif 'mask' in outputs:
+        # nothing was drawn where the depth buffer is still cleared
+        images['mask'] = np.less(depth_fb, 1, out=mask)
+    return tuple(images[output] for output in outputs)
+
+
+def _verify_outputs(outputs):
+    r"""The requested ``outputs`` as a tuple, checking that each is one of
+    ``OUTPUTS``.
+    """
+    outputs = tuple(outputs)
+    if len(outputs) == 0:
+        raise ValueError('At least one output must be requested')
+    for output in outputs:
+        if output not in OUTPUTS:
+            raise ValueError('Unknown output {!r} - outputs must be in '
+                             '{}'.format(output, OUTPUTS))
+    return outputs
+
+
+def _output_arrays(outputs, out):
+    r"""The array (or ``None``) given in ``out`` for each of ``outputs``,
+    by output.
+    """
+    if out is None:
+        return {}
+    if len(out) != len(outputs):
+        raise ValueError('out must provide an array (or None) for each '
+                         'of the {} outputs'.format(len(outputs)))
+    return dict(zip(outputs, out))
+
+
+def _output_array(out, shape, dtype):
+    r"""Returns ``out``, checking that an image of ``shape`` and ``dtype``
+    can be written straight into it, or a new array if ``out`` is ``None``.
+    """
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if (out.shape != shape or out.dtype != dtype or
+            not out.flags.c_contiguous or not out.flags.writeable):
+        raise ValueError('Output arrays must be writeable, C contiguous '
+                         '{} arrays of shape {}'.format(np.dtype(dtype).name,
+                                                        shape))
+    return out
 
 
 def _verify_opengl_homogeneous_matrix(matrix):
     if matrix.shape != (4, 4):
         raise ValueError("OpenGL matrices must have shape (4,4)")
     return np.require(matrix, dtype=np.float32, requirements='C')
+
+
+def _verify_opengl_homogeneous_matrices(matrices):
+    # as _verify_opengl_homogeneous_matrix, with a single conversion for all
+    # of the matrices given. Those that are None stay None.
+    given = [m for m in matrices if m is not None]
+    if not given:
+        return tuple(matrices)
+    if any(np.shape(m) != (4, 4) for m in given):
+        raise ValueError("OpenGL matrices must have shape (4,4)")
+    stacked = iter(np.array(given, dtype=np.float32))
+    return tuple(None if m is None else next(stacked) for m in matrices)
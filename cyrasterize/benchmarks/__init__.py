@@ -0,0 +1,277 @@
+r"""Throughput benchmarks of :class:`CyRasterizer`.
+
+Each benchmark renders a synthetic mesh under one configuration (mesh size,
+framebuffer size, texture size and dtype, outputs, normals and number of
+views per call) and measures the frame rate, the upload and readback
+bandwidth (from the rasterizer's own profiling, see
+:meth:`CyRasterizer.stats`) and how much the resident memory of the process
+grows while it runs. Run them with ``python -m cyrasterize.benchmarks``,
+which prints JSON.
+"""
+import os
+import platform
+from timeit import default_timer
+
+import numpy as np
+
+# the configuration every sweep varies one parameter of
+BASELINE = {
+    'n_vertices': 10000,
+    'resolution': (512, 512),
+    'texture_size': 512,
+    'texture_dtype': 'uint8',
+    'outputs': ('rgb', 'f3v', 'mask'),
+    'custom_normals': False,
+    'n_views': 1
+}
+
+# the values each parameter is swept over
+SWEEPS = {
+    'n_vertices': (1000, 10000, 100000, 1000000),
+    'resolution': ((256, 256), (512, 512), (1024, 1024), (2048, 2048)),
+    'texture_size': (256, 1024, 4096),
+    'texture_dtype': ('uint8', 'float16', 'float32'),
+    'outputs': (('mask',), ('rgb',), ('rgb', 'f3v', 'mask'),
+                ('rgb', 'f3v', 'depth')),
+    'custom_normals': (False, True),
+    'n_views': (1, 8, 32)
+}
+
+# smaller sweeps for a fast check, e.g. on CI with a software renderer
+QUICK_SWEEPS = {
+    'n_vertices': (1000, 100000),
+    'resolution': ((256, 256), (1024, 1024)),
+    'texture_size': (256, 2048),
+    'texture_dtype': ('uint8', 'float32'),
+    'outputs': (('mask',), ('rgb', 'f3v', 'mask')),
+    'custom_normals': (False, True),
+    'n_views': (1, 8)
+}
+
+_MB = 1024.0 * 1024.0
+
+
+def synthetic_mesh(n_vertices, seed=0):
+    r"""A bumpy square grid mesh of about ``n_vertices`` points that fills
+    most of the default (identity matrices) view, facing the camera.
+
+    Parameters
+    ----------
+    n_vertices : `int`
+        The approximate number of vertices.
+    seed : `int`, optional
+        The seed of the random bumps.
+
+    Returns
+    -------
+    points : ndarray, shape (n_points, 3)
+    trilist : ndarray, shape (n_tris, 3)
+    tcoords : ndarray, shape (n_points, 2)
+    """
+    side = max(2, int(round(np.sqrt(n_vertices))))
+    u, v = np.meshgrid(np.linspace(0, 1, side), np.linspace(0, 1, side))
+    rng = np.random.RandomState(seed)
+    z = 0.1 * rng.uniform(-1, 1, size=u.shape)
+    points = np.stack([1.8 * u - 0.9, 1.8 * v - 0.9, z], axis=-1)
+    points = points.reshape(-1, 3).astype(np.float32)
+    tcoords = np.stack([u, v], axis=-1).reshape(-1, 2).astype(np.float32)
+    # two counter-clockwise (so front facing) triangles per grid square
+    corner = (np.arange(side - 1)[:, None] * side +
+              np.arange(side - 1)[None, :]).ravel()
+    a, b, c, d = corner, corner + 1, corner + side + 1, corner + side
+    trilist = np.concatenate([np.stack([a, b, c], axis=1),
+                              np.stack([c, d, a], axis=1)])
+    return points, trilist.astype(np.uint32), tcoords
+
+
+def synthetic_texture(size, dtype, seed=0):
+    r"""A random RGB texture of shape (size, size, 3) and ``dtype``, with
+    uint8 values in [0, 255] and float values in [0, 1].
+    """
+    rng = np.random.RandomState(seed)
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        return rng.randint(0, 256, size=(size, size, 3)).astype(np.uint8)
+    return rng.uniform(size=(size, size, 3)).astype(dtype)
+
+
+def rss_mb():
+    r"""The current resident set size of this process in MB, or ``None``
+    where it can't be measured (it is read from ``/proc/self/statm``).
+
+    Unlike the peak reported by ``getrusage``, which only ever grows over
+    the life of the process, this can be sampled before and after each
+    benchmark to see what that benchmark alone holds onto.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        page_size = os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+    return resident_pages * page_size / _MB
+
+
+def _rate(n_bytes, seconds):
+    return n_bytes / _MB / seconds if seconds > 0 else None
+
+
+def run_case(rasterizer, config, n_frames=10):
+    r"""Benchmarks one configuration on a rasterizer of its resolution.
+
+    Parameters
+    ----------
+    rasterizer : :class:`CyRasterizer`
+        A rasterizer of the configuration's resolution.
+    config : `dict`
+        The configuration, with the keys of :data:`BASELINE`.
+    n_frames : `int`, optional
+        The number of timed calls made (after one warm up call).
+
+    Returns
+    -------
+    result : `dict`
+        The configuration along with ``'frames_per_second'``,
+        ``'mesh_upload_mb_per_s'``, ``'texture_upload_mb_per_s'``,
+        ``'readback_mb_per_s'``, ``'draw_ms'`` (the mean GPU time of a
+        draw), ``'upload_s'`` (the wall time to upload the mesh, including
+        computing its normals if needed) and ``'rss_increase_mb'`` (how
+        much the resident memory grew from before the mesh was built to
+        after the last render, ``None`` where it can't be measured).
+    """
+    rss_before = rss_mb()
+    points, trilist, tcoords = synthetic_mesh(config['n_vertices'])
+    texture = synthetic_texture(config['texture_size'],
+                                config['texture_dtype'])
+    normals = None
+    if config['custom_normals']:
+        normals = np.zeros_like(points)
+        normals[:, 2] = 1
+    n_views = config['n_views']
+    outputs = tuple(config['outputs'])
+
+    rasterizer.set_profiling(True)
+    rasterizer.clear_texture_cache()
+    rasterizer.clear_normals_cache()
+    start = default_timer()
+    mesh = rasterizer.upload_mesh(points, trilist, tcoords, normals=normals)
+    upload_s = default_timer() - start
+    try:
+        if n_views == 1:
+            def render():
+                rasterizer.rasterize(mesh, texture=texture,
+                                     texture_key='benchmark', outputs=outputs)
+        else:
+            views = np.tile(np.eye(4, dtype=np.float32), (n_views, 1, 1))
+
+            def render():
+                rasterizer.rasterize_views(mesh, views, texture=texture,
+                                           texture_key='benchmark',
+                                           outputs=outputs)
+        # the first call uploads the texture, which the rest find cached
+        render()
+        texture_stats = rasterizer.stats()['stages']['upload_texture']
+        start = default_timer()
+        for _ in range(n_frames):
+            render()
+        elapsed = default_timer() - start
+        stats = rasterizer.stats()
+        rss_after = rss_mb()
+    finally:
+        mesh.free()
+        rasterizer.set_profiling(False)
+
+    mesh_bytes = sum(a.nbytes for a in (points, trilist, tcoords)) + \
+        2 * points.nbytes  # the normals and the per vertex f3v data
+    stages = stats['stages']
+    result = dict((name, config[name]) for name in BASELINE)
+    result['sweep'] = config.get('sweep')
+    result['outputs'] = list(outputs)
+    result['resolution'] = list(config['resolution'])
+    result.update({
+        'frames_per_second': n_frames * n_views / elapsed,
+        'mesh_upload_mb_per_s': _rate(mesh_bytes,
+                                      stages['upload_mesh']['total']),
+        'texture_upload_mb_per_s': _rate(texture.nbytes,
+                                         texture_stats['total']),
+        'readback_mb_per_s': _rate(stats['bytes_read_back'],
+                                   stages['readback']['total']),
+        'draw_ms': 1000 * stages['draw']['mean'],
+        'upload_s': upload_s,
+        'rss_increase_mb': (None if rss_before is None or rss_after is None
+                            else rss_after - rss_before)
+    })
+    return result
+
+
+def configurations(sweeps=None):
+    r"""The configurations to benchmark - for each parameter of ``sweeps``
+    (default :data:`SWEEPS`), :data:`BASELINE` with that parameter set to
+    each of its values. The baseline itself is only included once.
+    """
+    if sweeps is None:
+        sweeps = SWEEPS
+    seen = []
+    configs = []
+    for name in sorted(sweeps):
+        for value in sweeps[name]:
+            config = dict(BASELINE)
+            config[name] = value
+            if config in seen:
+                continue
+            seen.append(config)
+            configs.append(dict(config, sweep=name))
+    return configs
+
+
+def run_benchmarks(sweeps=None, n_frames=10, backend='glfw', log=None):
+    r"""Runs every benchmark configuration (see :func:`configurations`).
+
+    Parameters
+    ----------
+    sweeps : `dict`, optional
+        The values to sweep each parameter over.
+
+        Default None - :data:`SWEEPS`.
+    n_frames : `int`, optional
+        The number of timed renders of each configuration.
+    backend : {'glfw', 'egl', 'osmesa'}, optional
+        The backend the rasterizers are created with.
+    log : callable, optional
+        Called with a line of progress text before each configuration.
+
+    Returns
+    -------
+    report : `dict`
+        ``'environment'`` describes the machine and build, ``'results'``
+        holds the result of :func:`run_case` for each configuration (with
+        the ``'sweep'`` it belongs to).
+    """
+    import cyrasterize
+    from cyrasterize import CyRasterizer
+    rasterizers = {}
+    results = []
+    try:
+        for config in configurations(sweeps):
+            if log is not None:
+                log('{sweep}: {value}'.format(sweep=config['sweep'],
+                                              value=config[config['sweep']]))
+            width, height = config['resolution']
+            rasterizer = rasterizers.get((width, height))
+            if rasterizer is None:
+                rasterizer = CyRasterizer(width=width, height=height,
+                                          backend=backend)
+                rasterizers[(width, height)] = rasterizer
+            results.append(run_case(rasterizer, config, n_frames=n_frames))
+    finally:
+        rasterizers.clear()
+    environment = {
+        'cyrasterize': cyrasterize.__version__,
+        'numpy': np.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': backend,
+        'software_rendering': os.environ.get('LIBGL_ALWAYS_SOFTWARE') == '1',
+        'n_frames': n_frames
+    }
+    return {'environment': environment, 'results': results}
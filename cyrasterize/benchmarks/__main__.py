@@ -0,0 +1,59 @@
+r"""Runs the benchmarks, printing (or saving) the report as JSON, e.g. ::
+
+    python -m cyrasterize.benchmarks --quick --backend egl --software \
+        --output benchmarks.json
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cyrasterize.benchmarks',
+        description='Measure the throughput of cyrasterize.')
+    parser.add_argument('--backend', default='glfw',
+                        choices=('glfw', 'egl', 'osmesa'),
+                        help='how the OpenGL contexts are created')
+    parser.add_argument('--software', action='store_true',
+                        help="render with Mesa's llvmpipe, e.g. on CI "
+                             'machines without a GPU')
+    parser.add_argument('--quick', action='store_true',
+                        help='run the smaller sweeps')
+    parser.add_argument('--frames', type=int, default=10,
+                        help='the timed renders of each configuration')
+    parser.add_argument('--sweep', action='append', dest='sweeps',
+                        help='only run the named sweep(s), e.g. n_vertices')
+    parser.add_argument('--output', help='write the report to this file '
+                                         'rather than stdout')
+    args = parser.parse_args(argv)
+
+    if args.software:
+        # must be set before the first context is created
+        os.environ['LIBGL_ALWAYS_SOFTWARE'] = '1'
+        os.environ['GALLIUM_DRIVER'] = 'llvmpipe'
+    from . import QUICK_SWEEPS, SWEEPS, run_benchmarks
+    sweeps = QUICK_SWEEPS if args.quick else SWEEPS
+    if args.sweeps:
+        unknown = set(args.sweeps) - set(sweeps)
+        if unknown:
+            parser.error('unknown sweeps {} - choose from {}'.format(
+                sorted(unknown), sorted(sweeps)))
+        sweeps = dict((name, sweeps[name]) for name in args.sweeps)
+
+    def log(line):
+        sys.stderr.write(line + '\n')
+
+    report = run_benchmarks(sweeps=sweeps, n_frames=args.frames,
+                            backend=args.backend, log=log)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,7 @@ glr_texture glr_build_uint_rgb_texture(uint8_t* texture, size_t w, size_t h)
 	texture_tmp.format = GL_RGB;
 	texture_tmp.type = GL_UNSIGNED_BYTE;
 	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
 	return texture_tmp;
 }
 
@@ -42,6 +43,7 @@ glr_texture glr_build_uint_rgba_texture(uint8_t* texture, size_t w, size_t h)
 	texture_tmp.format = GL_RGBA;
 	texture_tmp.type = GL_UNSIGNED_BYTE;
 	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
 	return texture_tmp;
 }
 
@@ -57,6 +59,7 @@ glr_texture glr_build_float_rgb_texture(float* texture, size_t w, size_t h)
 	texture_tmp.format = GL_RGB;
 	texture_tmp.type = GL_FLOAT;
 	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
 	return texture_tmp;
 }
 
@@ -71,6 +74,67 @@ glr_texture glr_build_float_rgba_texture(float* texture, size_t w, size_t h)
 	texture_tmp.format = GL_RGBA;
 	texture_tmp.type = GL_FLOAT;
 	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
+	return texture_tmp;
+}
+
+glr_texture glr_build_half_rgb_texture(void* texture, size_t w, size_t h)
+{
+	glr_texture texture_tmp;
+	texture_tmp.unit = 999; // the texture unit this texture binds to. Set to
+	// 999 as a safety - must be changed!
+	texture_tmp.internal_format = GL_RGB16F;
+	texture_tmp.width = w;
+	texture_tmp.height = h;
+	texture_tmp.format = GL_RGB;
+	texture_tmp.type = GL_HALF_FLOAT;
+	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
+	return texture_tmp;
+}
+
+glr_texture glr_build_half_rgba_texture(void* texture, size_t w, size_t h)
+{
+	glr_texture texture_tmp;
+	texture_tmp.unit = 999; // the texture unit this texture binds to. Set to
+	// 999 as a safety - must be changed!
+	texture_tmp.internal_format = GL_RGBA16F;
+	texture_tmp.width = w;
+	texture_tmp.height = h;
+	texture_tmp.format = GL_RGBA;
+	texture_tmp.type = GL_HALF_FLOAT;
+	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
+	return texture_tmp;
+}
+
+glr_texture glr_build_float_depth_texture(float* texture, size_t w, size_t h)
+{
+	glr_texture texture_tmp;
+	texture_tmp.unit = 999; // the texture unit this texture binds to. Set to
+	// 999 as a safety - must be changed!
+	texture_tmp.internal_format = GL_DEPTH_COMPONENT32F;
+	texture_tmp.width = w;
+	texture_tmp.height = h;
+	texture_tmp.format = GL_DEPTH_COMPONENT;
+	texture_tmp.type = GL_FLOAT;
+	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
+	return texture_tmp;
+}
+
+glr_texture glr_build_int_red_texture(int32_t* texture, size_t w, size_t h)
+{
+	glr_texture texture_tmp;
+	texture_tmp.unit = 999; // the texture unit this texture binds to. Set to
+	// 999 as a safety - must be changed!
+	texture_tmp.internal_format = GL_R32I;
+	texture_tmp.width = w;
+	texture_tmp.height = h;
+	texture_tmp.format = GL_RED_INTEGER;
+	texture_tmp.type = GL_INT;
+	texture_tmp.data = texture;
+	texture_tmp.sampler = 0; // use the texture's own sampling parameters
 	return texture_tmp;
 }
 
@@ -185,6 +249,16 @@ void glr_init_and_bind_array_buffer(glr_vectorset *vector) {
 						  vector->datatype, GL_FALSE, 0, 0);
 }
 
+void glr_init_and_bind_attribute(glr_vectorset *vector) {
+	// an attribute without any vectors gets no buffer and stays disabled,
+	// so shaders that read it see a constant
+	if (vector->n_vectors == 0) {
+		vector->vbo = 0;
+		return;
+	}
+	glr_init_and_bind_array_buffer(vector);
+}
+
 void glr_init_and_bind_element_buffer(glr_vectorset *vector) {
 	glGenBuffers(1, &(vector->vbo));
 	glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, vector->vbo);
@@ -193,7 +267,16 @@ void glr_init_and_bind_element_buffer(glr_vectorset *vector) {
 			vector->vectors, GL_STATIC_DRAW);
 }
 
-// TODO make the texture sampler a separate customizable thing.
+void glr_update_array_buffer(glr_vectorset *vector, GLvoid* data) {
+	GLsizeiptr size = (vector->size) * (vector->n_vectors) * (vector->n_dims);
+	glBindBuffer(GL_ARRAY_BUFFER, vector->vbo);
+	// orphan the old storage first, so that the upload doesn't wait for
+	// draws that are still reading the previous contents
+	glBufferData(GL_ARRAY_BUFFER, size, NULL, GL_STREAM_DRAW);
+	glBufferSubData(GL_ARRAY_BUFFER, 0, size, data);
+	glBindBuffer(GL_ARRAY_BUFFER, 0);
+}
+
 void glr_init_texture(glr_texture *texture) {
     // OpenGL texturing works as follows.
     //
@@ -271,21 +354,51 @@ void glr_init_texture(glr_texture *texture) {
 
     glr_check_error();
 
-	// Create the description of the texture (sampler)
-	glGenSamplers(1, &(texture->sampler));
-	glSamplerParameteri(texture->sampler, GL_TEXTURE_MAG_FILTER, GL_NEAREST);
-	glSamplerParameteri(texture->sampler, GL_TEXTURE_MIN_FILTER, GL_NEAREST);
-	glSamplerParameteri(texture->sampler, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE);
+    // 5. Give the texture itself sensible sampling defaults so that it is
+    // complete even without a sampler. Samplers are not created here - they
+    // are shared between textures (see glr_build_sampler) and attached to
+    // texture->sampler before glr_bind_texture is called.
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST);
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST);
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE);
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE);
 
-
-    // Bind this metadata to the unit
-	glBindSampler(texture->unit, texture->sampler);
     // UNBIND THE TEXTURE UNIT. Now all our texture information is safe! Just
     // bind the right unit before rendering and we are good to go.
 	glActiveTexture(GL_TEXTURE0);
 	glBindTexture(GL_TEXTURE_2D, 0);
 }
 
+void glr_generate_mipmaps(glr_texture *texture) {
+	glActiveTexture(GL_TEXTURE0 + texture->unit);
+	glBindTexture(GL_TEXTURE_2D, texture->id);
+	glGenerateMipmap(GL_TEXTURE_2D);
+	glActiveTexture(GL_TEXTURE0);
+}
+
+GLuint glr_build_sampler(GLint min_filter, GLint mag_filter, GLint wrap) {
+	// Create the description of how a texture is sampled
+	GLuint sampler;
+	glGenSamplers(1, &sampler);
+	glSamplerParameteri(sampler, GL_TEXTURE_MIN_FILTER, min_filter);
+	glSamplerParameteri(sampler, GL_TEXTURE_MAG_FILTER, mag_filter);
+	glSamplerParameteri(sampler, GL_TEXTURE_WRAP_S, wrap);
+	glSamplerParameteri(sampler, GL_TEXTURE_WRAP_T, wrap);
+	glr_check_error();
+	return sampler;
+}
+
+void glr_destroy_sampler(GLuint sampler) {
+	glDeleteSamplers(1, &sampler);
+}
+
+void glr_bind_texture(glr_texture *texture) {
+	glActiveTexture(GL_TEXTURE0 + texture->unit);
+	glBindTexture(GL_TEXTURE_2D, texture->id);
+	glBindSampler(texture->unit, texture->sampler);
+	glActiveTexture(GL_TEXTURE0);
+}
+
 void glr_init_vao(glr_textured_mesh *mesh) {
     // for simplicity, all our VBO/attribute bindings are wrapped in a
     // Vertex Array object.
@@ -294,10 +407,10 @@ void glr_init_vao(glr_textured_mesh *mesh) {
 	glBindVertexArray(mesh->vao);
     // 2. Make all our intialization code run. The VAO will track buffer
     // attribute bindings for us.
-	glr_init_and_bind_array_buffer(&mesh->vertices);
-	glr_init_and_bind_array_buffer(&mesh->normals);
-	glr_init_and_bind_array_buffer(&mesh->f3v_data);
-	glr_init_and_bind_array_buffer(&mesh->tcoords);
+	glr_init_and_bind_attribute(&mesh->vertices);
+	glr_init_and_bind_attribute(&mesh->normals);
+	glr_init_and_bind_attribute(&mesh->f3v_data);
+	glr_init_and_bind_attribute(&mesh->tcoords);
 	glr_init_and_bind_element_buffer(&mesh->trilist);
     glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, mesh->trilist.vbo);
     // 3. Unbind the VAO.
@@ -315,6 +428,84 @@ void glr_init_framebuffer(GLuint* fbo, glr_texture* texture, GLuint attachment)
 	glr_check_error();
 }
 
+void glr_init_texture_array(glr_texture *texture, GLsizei n_layers)
+{
+	// as glr_init_texture, but n_layers deep on GL_TEXTURE_2D_ARRAY
+	glActiveTexture(GL_TEXTURE0 + texture->unit);
+	glGenTextures(1, &(texture->id));
+	glBindTexture(GL_TEXTURE_2D_ARRAY, texture->id);
+	glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, texture->internal_format,
+		texture->width, texture->height, n_layers, 0, texture->format,
+		texture->type, texture->data);
+	glr_check_error();
+	glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_NEAREST);
+	glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_NEAREST);
+	glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE);
+	glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE);
+	glActiveTexture(GL_TEXTURE0);
+}
+
+void glr_init_layered_framebuffer(GLuint* fbo, glr_texture* texture,
+		GLuint attachment)
+{
+	// attaching the whole array makes the framebuffer layered - the
+	// geometry shader picks the layer each primitive goes to with gl_Layer
+	glBindFramebuffer(GL_FRAMEBUFFER, *fbo);
+	glFramebufferTexture(GL_FRAMEBUFFER, attachment, texture->id, 0);
+	glBindFramebuffer(GL_FRAMEBUFFER, 0);
+	glr_check_error();
+}
+
+void glr_read_texture_array(glr_texture* texture, GLenum format, GLvoid* data)
+{
+	glActiveTexture(GL_TEXTURE0 + texture->unit);
+	glBindTexture(GL_TEXTURE_2D_ARRAY, texture->id);
+	glGetTexImage(GL_TEXTURE_2D_ARRAY, 0, format, texture->type, data);
+	glActiveTexture(GL_TEXTURE0);
+}
+
+GLuint glr_init_uniform_buffer(GLsizeiptr size)
+{
+	GLuint ubo;
+	glGenBuffers(1, &ubo);
+	glBindBuffer(GL_UNIFORM_BUFFER, ubo);
+	glBufferData(GL_UNIFORM_BUFFER, size, NULL, GL_DYNAMIC_DRAW);
+	glBindBuffer(GL_UNIFORM_BUFFER, 0);
+	glr_check_error();
+	return ubo;
+}
+
+void glr_update_uniform_buffer(GLuint ubo, GLsizeiptr size, GLvoid* data)
+{
+	glBindBuffer(GL_UNIFORM_BUFFER, ubo);
+	glBufferSubData(GL_UNIFORM_BUFFER, 0, size, data);
+	glBindBuffer(GL_UNIFORM_BUFFER, 0);
+}
+
+int glr_bind_uniform_block(GLuint program, const GLchar* name, GLuint ubo,
+		GLuint binding)
+{
+	GLuint index = glGetUniformBlockIndex(program, name);
+	if (index == GL_INVALID_INDEX) {
+		return 0;
+	}
+	glUniformBlockBinding(program, index, binding);
+	glBindBufferBase(GL_UNIFORM_BUFFER, binding, ubo);
+	glr_check_error();
+	return 1;
+}
+
+void glr_destroy_buffer(GLuint buffer)
+{
+	glDeleteBuffers(1, &buffer);
+}
+
+void glr_draw_instanced(glr_textured_mesh* mesh, GLsizei n_instances)
+{
+	glDrawElementsInstanced(GL_TRIANGLES, mesh->trilist.n_vectors * 3,
+			GL_UNSIGNED_INT, (GLvoid*) 0, n_instances);
+}
+
 void glr_register_draw_framebuffers(GLuint fbo, size_t n_attachments,
 		GLenum* attachments)
 {
@@ -330,6 +521,9 @@ void glr_set_global_settings(void) {
 	glCullFace(GL_BACK);
 	glDepthFunc(GL_LEQUAL);
 	glClearColor(1.0f, 1.0f, 1.0f, 0.0f);
+	// rows of 8-bit and half float RGB pixels needn't be 4-byte aligned
+	glPixelStorei(GL_UNPACK_ALIGNMENT, 1);
+	glPixelStorei(GL_PACK_ALIGNMENT, 1);
 }
 
 void glr_set_clear_color(float* cv) {
@@ -341,14 +535,242 @@ void glr_get_clear_color(float* cv) {
 }
 
 void glr_get_framebuffer(glr_texture* texture)
+{
+	glr_read_framebuffer(texture, texture->format, texture->data);
+}
+
+void glr_read_framebuffer(glr_texture* texture, GLenum format, GLvoid* data)
 {
 	glActiveTexture(GL_TEXTURE0 + texture->unit);
     glBindTexture(GL_TEXTURE_2D, texture->id);
-	glGetTexImage(GL_TEXTURE_2D, 0, texture->format, texture->type,
-                  texture->data);
+	glGetTexImage(GL_TEXTURE_2D, 0, format, texture->type, data);
 	glActiveTexture(GL_TEXTURE0);
 }
 
+void glr_flip_rows(GLvoid* data, size_t n_rows, size_t row_bytes)
+{
+	char chunk[4096];
+	char* top = (char*) data;
+	char* bottom;
+	size_t i, n;
+	if (n_rows < 2) {
+		return;
+	}
+	// swap the rows from the outside in, a chunk at a time
+	for (bottom = top + (n_rows - 1) * row_bytes; top < bottom;
+	     top += row_bytes, bottom -= row_bytes) {
+		for (i = 0; i < row_bytes; i += n) {
+			n = row_bytes - i < sizeof(chunk) ? row_bytes - i : sizeof(chunk);
+			memcpy(chunk, top + i, n);
+			memcpy(top + i, bottom + i, n);
+			memcpy(bottom + i, chunk, n);
+		}
+	}
+}
+
+void glr_clear_int_draw_buffer(GLint draw_buffer, GLint value)
+{
+	GLint values[4] = {value, value, value, value};
+	glClearBufferiv(GL_COLOR, draw_buffer, values);
+}
+
+void glr_clear_float_draw_buffer(GLint draw_buffer, GLfloat value)
+{
+	GLfloat values[4] = {value, value, value, value};
+	glClearBufferfv(GL_COLOR, draw_buffer, values);
+}
+
+void glr_init_pixel_buffer(glr_pixel_buffer* buffer, GLsizeiptr size)
+{
+	buffer->size = size;
+	buffer->fence = NULL;
+	glGenBuffers(1, &(buffer->pbo));
+	glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer->pbo);
+	glBufferData(GL_PIXEL_PACK_BUFFER, size, NULL, GL_STREAM_READ);
+	glBindBuffer(GL_PIXEL_PACK_BUFFER, 0);
+	glr_check_error();
+}
+
+void glr_get_framebuffer_async(glr_texture* texture, GLenum format,
+                               glr_pixel_buffer* buffer)
+{
+	// with a buffer bound to GL_PIXEL_PACK_BUFFER the data argument of
+	// glGetTexImage is an offset into the buffer, and the call doesn't block
+	glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer->pbo);
+	glActiveTexture(GL_TEXTURE0 + texture->unit);
+	glBindTexture(GL_TEXTURE_2D, texture->id);
+	glGetTexImage(GL_TEXTURE_2D, 0, format, texture->type, 0);
+	glActiveTexture(GL_TEXTURE0);
+	glBindBuffer(GL_PIXEL_PACK_BUFFER, 0);
+	if (buffer->fence) {
+		glDeleteSync(buffer->fence);
+	}
+	buffer->fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0);
+	// make sure the commands are submitted so the fence will be signalled
+	glFlush();
+}
+
+int glr_pixel_buffer_ready(glr_pixel_buffer* buffer)
+{
+	if (!buffer->fence) {
+		return 1;
+	}
+	GLenum status = glClientWaitSync(buffer->fence, 0, 0);
+	return status == GL_ALREADY_SIGNALED || status == GL_CONDITION_SATISFIED;
+}
+
+void glr_read_pixel_buffer(glr_pixel_buffer* buffer, GLvoid* data,
+                           GLsizeiptr size)
+{
+	if (buffer->fence) {
+		// wait in 1ms chunks until the copy has completed
+		while (glClientWaitSync(buffer->fence, GL_SYNC_FLUSH_COMMANDS_BIT,
+		                        1000000) == GL_TIMEOUT_EXPIRED);
+		glDeleteSync(buffer->fence);
+		buffer->fence = NULL;
+	}
+	glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer->pbo);
+	glGetBufferSubData(GL_PIXEL_PACK_BUFFER, 0, size, data);
+	glBindBuffer(GL_PIXEL_PACK_BUFFER, 0);
+}
+
+void glr_destroy_pixel_buffer(glr_pixel_buffer* buffer)
+{
+	if (buffer->fence) {
+		glDeleteSync(buffer->fence);
+		buffer->fence = NULL;
+	}
+	glDeleteBuffers(1, &(buffer->pbo));
+}
+
+void glr_scatter_normals(GLuint program, GLuint fbo, glr_texture* target,
+                         glr_textured_mesh* mesh)
+{
+	GLint viewport[4];
+	glGetIntegerv(GL_VIEWPORT, viewport);
+	glBindFramebuffer(GL_FRAMEBUFFER, fbo);
+	glViewport(0, 0, target->width, target->height);
+	glr_clear_float_draw_buffer(0, 0);
+	glEnable(GL_BLEND);
+	glBlendFunc(GL_ONE, GL_ONE);
+	glUseProgram(program);
+	glBindVertexArray(mesh->vao);
+	glDrawElements(GL_TRIANGLES, mesh->trilist.n_vectors * 3,
+	               GL_UNSIGNED_INT, 0);
+	glBindVertexArray(0);
+	glDisable(GL_BLEND);
+	glViewport(viewport[0], viewport[1], viewport[2], viewport[3]);
+	glBindFramebuffer(GL_FRAMEBUFFER, 0);
+}
+
+void glr_gather_normals(GLuint program, GLuint vao, glr_texture* sums,
+                        GLuint buffer, GLsizei n_points)
+{
+	glUseProgram(program);
+	glr_bind_texture(sums);
+	glBindVertexArray(vao);
+	glBindBufferBase(GL_TRANSFORM_FEEDBACK_BUFFER, 0, buffer);
+	glEnable(GL_RASTERIZER_DISCARD);
+	glBeginTransformFeedback(GL_POINTS);
+	glDrawArrays(GL_POINTS, 0, n_points);
+	glEndTransformFeedback();
+	glDisable(GL_RASTERIZER_DISCARD);
+	glBindBufferBase(GL_TRANSFORM_FEEDBACK_BUFFER, 0, 0);
+	glBindVertexArray(0);
+}
+
+void glr_set_feedback_varying(GLuint program, const GLchar* name)
+{
+	glTransformFeedbackVaryings(program, 1, &name, GL_INTERLEAVED_ATTRIBS);
+}
+
+GLuint glr_build_vertex_array(void)
+{
+	GLuint vao;
+	glGenVertexArrays(1, &vao);
+	return vao;
+}
+
+void glr_destroy_vertex_array(GLuint vao)
+{
+	glDeleteVertexArrays(1, &vao);
+}
+
+GLint glr_n_program_binary_formats(void)
+{
+	GLint n_formats = 0;
+	// program binaries are core since OpenGL 4.1, an extension before
+	if (GLEW_ARB_get_program_binary)
+		glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS, &n_formats);
+	return n_formats;
+}
+
+void glr_set_program_binary_retrievable(GLuint program)
+{
+	glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE);
+}
+
+GLint glr_get_program_binary_length(GLuint program)
+{
+	GLint length = 0;
+	glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH, &length);
+	return length;
+}
+
+void glr_get_program_binary(GLuint program, GLsizei length, GLenum* format,
+                            GLvoid* binary)
+{
+	glGetProgramBinary(program, length, NULL, format, binary);
+}
+
+int glr_load_program_binary(GLuint program, GLenum format,
+                            const GLvoid* binary, GLsizei length)
+{
+	GLint linked = GL_FALSE;
+	glProgramBinary(program, format, binary, length);
+	// a binary of a format the driver no longer supports raises an error
+	// rather than failing to link - either way it's rejected
+	while (glGetError() != GL_NO_ERROR);
+	glGetProgramiv(program, GL_LINK_STATUS, &linked);
+	return linked == GL_TRUE;
+}
+
+GLuint glr_build_timer(void)
+{
+	GLuint timer;
+	glGenQueries(1, &timer);
+	return timer;
+}
+
+void glr_begin_timer(GLuint timer)
+{
+	glBeginQuery(GL_TIME_ELAPSED, timer);
+}
+
+void glr_end_timer(void)
+{
+	glEndQuery(GL_TIME_ELAPSED);
+}
+
+int glr_timer_ready(GLuint timer)
+{
+	GLuint available = 0;
+	glGetQueryObjectuiv(timer, GL_QUERY_RESULT_AVAILABLE, &available);
+	return available != 0;
+}
+
+uint64_t glr_timer_elapsed(GLuint timer)
+{
+	GLuint64 elapsed = 0;
+	glGetQueryObjectui64v(timer, GL_QUERY_RESULT, &elapsed);
+	return elapsed;
+}
+
+void glr_destroy_timer(GLuint timer)
+{
+	glDeleteQueries(1, &timer);
+}
+
 void glr_destroy_vbos_on_trianglar_mesh(glr_textured_mesh* mesh) {
     // ensure the VAO is unbound.
 	glBindVertexArray(0);
@@ -40,6 +40,13 @@ typedef struct {
 } glr_textured_mesh;
 
 
+typedef struct {
+	GLuint pbo;       // pixel buffer object the framebuffer is copied into
+	GLsizeiptr size;  // size of the pbo in bytes
+	GLsync fence;     // signalled once the copy into the pbo has completed
+} glr_pixel_buffer;
+
+
 typedef struct {
 	float projectionMatrix [16];  // how the camera projects (ortho, persp)
     float viewMatrix [16];  // how the camera is positioned in world space
@@ -125,6 +132,13 @@ glr_texture glr_build_uint_rgba_texture(uint8_t* texture, size_t w, size_t h);
 glr_texture glr_build_uint_rgb_texture(uint8_t* texture, size_t w, size_t h);
 glr_texture glr_build_float_rgb_texture(float* texture, size_t w, size_t h);
 glr_texture glr_build_float_rgba_texture(float* texture, size_t w, size_t h);
+// half floats (GL_HALF_FLOAT) have no C type - texture points to 16-bit floats
+glr_texture glr_build_half_rgb_texture(void* texture, size_t w, size_t h);
+glr_texture glr_build_half_rgba_texture(void* texture, size_t w, size_t h);
+// single channel float depth texture, suitable as a GL_DEPTH_ATTACHMENT
+glr_texture glr_build_float_depth_texture(float* texture, size_t w, size_t h);
+// single channel 32-bit signed integer texture (e.g. triangle indices)
+glr_texture glr_build_int_red_texture(int32_t* texture, size_t w, size_t h);
 
 /*
  * Returns a glr_textured_mesh configured for a mesh with:
@@ -165,14 +179,53 @@ glr_scene glr_build_scene(void);
 void glr_init_and_bind_array_buffer(glr_vectorset* vector);
 
 
+/*
+ * As glr_init_and_bind_array_buffer, but attributes without any vectors
+ * (e.g. the tcoords of a mesh that is never textured) are left without a
+ * buffer (vbo 0) and disabled.
+ */
+void glr_init_and_bind_attribute(glr_vectorset* vector);
+
+
 void glr_init_and_bind_element_buffer(glr_vectorset* vector);
 
 
+/*
+ * Replaces the contents of an (initialised) array buffer with n_vectors
+ * vectors of data, leaving the other buffers of its mesh untouched.
+ */
+void glr_update_array_buffer(glr_vectorset* vector, GLvoid* data);
+
+
 void glr_init_vao(glr_textured_mesh* mesh);
 
 
 void glr_init_texture(glr_texture *texture);
 
+/*
+ * Binds a texture previously set up by glr_init_texture (and its sampler)
+ * back onto texture->unit, ready for rendering. A sampler of 0 means the
+ * texture's own (nearest, clamp to edge) parameters are used.
+ */
+void glr_bind_texture(glr_texture *texture);
+
+/*
+ * Builds the full mipmap chain of a texture previously set up by
+ * glr_init_texture. Required before sampling with a mipmap min filter.
+ */
+void glr_generate_mipmaps(glr_texture *texture);
+
+/*
+ * SAMPLERS
+ *
+ * Samplers describe how a texture is filtered and wrapped, independently of
+ * the texture itself. They are cheap to bind but are driver objects, so they
+ * should be built once, shared between textures, and destroyed explicitly.
+ */
+GLuint glr_build_sampler(GLint min_filter, GLint mag_filter, GLint wrap);
+
+void glr_destroy_sampler(GLuint sampler);
+
 
 void glr_init_framebuffer(GLuint* fbo, glr_texture* texture, GLuint attachment);
 
@@ -180,12 +233,161 @@ void glr_init_framebuffer(GLuint* fbo, glr_texture* texture, GLuint attachment);
 void glr_register_draw_framebuffers(GLuint fbo, size_t n_attachments,
 		                            GLenum* attachments);
 
+/*
+ * LAYERED RENDERING
+ *
+ * A texture array of n_layers attached as a whole to a framebuffer makes it
+ * layered - each primitive is drawn into the layer chosen by the geometry
+ * shader (gl_Layer). With instancing, many views of a mesh can be drawn by a
+ * single glr_draw_instanced and read back by one glr_read_texture_array.
+ */
+void glr_init_texture_array(glr_texture *texture, GLsizei n_layers);
+
+void glr_init_layered_framebuffer(GLuint* fbo, glr_texture* texture,
+		                          GLuint attachment);
+
+// reads every layer of the array, one after the other, into data
+void glr_read_texture_array(glr_texture* texture, GLenum format, GLvoid* data);
+
+void glr_draw_instanced(glr_textured_mesh* mesh, GLsizei n_instances);
+
+/*
+ * UNIFORM BUFFERS
+ *
+ * glr_bind_uniform_block connects the uniform block called name in program
+ * to ubo through binding point binding. Returns 0 if program has no such
+ * block.
+ */
+GLuint glr_init_uniform_buffer(GLsizeiptr size);
+
+void glr_update_uniform_buffer(GLuint ubo, GLsizeiptr size, GLvoid* data);
+
+int glr_bind_uniform_block(GLuint program, const GLchar* name, GLuint ubo,
+		                   GLuint binding);
+
+void glr_destroy_buffer(GLuint buffer);
+
 
 void glr_set_global_settings(void);
 
 
 void glr_get_framebuffer(glr_texture* texture);
 
+/*
+ * Copies the pixels of a framebuffer texture into data, converting them to
+ * format (e.g. GL_RGB to drop the alpha channel of an RGBA target) on the
+ * way. data must be large enough for format in texture->type.
+ */
+void glr_read_framebuffer(glr_texture* texture, GLenum format, GLvoid* data);
+
+/*
+ * Reverses the order of the n_rows rows (of row_bytes each) of an image in
+ * place. OpenGL stores framebuffers bottom row first, images are top row
+ * first.
+ */
+void glr_flip_rows(GLvoid* data, size_t n_rows, size_t row_bytes);
+
+/*
+ * Clear a single draw buffer of the bound framebuffer to value (every
+ * channel). Integer attachments can only be cleared this way, not with
+ * glClear.
+ */
+void glr_clear_int_draw_buffer(GLint draw_buffer, GLint value);
+void glr_clear_float_draw_buffer(GLint draw_buffer, GLfloat value);
+
+/*
+ * ASYNCHRONOUS FRAMEBUFFER READBACK
+ *
+ * glr_get_framebuffer_async queues a copy of the texture into a pixel buffer
+ * object and returns immediately, leaving the GPU to transfer the pixels
+ * while the CPU gets on with something else. A fence is inserted after the
+ * copy - glr_pixel_buffer_ready polls it without blocking, and
+ * glr_read_pixel_buffer waits on it before copying the pixels to data.
+ */
+void glr_init_pixel_buffer(glr_pixel_buffer* buffer, GLsizeiptr size);
+
+void glr_get_framebuffer_async(glr_texture* texture, GLenum format,
+                               glr_pixel_buffer* buffer);
+
+int glr_pixel_buffer_ready(glr_pixel_buffer* buffer);
+
+// copies the first size bytes of the buffer to data
+void glr_read_pixel_buffer(glr_pixel_buffer* buffer, GLvoid* data,
+                           GLsizeiptr size);
+
+void glr_destroy_pixel_buffer(glr_pixel_buffer* buffer);
+
+
+/*
+ * GPU VERTEX NORMALS
+ *
+ * The vertex normals of a mesh are computed on the GPU in two passes.
+ * glr_scatter_normals draws the mesh into target (a float RGBA texture
+ * attached to fbo, with a texel per vertex) through a program whose geometry
+ * shader turns each triangle into a point on the texel of each of its
+ * vertices carrying the triangle's normal. Additive blending sums them.
+ * glr_gather_normals then draws a point per vertex (from the attribute-less
+ * vao) with rasterization disabled, through a program that normalizes each
+ * sum in sums, capturing the results by transform feedback into buffer.
+ *
+ * The varying captured must be chosen (glr_set_feedback_varying) before the
+ * gather program is linked.
+ */
+void glr_scatter_normals(GLuint program, GLuint fbo, glr_texture* target,
+                         glr_textured_mesh* mesh);
+
+void glr_gather_normals(GLuint program, GLuint vao, glr_texture* sums,
+                        GLuint buffer, GLsizei n_points);
+
+void glr_set_feedback_varying(GLuint program, const GLchar* name);
+
+GLuint glr_build_vertex_array(void);
+
+void glr_destroy_vertex_array(GLuint vao);
+
+/*
+ * PROGRAM BINARIES
+ *
+ * Linked programs can be saved as driver specific binaries and loaded again
+ * (by later processes) without compiling. glr_n_program_binary_formats is 0
+ * where the driver can't do so. A program's binary can only be retrieved if
+ * glr_set_program_binary_retrievable was called before it was linked.
+ * glr_load_program_binary returns 1 if the driver accepted the binary (and
+ * so the program is linked), 0 if it was rejected.
+ */
+GLint glr_n_program_binary_formats(void);
+
+void glr_set_program_binary_retrievable(GLuint program);
+
+GLint glr_get_program_binary_length(GLuint program);
+
+void glr_get_program_binary(GLuint program, GLsizei length, GLenum* format,
+                            GLvoid* binary);
+
+int glr_load_program_binary(GLuint program, GLenum format,
+                            const GLvoid* binary, GLsizei length);
+
+/*
+ * GPU TIMERS
+ *
+ * A timer is a GL_TIME_ELAPSED query - the GPU time taken by the commands
+ * issued between glr_begin_timer and glr_end_timer. Only one timer can be
+ * running at a time. The result arrives some time after the commands have
+ * been submitted - glr_timer_ready polls for it without blocking, and
+ * glr_timer_elapsed waits for it, returning the elapsed nanoseconds.
+ */
+GLuint glr_build_timer(void);
+
+void glr_begin_timer(GLuint timer);
+
+void glr_end_timer(void);
+
+int glr_timer_ready(GLuint timer);
+
+uint64_t glr_timer_elapsed(GLuint timer);
+
+void glr_destroy_timer(GLuint timer);
+
 
 void glr_destroy_vbos_on_trianglar_mesh(glr_textured_mesh* mesh);
 
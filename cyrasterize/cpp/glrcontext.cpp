@@ -0,0 +1,41 @@
+#include <GL/glew.h>
+#include "glrcontext.h"
+#include "print.h"
+
+
+glr_STATUS glr_glew_init(int verbose) {
+	// Fire up GLEW
+    // Flag is required for use with Core Profiles (which we need for OS X)
+    // http://www.opengl.org/wiki/OpenGL_Loading_Library#GLEW
+    glewExperimental = true;
+	GLenum status = glewInit();
+#ifdef GLEW_ERROR_NO_GLX_DISPLAY
+    // a GLX build of GLEW complains when the context is not a GLX one (EGL,
+    // OSMesa) - but the GL entry points are loaded all the same
+    if (status == GLEW_ERROR_NO_GLX_DISPLAY) {
+        py_printf_v(verbose, "  - No GLX display (fine for headless contexts)\n");
+        status = GLEW_OK;
+    }
+#endif
+	if (status != GLEW_OK) {
+	    py_printf("GLEW ERROR (%d): Failed to start! %s\n", status,
+	              glewGetErrorString(status));
+	    return GLR_GLEW_FAILED;
+	}
+	py_printf_v(verbose, "  - Using GLEW %s\n", glewGetString(GLEW_VERSION));
+	if(GLEW_ARB_texture_buffer_object_rgb32) {
+	   py_printf_v(verbose, "  - Float (X,Y,Z) rendering is supported\n");
+	} else {
+	   py_printf_v(verbose, "  - Float (X,Y,Z) rendering not supported\n");
+	}
+
+	py_printf_v(verbose, "  - OpenGL Version: %s\n",glGetString(GL_VERSION));
+    // GLEW initialization sometimes sets the GL_INVALID_ENUM state even
+    // though all is fine - swallow it here (and warn the user)
+    // http://www.opengl.org/wiki/OpenGL_Loading_Library#GLEW
+    GLenum err = glGetError();
+    if (err == GL_INVALID_ENUM) {
+        py_printf("GLEW Warning (%d): Swallowing GL_INVALID_ENUM error\n", err);
+    }
+    return GLR_SUCCESS;
+}
@@ -0,0 +1,47 @@
+#pragma once
+
+/*
+ * Shared by the context backends (GLFW, EGL and OSMesa). Each backend
+ * provides a context struct and the same seven calls:
+ *
+ *   glr_<backend>_context glr_build_<backend>_context_offscreen(w, h)
+ *   glr_STATUS glr_<backend>_init(context, verbose)
+ *   void glr_<backend>_make_current(context)
+ *   void glr_<backend>_release_current(void)
+ *   glr_current_context glr_<backend>_get_current(void)
+ *   void glr_<backend>_restore_current(current)
+ *   void glr_<backend>_terminate(context)
+ */
+
+/*
+ * Whichever context of a backend is current on the calling thread, as saved
+ * by glr_<backend>_get_current, so that it can be made current again with
+ * glr_<backend>_restore_current. Each backend only fills in what it needs
+ * to make its context current (the rest is left NULL/0).
+ */
+typedef struct {
+    void* display;
+    void* draw;
+    void* read;
+    void* context;
+    void* buffer;
+    int width;
+    int height;
+} glr_current_context;
+
+typedef enum {
+    GLR_SUCCESS,
+    GLR_GLFW_INIT_FAILED,
+    GLR_GLFW_WINDOW_FAILED,
+    GLR_GLEW_FAILED,
+    GLR_EGL_INIT_FAILED,
+    GLR_EGL_CONTEXT_FAILED,
+    GLR_OSMESA_CONTEXT_FAILED,
+    // the backend was not compiled into this build
+    GLR_BACKEND_UNAVAILABLE,
+}  glr_STATUS;
+
+/*
+ * Loads the OpenGL entry points for the current context and reports on it.
+ */
+glr_STATUS glr_glew_init(int verbose);
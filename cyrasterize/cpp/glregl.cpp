@@ -0,0 +1,273 @@
+#include <stdlib.h>
+#include <string.h>
+#include "glregl.h"
+#include "print.h"
+
+
+glr_egl_context glr_build_egl_context_offscreen(int width, int height) {
+	glr_egl_context context;
+    context.window_width = width;
+    context.window_height = height;
+    context.display = NULL;
+    context.context = NULL;
+    context.surface = NULL;
+    return context;
+}
+
+
+#ifdef GLR_EGL
+#include <GL/glew.h>
+#include <EGL/egl.h>
+#include <EGL/eglext.h>
+#include "glr.h"
+
+#ifndef EGL_PLATFORM_SURFACELESS_MESA
+#define EGL_PLATFORM_SURFACELESS_MESA 0x31DD
+#endif
+
+
+// the display is shared by all contexts - it is only terminated with the
+// last one
+static EGLDisplay glr_egl_display = EGL_NO_DISPLAY;
+static int glr_egl_n_contexts = 0;
+
+
+bool _glr_egl_has_extension(const char* extensions, const char* name) {
+    return extensions != NULL && strstr(extensions, name) != NULL;
+}
+
+
+EGLDisplay _glr_egl_get_display(int verbose) {
+    // Prefer a display on the first GPU, then Mesa's surfaceless platform
+    // (e.g. llvmpipe on CPU-only machines). Neither needs a display server.
+    const char* client_extensions = eglQueryString(EGL_NO_DISPLAY,
+                                                   EGL_EXTENSIONS);
+    PFNEGLGETPLATFORMDISPLAYEXTPROC get_platform_display =
+        (PFNEGLGETPLATFORMDISPLAYEXTPROC) eglGetProcAddress(
+            "eglGetPlatformDisplayEXT");
+    if (get_platform_display != NULL) {
+        PFNEGLQUERYDEVICESEXTPROC query_devices =
+            (PFNEGLQUERYDEVICESEXTPROC) eglGetProcAddress(
+                "eglQueryDevicesEXT");
+        EGLDeviceEXT device;
+        EGLint n_devices = 0;
+        if (_glr_egl_has_extension(client_extensions,
+                                   "EGL_EXT_platform_device") &&
+                query_devices != NULL &&
+                query_devices(1, &device, &n_devices) && n_devices > 0) {
+            py_printf_v(verbose, "  - Using the EGL device platform\n");
+            return get_platform_display(EGL_PLATFORM_DEVICE_EXT, device, NULL);
+        }
+        if (_glr_egl_has_extension(client_extensions,
+                                   "EGL_MESA_platform_surfaceless")) {
+            py_printf_v(verbose, "  - Using the EGL surfaceless platform\n");
+            return get_platform_display(EGL_PLATFORM_SURFACELESS_MESA,
+                                        EGL_DEFAULT_DISPLAY, NULL);
+        }
+    }
+    py_printf_v(verbose, "  - Using the default EGL display\n");
+    return eglGetDisplay(EGL_DEFAULT_DISPLAY);
+}
+
+
+glr_STATUS _glr_egl_open_display(int verbose) {
+    if (glr_egl_display != EGL_NO_DISPLAY) {
+        return GLR_SUCCESS;
+    }
+    EGLDisplay display = _glr_egl_get_display(verbose);
+    EGLint major, minor;
+    if (display == EGL_NO_DISPLAY || !eglInitialize(display, &major, &minor)) {
+        py_printf("EGL ERROR (0x%x): Failed to initialize a display\n",
+                  eglGetError());
+        return GLR_EGL_INIT_FAILED;
+    }
+    py_printf_v(verbose, "  - EGL Version: %d.%d\n", major, minor);
+    glr_egl_display = display;
+    return GLR_SUCCESS;
+}
+
+
+void _glr_egl_close_display(void) {
+    if (glr_egl_n_contexts == 0 && glr_egl_display != EGL_NO_DISPLAY) {
+        eglTerminate(glr_egl_display);
+        eglReleaseThread();
+        glr_egl_display = EGL_NO_DISPLAY;
+    }
+}
+
+
+glr_STATUS glr_egl_init(glr_egl_context* context, int verbose)
+{
+	py_printf_v(verbose, "EGL: Initializing Context\n");
+    glr_STATUS status = _glr_egl_open_display(verbose);
+    if (status != GLR_SUCCESS) {
+        return status;
+    }
+    EGLDisplay display = glr_egl_display;
+    if (!eglBindAPI(EGL_OPENGL_API)) {
+        py_printf("EGL ERROR (0x%x): Desktop OpenGL is not supported\n",
+                  eglGetError());
+        _glr_egl_close_display();
+        return GLR_EGL_INIT_FAILED;
+    }
+    const EGLint config_attributes[] = {
+        EGL_SURFACE_TYPE, EGL_PBUFFER_BIT,
+        EGL_RENDERABLE_TYPE, EGL_OPENGL_BIT,
+        EGL_RED_SIZE, 8,
+        EGL_GREEN_SIZE, 8,
+        EGL_BLUE_SIZE, 8,
+        EGL_ALPHA_SIZE, 8,
+        EGL_DEPTH_SIZE, 16,
+        EGL_NONE
+    };
+    EGLConfig config;
+    EGLint n_configs = 0;
+    if (!eglChooseConfig(display, config_attributes, &config, 1, &n_configs)
+            || n_configs == 0) {
+        py_printf("EGL ERROR (0x%x): No suitable framebuffer config\n",
+                  eglGetError());
+        _glr_egl_close_display();
+        return GLR_EGL_CONTEXT_FAILED;
+    }
+    // ask for the same OpenGL 3.3 core profile as the GLFW backend
+    const EGLint context_attributes[] = {
+        EGL_CONTEXT_MAJOR_VERSION, 3,
+        EGL_CONTEXT_MINOR_VERSION, 3,
+        EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+        EGL_NONE
+    };
+    EGLContext egl_context = eglCreateContext(display, config, EGL_NO_CONTEXT,
+                                              context_attributes);
+    if (egl_context == EGL_NO_CONTEXT) {
+        py_printf("EGL ERROR (0x%x): Failed to create an OpenGL 3.3 core "
+                  "context\n", eglGetError());
+        _glr_egl_close_display();
+        return GLR_EGL_CONTEXT_FAILED;
+    }
+    // we render into our own framebuffer object, so a surface is only made
+    // if the display insists on one
+    EGLSurface surface = EGL_NO_SURFACE;
+    if (!_glr_egl_has_extension(eglQueryString(display, EGL_EXTENSIONS),
+                                "EGL_KHR_surfaceless_context")) {
+        const EGLint pbuffer_attributes[] = {
+            EGL_WIDTH, context->window_width,
+            EGL_HEIGHT, context->window_height,
+            EGL_NONE
+        };
+        surface = eglCreatePbufferSurface(display, config, pbuffer_attributes);
+        if (surface == EGL_NO_SURFACE) {
+            py_printf("EGL ERROR (0x%x): Failed to create a pbuffer\n",
+                      eglGetError());
+            eglDestroyContext(display, egl_context);
+            _glr_egl_close_display();
+            return GLR_EGL_CONTEXT_FAILED;
+        }
+    }
+    context->display = display;
+    context->context = egl_context;
+    context->surface = surface;
+    glr_egl_n_contexts++;
+    glr_egl_make_current(context);
+    py_printf_v(verbose, "EGL: Context Information\n");
+
+    status = glr_glew_init(verbose);
+    if (status != GLR_SUCCESS) {
+        return status;
+    }
+	glViewport(0, 0, (GLsizei) context->window_width,
+                     (GLsizei) context->window_height);
+    // set the global state to the sensible defaults
+    glr_set_global_settings();
+    return GLR_SUCCESS;
+}
+
+
+void glr_egl_make_current(glr_egl_context* context)
+{
+    // switching contexts flushes the old one, so only do it when needed
+    if (eglGetCurrentContext() != context->context) {
+        eglMakeCurrent(context->display, context->surface, context->surface,
+                       context->context);
+    }
+}
+
+
+void glr_egl_release_current(void)
+{
+    if (glr_egl_display != EGL_NO_DISPLAY) {
+        eglMakeCurrent(glr_egl_display, EGL_NO_SURFACE, EGL_NO_SURFACE,
+                       EGL_NO_CONTEXT);
+    }
+}
+
+
+glr_current_context glr_egl_get_current(void)
+{
+    glr_current_context current = {};
+    current.display = eglGetCurrentDisplay();
+    current.draw = eglGetCurrentSurface(EGL_DRAW);
+    current.read = eglGetCurrentSurface(EGL_READ);
+    current.context = eglGetCurrentContext();
+    return current;
+}
+
+
+void glr_egl_restore_current(glr_current_context* current)
+{
+    if (eglGetCurrentContext() == current->context) {
+        return;
+    }
+    if (current->context != EGL_NO_CONTEXT) {
+        eglMakeCurrent((EGLDisplay) current->display,
+                       (EGLSurface) current->draw,
+                       (EGLSurface) current->read,
+                       (EGLContext) current->context);
+    } else {
+        glr_egl_release_current();
+    }
+}
+
+
+void glr_egl_terminate(glr_egl_context* context)
+{
+    if (context->context) {
+        // another scene's context may be current - leave that one be
+        if (eglGetCurrentContext() == context->context) {
+            glr_egl_release_current();
+        }
+        if (context->surface != EGL_NO_SURFACE) {
+            eglDestroySurface(context->display, context->surface);
+        }
+        eglDestroyContext(context->display, context->context);
+        context->context = NULL;
+        context->surface = NULL;
+        glr_egl_n_contexts--;
+    }
+    _glr_egl_close_display();
+}
+
+#else
+
+glr_STATUS glr_egl_init(glr_egl_context* context, int verbose)
+{
+    py_printf("cyrasterize was built without EGL support - rebuild with "
+              "CYRASTERIZE_EGL=1\n");
+    return GLR_BACKEND_UNAVAILABLE;
+}
+
+
+void glr_egl_make_current(glr_egl_context* context) {}
+void glr_egl_release_current(void) {}
+
+
+glr_current_context glr_egl_get_current(void)
+{
+    glr_current_context current = {};
+    return current;
+}
+
+
+void glr_egl_restore_current(glr_current_context* current) {}
+void glr_egl_terminate(glr_egl_context* context) {}
+
+#endif
@@ -0,0 +1,27 @@
+#pragma once
+
+#include "glrcontext.h"
+
+/*
+ * A headless context built straight on EGL - no window or display server is
+ * needed. Only compiled in when GLR_EGL is defined (see setup.py), otherwise
+ * glr_egl_init returns GLR_BACKEND_UNAVAILABLE.
+ */
+typedef struct {
+    int window_width;
+	int window_height;
+    // EGLDisplay, EGLContext and EGLSurface - kept opaque so that this
+    // header can be used without the EGL headers
+    void* display;
+    void* context;
+    // only used when the display doesn't support surfaceless contexts
+    void* surface;
+} glr_egl_context;
+
+glr_egl_context glr_build_egl_context_offscreen(int width, int height);
+glr_STATUS glr_egl_init(glr_egl_context* context, int verbose);
+void glr_egl_make_current(glr_egl_context* context);
+void glr_egl_release_current(void);
+glr_current_context glr_egl_get_current(void);
+void glr_egl_restore_current(glr_current_context* current);
+void glr_egl_terminate(glr_egl_context* context);
@@ -6,6 +6,10 @@
 #include "print.h"
 
 
+// the number of live contexts - GLFW is only terminated with the last one
+static int glr_glfw_n_contexts = 0;
+
+
 void glfw_error_callback(int error, const char* description)
 {
     py_printf("GLFW ERROR (%d): %s\n", error, description);
@@ -18,39 +22,11 @@ glr_glfw_context glr_build_glfw_context_offscreen(int width, int height){
     context.window_width=  width;
     context.window_height = height;
     context.offscreen = true;
+    context.window = NULL;
     return context;
 }
 
 
-glr_STATUS _glr_glew_init(int verbose) {
-	// Fire up GLEW
-    // Flag is required for use with Core Profiles (which we need for OS X)
-    // http://www.opengl.org/wiki/OpenGL_Loading_Library#GLEW
-    glewExperimental = true;
-	GLenum status = glewInit();
-	if (status != GLEW_OK) {
-	    py_printf("GLEW ERROR (%d): Failed to start! %s\n", status,
-	              glewGetErrorString(status));
-	    return GLR_GLEW_FAILED;
-	}
-	py_printf_v(verbose, "  - Using GLEW %s\n", glewGetString(GLEW_VERSION));
-	if(GLEW_ARB_texture_buffer_object_rgb32) {
-	   py_printf_v(verbose, "  - Float (X,Y,Z) rendering is supported\n");
-	} else {
-	   py_printf_v(verbose, "  - Float (X,Y,Z) rendering not supported\n");
-	}
-
-	py_printf_v(verbose, "  - OpenGL Version: %s\n",glGetString(GL_VERSION));
-    // GLEW initialization sometimes sets the GL_INVALID_ENUM state even
-    // though all is fine - swallow it here (and warn the user)
-    // http://www.opengl.org/wiki/OpenGL_Loading_Library#GLEW
-    GLenum err = glGetError();
-    if (err == GL_INVALID_ENUM) {
-        py_printf("GLEW Warning (%d): Swallowing GL_INVALID_ENUM error\n", err);
-    }
-    return GLR_SUCCESS;
-}
-
 glr_STATUS glr_glfw_init(glr_glfw_context* context, int verbose)
 {
     // Set up the error callback so we get more useful information
@@ -75,13 +51,16 @@ glr_STATUS glr_glfw_init(glr_glfw_context* context, int verbose)
             context->title, NULL, NULL);
     if (!context->window)
     {
-        glfwTerminate();
+        if (glr_glfw_n_contexts == 0) {
+            glfwTerminate();
+        }
         return GLR_GLFW_WINDOW_FAILED;
     }
+    glr_glfw_n_contexts++;
     glfwMakeContextCurrent(context->window);
     py_printf_v(verbose, "GLFW: Context Information\n");
 
-    glr_STATUS status = _glr_glew_init(verbose);
+    glr_STATUS status = glr_glew_init(verbose);
     if (status != GLR_SUCCESS) {
         return status;
     }
@@ -94,10 +73,50 @@ glr_STATUS glr_glfw_init(glr_glfw_context* context, int verbose)
 }
 
 
+void glr_glfw_make_current(glr_glfw_context* context)
+{
+    // switching contexts flushes the old one, so only do it when needed
+    if (glfwGetCurrentContext() != context->window) {
+        glfwMakeContextCurrent(context->window);
+    }
+}
+
+
+void glr_glfw_release_current(void)
+{
+    glfwMakeContextCurrent(NULL);
+}
+
+
+glr_current_context glr_glfw_get_current(void)
+{
+    glr_current_context current = {};
+    current.context = glfwGetCurrentContext();
+    return current;
+}
+
+
+void glr_glfw_restore_current(glr_current_context* current)
+{
+    if (glfwGetCurrentContext() != current->context) {
+        glfwMakeContextCurrent((GLFWwindow*) current->context);
+    }
+}
+
+
 void glr_glfw_terminate(glr_glfw_context* context)
 {
-    // Ensure we have unset all callbacks and then terminate
-    glfwSetErrorCallback(NULL);
-    glfwTerminate();
+    // Only this context's window is destroyed - other contexts may still be
+    // in use (e.g. by a RasterizerPool)
+    if (context->window) {
+        glfwDestroyWindow(context->window);
+        context->window = NULL;
+        glr_glfw_n_contexts--;
+    }
+    if (glr_glfw_n_contexts == 0) {
+        // Ensure we have unset all callbacks and then terminate
+        glfwSetErrorCallback(NULL);
+        glfwTerminate();
+    }
 }
 
@@ -2,6 +2,7 @@
 
 #include <GL/glew.h>
 #include <GLFW/glfw3.h>
+#include "glrcontext.h"
 
 typedef struct {
     int window_width;
@@ -11,15 +12,23 @@ typedef struct {
     GLFWwindow* window;
 } glr_glfw_context;
 
-typedef enum {
-    GLR_SUCCESS,
-    GLR_GLFW_INIT_FAILED,
-    GLR_GLFW_WINDOW_FAILED,
-    GLR_GLEW_FAILED,
-}  glr_STATUS;
-
 glr_glfw_context glr_build_glfw_context_offscreen(int width, int height);
 glr_STATUS glr_glfw_init(glr_glfw_context* context, int verbose);
 
+/*
+ * Makes the context current on the calling thread (glr_glfw_init makes it
+ * current on the thread that creates it). A context can only be current on
+ * one thread at a time - release it before making it current elsewhere.
+ */
+void glr_glfw_make_current(glr_glfw_context* context);
+void glr_glfw_release_current(void);
+
+/*
+ * Saves and restores whichever window's context is current on the calling
+ * thread - e.g. around freeing the objects of another context.
+ */
+glr_current_context glr_glfw_get_current(void);
+void glr_glfw_restore_current(glr_current_context* current);
+
 void glr_glfw_terminate(glr_glfw_context* context);
 void glfw_error_callback(int error, const char* description);
\ No newline at end of file
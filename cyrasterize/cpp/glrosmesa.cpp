@@ -0,0 +1,148 @@
+#include <stdlib.h>
+#include "glrosmesa.h"
+#include "print.h"
+
+
+glr_osmesa_context glr_build_osmesa_context_offscreen(int width, int height) {
+	glr_osmesa_context context;
+    context.window_width = width;
+    context.window_height = height;
+    context.context = NULL;
+    context.buffer = NULL;
+    return context;
+}
+
+#ifdef GLR_OSMESA
+#include <GL/glew.h>
+#include <GL/osmesa.h>
+#include "glr.h"
+
+
+glr_STATUS glr_osmesa_init(glr_osmesa_context* context, int verbose)
+{
+	py_printf_v(verbose, "OSMesa: Initializing Context\n");
+    // ask for the same OpenGL 3.3 core profile as the GLFW backend
+    const int attributes[] = {
+        OSMESA_FORMAT, OSMESA_RGBA,
+        OSMESA_DEPTH_BITS, 16,
+        OSMESA_STENCIL_BITS, 0,
+        OSMESA_ACCUM_BITS, 0,
+        OSMESA_PROFILE, OSMESA_CORE_PROFILE,
+        OSMESA_CONTEXT_MAJOR_VERSION, 3,
+        OSMESA_CONTEXT_MINOR_VERSION, 3,
+        0
+    };
+    OSMesaContext osmesa_context = OSMesaCreateContextAttribs(attributes,
+                                                              NULL);
+    if (!osmesa_context) {
+        py_printf("OSMesa ERROR: Failed to create an OpenGL 3.3 core "
+                  "context\n");
+        return GLR_OSMESA_CONTEXT_FAILED;
+    }
+    void* buffer = malloc(4 * (size_t) context->window_width *
+                          context->window_height);
+    if (!buffer) {
+        OSMesaDestroyContext(osmesa_context);
+        return GLR_OSMESA_CONTEXT_FAILED;
+    }
+    context->context = osmesa_context;
+    context->buffer = buffer;
+    glr_osmesa_make_current(context);
+    py_printf_v(verbose, "OSMesa: Context Information\n");
+
+    glr_STATUS status = glr_glew_init(verbose);
+    if (status != GLR_SUCCESS) {
+        return status;
+    }
+	glViewport(0, 0, (GLsizei) context->window_width,
+                     (GLsizei) context->window_height);
+    // set the global state to the sensible defaults
+    glr_set_global_settings();
+    return GLR_SUCCESS;
+}
+
+
+void glr_osmesa_make_current(glr_osmesa_context* context)
+{
+    // switching contexts flushes the old one, so only do it when needed
+    if (OSMesaGetCurrentContext() == (OSMesaContext) context->context) {
+        return;
+    }
+    OSMesaMakeCurrent((OSMesaContext) context->context, context->buffer,
+                      GL_UNSIGNED_BYTE, context->window_width,
+                      context->window_height);
+}
+
+
+void glr_osmesa_release_current(void)
+{
+    OSMesaMakeCurrent(NULL, NULL, GL_UNSIGNED_BYTE, 0, 0);
+}
+
+
+glr_current_context glr_osmesa_get_current(void)
+{
+    glr_current_context current = {};
+    OSMesaContext context = OSMesaGetCurrentContext();
+    GLint width, height, format;
+    void* buffer;
+    if (context && OSMesaGetColorBuffer(context, &width, &height, &format,
+                                        &buffer)) {
+        current.context = context;
+        current.buffer = buffer;
+        current.width = width;
+        current.height = height;
+    }
+    return current;
+}
+
+
+void glr_osmesa_restore_current(glr_current_context* current)
+{
+    if (OSMesaGetCurrentContext() == (OSMesaContext) current->context) {
+        return;
+    }
+    if (current->context) {
+        OSMesaMakeCurrent((OSMesaContext) current->context, current->buffer,
+                          GL_UNSIGNED_BYTE, current->width, current->height);
+    } else {
+        glr_osmesa_release_current();
+    }
+}
+
+
+void glr_osmesa_terminate(glr_osmesa_context* context)
+{
+    if (context->context) {
+        OSMesaDestroyContext((OSMesaContext) context->context);
+        free(context->buffer);
+        context->context = NULL;
+        context->buffer = NULL;
+    }
+}
+
+#else
+
+glr_STATUS glr_osmesa_init(glr_osmesa_context* context, int verbose)
+{
+    py_printf("cyrasterize was built without OSMesa support - rebuild with "
+              "CYRASTERIZE_OSMESA=1\n");
+    return GLR_BACKEND_UNAVAILABLE;
+}
+
+
+void glr_osmesa_make_current(glr_osmesa_context* context) {}
+void glr_osmesa_release_current(void) {}
+
+
+glr_current_context glr_osmesa_get_current(void)
+{
+    glr_current_context current = {};
+    return current;
+}
+
+
+void glr_osmesa_restore_current(glr_current_context* current) {}
+void glr_osmesa_terminate(glr_osmesa_context* context) {}
+
+#endif
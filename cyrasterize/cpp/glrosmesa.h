@@ -0,0 +1,26 @@
+#pragma once
+
+#include "glrcontext.h"
+
+/*
+ * A context rendered in software by Mesa's OSMesa - needs neither a display
+ * server nor a GPU. Only compiled in when GLR_OSMESA is defined (see
+ * setup.py), otherwise glr_osmesa_init returns GLR_BACKEND_UNAVAILABLE.
+ */
+typedef struct {
+    int window_width;
+	int window_height;
+    // OSMesaContext - kept opaque so that this header can be used without
+    // the OSMesa headers
+    void* context;
+    // the RGBA colour buffer OSMesa requires (we draw into our own FBO)
+    void* buffer;
+} glr_osmesa_context;
+
+glr_osmesa_context glr_build_osmesa_context_offscreen(int width, int height);
+glr_STATUS glr_osmesa_init(glr_osmesa_context* context, int verbose);
+void glr_osmesa_make_current(glr_osmesa_context* context);
+void glr_osmesa_release_current(void);
+glr_current_context glr_osmesa_get_current(void);
+void glr_osmesa_restore_current(glr_current_context* current);
+void glr_osmesa_terminate(glr_osmesa_context* context);
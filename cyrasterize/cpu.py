@@ -0,0 +1,284 @@
+import numpy as np
+
+from .base import (DEFAULT_OUTPUTS, _PIXEL_DTYPES, _array_fingerprint,
+                   _output_array, _output_arrays, _verify_outputs,
+                   _verify_opengl_homogeneous_matrix,
+                   _verify_opengl_homogeneous_matrices)
+from .normals import (DEFAULT_NORMALS_CACHE_SIZE, NormalsCache,
+                      vertex_normals)
+from .softrasterizer import DEFAULT_TILE_SIZE, SHADINGS, rasterize_triangles
+
+
+TEXTURE_FILTERS = ('nearest', 'linear', 'mipmap')
+TEXTURE_WRAPS = ('clamp', 'repeat')
+
+
+class CPURasterizer(object):
+    r"""A software rasterizer with the same interface and outputs as
+    :class:`CyRasterizer`, for machines where no OpenGL context can be made
+    (or for small images, where it avoids the cost of setting up a context
+    and uploading meshes).
+
+    The default vertex and fragment shaders of :class:`CyRasterizer`
+    (``blinnphong``) or the plain ``texture_shader`` are reproduced:
+    triangles are back face culled, depth tested and rasterized with
+    perspective correct interpolation at pixel centres, in parallel across
+    image tiles. Custom shaders are not supported.
+
+    Parameters
+    ----------
+    width : `int`
+        The width of the rasterize target
+    height : `int`
+        The height of the rasterize target
+    model_matrix : ndarray, shape (4, 4), optional
+        The model matrix. Default the identity.
+    view_matrix : ndarray, shape (4, 4), optional
+        The view matrix. Default the identity.
+    projection_matrix : ndarray, shape (4, 4), optional
+        The projection matrix. Default the identity.
+    texture_filter : {'nearest', 'linear', 'mipmap'}, optional
+        How textures are filtered when sampled. 'mipmap' is treated as
+        'linear'.
+    texture_wrap : {'clamp', 'repeat'}, optional
+        How texture coordinates outside of [0, 1] are handled.
+    rgb_dtype : {np.float32, np.float16, np.uint8}, optional
+        The dtype of the rgb images returned.
+    shading : {'blinnphong', 'texture'}, optional
+        'blinnphong' lights the texture as :class:`CyRasterizer`'s default
+        shaders do, 'texture' returns the texture colour as the
+        ``texture_shader`` shaders do.
+
+        Default 'blinnphong'.
+    light_position : (3,) array_like, optional
+        The eye space position of the light for 'blinnphong' shading.
+
+        Default (0, 0, 0) - the light is at the camera, as it is for
+        :class:`CyRasterizer` unless the ``lightPos`` uniform is set.
+    tile_size : `int`, optional
+        The side of the square image tiles that are rasterized in parallel.
+    normals_cache_size : `int`, optional
+        The number of meshes whose computed vertex normals are kept, as for
+        :class:`CyRasterizer`.
+
+        Default 0 - normals are computed on every render.
+
+    Notes
+    -----
+    Triangles with a vertex behind the camera (w <= 0 in clip space) are
+    dropped rather than clipped.
+    """
+    def __init__(self, width=1024, height=768, model_matrix=None,
+                 view_matrix=None, projection_matrix=None,
+                 texture_filter='nearest', texture_wrap='clamp',
+                 rgb_dtype=np.float32, shading='blinnphong',
+                 light_position=(0, 0, 0), tile_size=DEFAULT_TILE_SIZE,
+                 normals_cache_size=DEFAULT_NORMALS_CACHE_SIZE):
+        self.width = width
+        self.height = height
+        self.rgb_dtype = np.dtype(rgb_dtype)
+        if self.rgb_dtype.name not in _PIXEL_DTYPES:
+            raise ValueError('rgb_dtype must be one of {}'.format(
+                _PIXEL_DTYPES))
+        if shading not in SHADINGS:
+            raise ValueError('shading must be one of {}'.format(SHADINGS))
+        self.shading = shading
+        self.light_position = tuple(light_position)
+        self.tile_size = tile_size
+        self._normals_cache = NormalsCache(normals_cache_size)
+        self.set_texture_sampling(filter=texture_filter, wrap=texture_wrap)
+        eye = np.eye(4)
+        self.set_model_matrix(eye if model_matrix is None else model_matrix)
+        self.set_view_matrix(eye if view_matrix is None else view_matrix)
+        self.set_projection_matrix(eye if projection_matrix is None
+                                   else projection_matrix)
+
+    @property
+    def model_matrix(self):
+        return self._model_matrix.copy()
+
+    @property
+    def view_matrix(self):
+        return self._view_matrix.copy()
+
+    @property
+    def projection_matrix(self):
+        return self._projection_matrix.copy()
+
+    def set_model_matrix(self, value):
+        self._model_matrix = _verify_opengl_homogeneous_matrix(value)
+
+    def set_view_matrix(self, value):
+        self._view_matrix = _verify_opengl_homogeneous_matrix(value)
+
+    def set_projection_matrix(self, value):
+        self._projection_matrix = _verify_opengl_homogeneous_matrix(value)
+
+    def set_camera(self, model=None, view=None, projection=None):
+        r"""Sets any of the model, view and projection matrices at once, as
+        :meth:`CyRasterizer.set_camera` does.
+        """
+        model, view, projection = _verify_opengl_homogeneous_matrices(
+            (model, view, projection))
+        if model is not None:
+            self._model_matrix = model
+        if view is not None:
+            self._view_matrix = view
+        if projection is not None:
+            self._projection_matrix = projection
+
+    def set_texture_sampling(self, filter='nearest', wrap='clamp'):
+        r"""Sets how textures are sampled in subsequent rasterizations.
+
+        Parameters
+        ----------
+        filter : {'nearest', 'linear', 'mipmap'}, optional
+            'nearest' returns the closest texel, 'linear' (and 'mipmap')
+            bilinearly interpolate texels.
+        wrap : {'clamp', 'repeat'}, optional
+            Whether texture coordinates outside of [0, 1] are clamped to the
+            edge of the texture or wrap around.
+        """
+        if filter not in TEXTURE_FILTERS:
+            raise ValueError('filter must be one of {}'.format(
+                TEXTURE_FILTERS))
+        if wrap not in TEXTURE_WRAPS:
+            raise ValueError('wrap must be one of {}'.format(TEXTURE_WRAPS))
+        self._linear = filter != 'nearest'
+        self._repeat = wrap == 'repeat'
+
+    def clear_normals_cache(self):
+        r"""Forgets all the vertex normals computed so far."""
+        self._normals_cache.clear()
+
+    def rasterize(self, points, trilist=None, texture=None, tcoords=None,
+                  per_vertex_f3v=None, normals=None,
+                  outputs=DEFAULT_OUTPUTS, out=None, model=None, view=None,
+                  projection=None):
+        r"""Rasterizes a textured mesh along with some float interpolant
+        data, as :meth:`CyRasterizer.rasterize` does.
+
+        Parameters
+        ----------
+        points : ndarray, shape (n_points, 3)
+            The coordinates of points that need to be rasterized
+        trilist: ndarray, shape (n_tris, 3)
+            The connectivity information of the triangulation
+        texture: ndarray, shape (texture_width, texture_height, 3)
+            An RGB texture floating point image (pixel values in range
+            [0, 1]) or uint8 image.
+        tcoords: ndarray, shape (n_points, 2)
+            Per vertex texture coordinates given in the normalized range
+            [0, 1]
+        per_vertex_f3v: ndarray, shape (n_points, 3), optional
+            A matrix specifying arbitrary 3 floating point numbers per
+            vertex, interpolated into the f3v image.
+
+            Default None - points (shape information) used instead.
+        normals: ndarray, shape (n_points, 3), optional
+            Per-vertex normals for 'blinnphong' shading.
+
+            Default None - vertex normals are computed from the topology.
+        outputs: iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+            The images to return, in the order given.
+
+            Default ('rgb', 'f3v', 'mask').
+        out: sequence of ndarray, optional
+            Preallocated arrays to write each of the ``outputs`` into, as
+            for :meth:`CyRasterizer.rasterize`.
+        model, view, projection: ndarray, shape (4, 4), optional
+            New matrices to render with, set as by :meth:`set_camera`.
+            They stay set afterwards.
+
+        Returns
+        -------
+        images : tuple of ndarray
+            The images named in ``outputs`` - rgb and f3v of shape
+            (height, width, 3), mask and depth of shape (height, width).
+        """
+        if texture is None:
+            raise ValueError('A texture must be provided')
+        if trilist is None:
+            raise ValueError('A trilist must be provided')
+        if model is not None or view is not None or projection is not None:
+            self.set_camera(model=model, view=view, projection=projection)
+        outputs = _verify_outputs(outputs)
+        buffers = _output_arrays(outputs, out)
+
+        if (normals is None and self.shading == 'blinnphong' and
+                'rgb' in outputs):
+            if self._normals_cache.max_size == 0:
+                normals = vertex_normals(points, trilist)
+            else:
+                # keyed on the arrays given, before they are converted
+                key = (_array_fingerprint(points),
+                       _array_fingerprint(trilist))
+                normals = self._normals_cache.get(key, points, trilist)
+        points = np.require(points, dtype=np.float32, requirements='C')
+        trilist = np.require(trilist, dtype=np.uint32, requirements='C')
+        tcoords = np.require(tcoords, dtype=np.float32, requirements='C')
+        if per_vertex_f3v is None:
+            per_vertex_f3v = points
+        per_vertex_f3v = np.require(per_vertex_f3v, dtype=np.float32,
+                                    requirements='C')
+        n_points = points.shape[0]
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError('points must have shape (n_points, 3)')
+        if trilist.size != 0 and trilist.max() >= n_points:
+            raise ValueError('trilist indexes points beyond the {} '
+                             'given'.format(n_points))
+        if (tcoords.shape[0] != n_points or
+                per_vertex_f3v.shape[0] != n_points):
+            raise ValueError('tcoords and per_vertex_f3v must have a row '
+                             'for each of the {} points'.format(n_points))
+        texture = np.asarray(texture)[..., :3]
+        if texture.dtype == np.uint8:
+            texture = texture / np.float32(255)
+        texture = np.require(texture, dtype=np.float32, requirements='C')
+
+        homogeneous = np.hstack([points, np.ones((points.shape[0], 1),
+                                                 dtype=np.float32)])
+        eye = homogeneous.dot(self._view_matrix.dot(self._model_matrix).T)
+        clip = np.require(eye.dot(self._projection_matrix.T),
+                          dtype=np.float32, requirements='C')
+        eye = np.require(eye[:, :3], dtype=np.float32, requirements='C')
+        if self.shading == 'blinnphong' and 'rgb' in outputs:
+            normals = np.require(normals, dtype=np.float32, requirements='C')
+
+        image_shape = (self.height, self.width)
+        rgb = f3v = None
+        if 'rgb' in outputs:
+            if self.rgb_dtype == np.float32:
+                rgb = _output_array(buffers.get('rgb'), image_shape + (3,),
+                                    np.float32)
+            else:
+                rgb = np.empty(image_shape + (3,), dtype=np.float32)
+            # cleared to the OpenGL clear colour
+            rgb.fill(1)
+        if 'f3v' in outputs:
+            f3v = _output_array(buffers.get('f3v'), image_shape + (3,),
+                                np.float32)
+            f3v.fill(1)
+        depth = _output_array(buffers.get('depth'), image_shape, np.float32)
+        depth.fill(1)
+
+        rasterize_triangles(clip, trilist, tcoords, per_vertex_f3v, texture,
+                            rgb, f3v, depth, normals=normals, eye=eye,
+                            light_position=self.light_position,
+                            shading=self.shading, linear=self._linear,
+                            repeat=self._repeat, tile_size=self.tile_size)
+
+        images = {'f3v': f3v, 'depth': depth}
+        if rgb is not None and self.rgb_dtype != np.float32:
+            rgb_out = _output_array(buffers.get('rgb'), image_shape + (3,),
+                                    self.rgb_dtype)
+            if self.rgb_dtype == np.uint8:
+                # as OpenGL converts to normalized 8-bit values
+                rgb = np.rint(np.clip(rgb, 0, 1) * 255)
+            rgb_out[...] = rgb
+            rgb = rgb_out
+        images['rgb'] = rgb
+        if 'mask' in outputs:
+            mask = _output_array(buffers.get('mask'), image_shape, bool)
+            images['mask'] = np.less(depth, 1, out=mask)
+        return tuple(images[output] for output in outputs)
@@ -1,8 +1,29 @@
-from libc.stdint cimport uint8_t
+from libc.stdint cimport int32_t, uint8_t, uint64_t
 from libcpp cimport bool
 from c_opengl cimport *
 
 # we need to be able to hold onto a context reference
+cdef extern from "./cpp/glrcontext.h":
+    ctypedef enum glr_STATUS:
+        GLR_SUCCESS
+        GLR_GLFW_INIT_FAILED
+        GLR_GLFW_WINDOW_FAILED
+        GLR_GLEW_FAILED
+        GLR_EGL_INIT_FAILED
+        GLR_EGL_CONTEXT_FAILED
+        GLR_OSMESA_CONTEXT_FAILED
+        GLR_BACKEND_UNAVAILABLE
+
+    ctypedef struct glr_current_context:
+        void* display
+        void* draw
+        void* read
+        void* context
+        void* buffer
+        int width
+        int height
+
+
 cdef extern from "./cpp/glrglfw.h":
     ctypedef struct glr_glfw_context:
         int window_width
@@ -11,20 +32,54 @@ cdef extern from "./cpp/glrglfw.h":
         bool offscreen
         void* window
 
-    ctypedef enum glr_STATUS:
-        GLR_SUCCESS
-        GLR_GLFW_INIT_FAILED
-        GLR_GLFW_WINDOW_FAILED
-        GLR_GLEW_FAILED
-
     cdef glr_glfw_context glr_build_glfw_context_offscreen(int width,
                                                            int height)
     cdef glr_STATUS glr_glfw_init(glr_glfw_context* context, int verbose)
+    cdef void glr_glfw_make_current(glr_glfw_context* context)
+    cdef void glr_glfw_release_current()
+    cdef glr_current_context glr_glfw_get_current()
+    cdef void glr_glfw_restore_current(glr_current_context* current)
     cdef void glr_glfw_terminate(glr_glfw_context* context)
 
 
-# we need to be able to hold onto a scene reference
-cdef extern from "./cpp/glr.h":
+cdef extern from "./cpp/glregl.h":
+    ctypedef struct glr_egl_context:
+        int window_width
+        int window_height
+        void* display
+        void* context
+        void* surface
+
+    cdef glr_egl_context glr_build_egl_context_offscreen(int width,
+                                                         int height)
+    cdef glr_STATUS glr_egl_init(glr_egl_context* context, int verbose)
+    cdef void glr_egl_make_current(glr_egl_context* context)
+    cdef void glr_egl_release_current()
+    cdef glr_current_context glr_egl_get_current()
+    cdef void glr_egl_restore_current(glr_current_context* current)
+    cdef void glr_egl_terminate(glr_egl_context* context)
+
+
+cdef extern from "./cpp/glrosmesa.h":
+    ctypedef struct glr_osmesa_context:
+        int window_width
+        int window_height
+        void* context
+        void* buffer
+
+    cdef glr_osmesa_context glr_build_osmesa_context_offscreen(int width,
+                                                               int height)
+    cdef glr_STATUS glr_osmesa_init(glr_osmesa_context* context, int verbose)
+    cdef void glr_osmesa_make_current(glr_osmesa_context* context)
+    cdef void glr_osmesa_release_current()
+    cdef glr_current_context glr_osmesa_get_current()
+    cdef void glr_osmesa_restore_current(glr_current_context* current)
+    cdef void glr_osmesa_terminate(glr_osmesa_context* context)
+
+
+# we need to be able to hold onto a scene reference. None of the glr calls
+# touch Python, so they can all be made with the GIL released.
+cdef extern from "./cpp/glr.h" nogil:
 
     ctypedef struct glr_texture:
         int internal_format
@@ -57,6 +112,10 @@ cdef extern from "./cpp/glr.h":
         glr_texture texture
         GLuint vao
 
+    ctypedef struct glr_pixel_buffer:
+        GLuint pbo
+        GLsizeiptr size
+
     ctypedef struct glr_camera:
         float projectionMatrix [16]
         float viewMatrix [16]
@@ -87,17 +146,74 @@ cdef extern from "./cpp/glr.h":
             size_t n_tris, float* tcoords, float* texture,
             size_t texture_width, size_t texture_height)
 
+    glr_vectorset glr_build_float_2v(float* vectors, size_t n_vectors)
+    glr_vectorset glr_build_float_3v(float* vectors, size_t n_vectors)
+    glr_vectorset glr_build_unsigned_3v(unsigned* vectors, size_t n_vectors)
+
     glr_texture glr_build_float_rgb_texture(float* t, size_t w, size_t h)
     glr_texture glr_build_float_rgba_texture(float* t, size_t w, size_t h)
-    glr_texture glr_build_uint8_rgb_texture(uint8_t* t, size_t w, size_t h)
-    glr_texture glr_build_uint8_rgba_texture(uint8_t* t, size_t w, size_t h)
+    glr_texture glr_build_float_depth_texture(float* t, size_t w, size_t h)
+    glr_texture glr_build_int_red_texture(int32_t* t, size_t w, size_t h)
+    glr_texture glr_build_half_rgb_texture(void* t, size_t w, size_t h)
+    glr_texture glr_build_half_rgba_texture(void* t, size_t w, size_t h)
+    glr_texture glr_build_uint_rgb_texture(uint8_t* t, size_t w, size_t h)
+    glr_texture glr_build_uint_rgba_texture(uint8_t* t, size_t w, size_t h)
 
     void glr_init_texture(glr_texture *texture)
+    void glr_bind_texture(glr_texture *texture)
+    void glr_generate_mipmaps(glr_texture *texture)
+    GLuint glr_build_sampler(GLint min_filter, GLint mag_filter, GLint wrap)
+    void glr_destroy_sampler(GLuint sampler)
+    void glr_destroy_texture(glr_texture *texture)
     void glr_init_framebuffer(GLuint* fbo, glr_texture* texture, GLuint attachment)
     void glr_init_vao(glr_textured_mesh* mesh)
+    void glr_update_array_buffer(glr_vectorset* vector, GLvoid* data)
     void glr_register_draw_framebuffers(GLuint fbo, size_t n_attachments,
 		 GLenum* attachments);
+    void glr_init_texture_array(glr_texture *texture, GLsizei n_layers)
+    void glr_init_layered_framebuffer(GLuint* fbo, glr_texture* texture,
+                                      GLuint attachment)
+    void glr_read_texture_array(glr_texture* texture, GLenum format,
+                                GLvoid* data)
+    void glr_draw_instanced(glr_textured_mesh* mesh, GLsizei n_instances)
+    GLuint glr_init_uniform_buffer(GLsizeiptr size)
+    void glr_update_uniform_buffer(GLuint ubo, GLsizeiptr size, GLvoid* data)
+    int glr_bind_uniform_block(GLuint program, const GLchar* name, GLuint ubo,
+                               GLuint binding)
+    void glr_destroy_buffer(GLuint buffer)
     void glr_get_framebuffer(glr_texture* texture)
+    void glr_read_framebuffer(glr_texture* texture, GLenum format,
+                              GLvoid* data)
+    void glr_flip_rows(GLvoid* data, size_t n_rows, size_t row_bytes)
+    void glr_clear_int_draw_buffer(GLint draw_buffer, GLint value)
+    void glr_clear_float_draw_buffer(GLint draw_buffer, GLfloat value)
+    void glr_init_pixel_buffer(glr_pixel_buffer* buffer, GLsizeiptr size)
+    void glr_get_framebuffer_async(glr_texture* texture, GLenum format,
+                                   glr_pixel_buffer* buffer)
+    int glr_pixel_buffer_ready(glr_pixel_buffer* buffer)
+    void glr_read_pixel_buffer(glr_pixel_buffer* buffer, GLvoid* data,
+                               GLsizeiptr size)
+    void glr_destroy_pixel_buffer(glr_pixel_buffer* buffer)
+    void glr_scatter_normals(GLuint program, GLuint fbo, glr_texture* target,
+                             glr_textured_mesh* mesh)
+    void glr_gather_normals(GLuint program, GLuint vao, glr_texture* sums,
+                            GLuint buffer, GLsizei n_points)
+    void glr_set_feedback_varying(GLuint program, const GLchar* name)
+    GLuint glr_build_vertex_array()
+    void glr_destroy_vertex_array(GLuint vao)
+    GLint glr_n_program_binary_formats()
+    void glr_set_program_binary_retrievable(GLuint program)
+    GLint glr_get_program_binary_length(GLuint program)
+    void glr_get_program_binary(GLuint program, GLsizei length,
+                                GLenum* format, GLvoid* binary)
+    int glr_load_program_binary(GLuint program, GLenum format,
+                                const GLvoid* binary, GLsizei length)
+    GLuint glr_build_timer()
+    void glr_begin_timer(GLuint timer)
+    void glr_end_timer()
+    int glr_timer_ready(GLuint timer)
+    uint64_t glr_timer_elapsed(GLuint timer)
+    void glr_destroy_timer(GLuint timer)
     void glr_destroy_vbos_on_trianglar_mesh(glr_textured_mesh* mesh)
 
 
@@ -1,13 +1,24 @@
 from libcpp cimport bool
+cimport cython
 cimport numpy as np
+import hashlib
 import logging as log
 import os.path
+import struct
 import sys
+from collections import OrderedDict
+from timeit import default_timer
 import numpy as np
 
 from .c_opengl cimport *
-from .c_opengl_debug cimport *
-from .shader import VertexShader, FragmentShader
+# Tracing every GL call is expensive (it takes the GIL, logs and checks
+# glGetError after each call) so it is only compiled in on request - build with
+# CYRASTERIZE_GL_DEBUG=1 to route all GL calls through c_opengl_debug.
+IF GL_DEBUG:
+    from .c_opengl_debug cimport *
+from .normals import vertex_normals
+from .shader import VertexShader, FragmentShader, GeometryShader
+from .stats import RenderStats
 
 
 SHADER_BASEPATH = os.path.join(os.path.dirname(
@@ -15,24 +26,169 @@ SHADER_BASEPATH = os.path.join(os.path.dirname(
 DEFAULT_VERTEX_SHADER_SRC = open(SHADER_BASEPATH + '.vert', 'rt').read()
 DEFAULT_FRAGMENT_SHADER_SRC = open(SHADER_BASEPATH + '.frag', 'rt').read()
 
+# the default vertex shader with the camera matrices in a uniform block
+CAMERA_VERTEX_SHADER_SRC = open(SHADER_BASEPATH + '_camera.vert', 'rt').read()
+
+# the members of the Camera uniform block, in order, and the binding point
+# of its buffer. A program that declares the block (std140 and row_major, as
+# in blinnphong_camera.vert) has these matrices set through the buffer.
+CAMERA_UNIFORMS = ('modelMatrix', 'viewMatrix', 'projectionMatrix')
+CAMERA_BLOCK_BINDING = 1
+_CAMERA_INDEX = dict((name, i) for i, name in enumerate(CAMERA_UNIFORMS))
+
+# instanced shaders that draw each view of a batch into its own framebuffer
+# layer - see GLRasterizer.render_views
+LAYERED_SHADER_BASEPATH = os.path.join(os.path.dirname(
+    sys.modules['cyrasterize'].__file__), 'shaders', 'layered')
+LAYERED_VERTEX_SHADER_SRC = open(LAYERED_SHADER_BASEPATH + '.vert',
+                                 'rt').read()
+LAYERED_GEOMETRY_SHADER_SRC = open(LAYERED_SHADER_BASEPATH + '.geom',
+                                   'rt').read()
+
+# shaders that write the index of the triangle covering each pixel and its
+# barycentric coordinates - see GLRasterizer.render_barycentric
+BARYCENTRIC_SHADER_BASEPATH = os.path.join(os.path.dirname(
+    sys.modules['cyrasterize'].__file__), 'shaders', 'barycentric')
+BARYCENTRIC_VERTEX_SHADER_SRC = open(BARYCENTRIC_SHADER_BASEPATH + '.vert',
+                                     'rt').read()
+BARYCENTRIC_GEOMETRY_SHADER_SRC = open(BARYCENTRIC_SHADER_BASEPATH + '.geom',
+                                       'rt').read()
+BARYCENTRIC_FRAGMENT_SHADER_SRC = open(BARYCENTRIC_SHADER_BASEPATH + '.frag',
+                                       'rt').read()
+
+# shaders that compute vertex normals on the GPU - see GLScene.compute_normals
+NORMALS_SHADER_BASEPATH = os.path.join(os.path.dirname(
+    sys.modules['cyrasterize'].__file__), 'shaders', 'normals')
+NORMALS_SCATTER_VERTEX_SHADER_SRC = open(
+    NORMALS_SHADER_BASEPATH + '_scatter.vert', 'rt').read()
+NORMALS_SCATTER_GEOMETRY_SHADER_SRC = open(
+    NORMALS_SHADER_BASEPATH + '_scatter.geom', 'rt').read()
+NORMALS_SCATTER_FRAGMENT_SHADER_SRC = open(
+    NORMALS_SHADER_BASEPATH + '_scatter.frag', 'rt').read()
+NORMALS_GATHER_VERTEX_SHADER_SRC = open(
+    NORMALS_SHADER_BASEPATH + '_gather.vert', 'rt').read()
+
+# the width of the float target that vertex normals are summed in on the GPU
+# (a texel per vertex) - OpenGL 3.3 supports textures at least this large
+NORMALS_TARGET_WIDTH = 1024
+
+# the texture unit the summed normals are read from
+NORMALS_TEXTURE_UNIT = 2
+
+# the most views drawn by one layered draw call (MAX_VIEWS in layered.vert)
+MAX_LAYERED_VIEWS = 128
+
+# the number of frames that can be in flight for asynchronous readback
+DEFAULT_READBACK_BUFFERS = 2
+
+# True if this module was built with GL call tracing (CYRASTERIZE_GL_DEBUG=1)
+GL_DEBUG_BUILD = GL_DEBUG
+
+# textures of up to this many bytes in total are kept resident on the GPU
+DEFAULT_TEXTURE_CACHE_BYTES = 256 * 1024 * 1024
+
+# the (min, mag) filters and wrap modes that textures can be sampled with
+TEXTURE_FILTERS = {
+    'nearest': (GL_NEAREST, GL_NEAREST),
+    'linear': (GL_LINEAR, GL_LINEAR),
+    'mipmap': (GL_LINEAR_MIPMAP_LINEAR, GL_LINEAR)
+}
+TEXTURE_WRAPS = {
+    'clamp': GL_CLAMP_TO_EDGE,
+    'repeat': GL_REPEAT
+}
+
+# the dtypes that textures can be uploaded as and colour rendered to. 8-bit
+# and half float pixels are normalised to [0, 1] by OpenGL when sampled.
+PIXEL_DTYPES = ('uint8', 'float16', 'float32')
+
+# the ways an OpenGL context can be created. 'glfw' uses a hidden window (and
+# so needs a display server), 'egl' and 'osmesa' are headless but have to be
+# enabled when building (CYRASTERIZE_EGL=1, CYRASTERIZE_OSMESA=1)
+BACKENDS = ('glfw', 'egl', 'osmesa')
+cdef enum:
+    BACKEND_GLFW
+    BACKEND_EGL
+    BACKEND_OSMESA
+
+# the name of the program a scene starts out with
+DEFAULT_PROGRAM = 'default'
+
+# the class that compiles each type of shader
+SHADER_CLASSES = {
+    GL_VERTEX_SHADER: VertexShader,
+    GL_GEOMETRY_SHADER: GeometryShader,
+    GL_FRAGMENT_SHADER: FragmentShader
+}
+
 ctypedef void (*matrix_fun)(GLint, GLsizei, GLboolean, GLfloat *)
 
 
+cdef dict active_uniform_locations(GLuint program):
+    # the location of every active uniform of a linked program (-1 for the
+    # members of uniform blocks), arrays being listed under their bare name
+    cdef GLint total = 0
+    glGetProgramiv(program, GL_ACTIVE_UNIFORMS, &total)
+    cdef char name[256]
+    cdef GLsizei name_len
+    cdef GLint size
+    cdef GLenum uniform_type
+    cdef GLint i
+    locations = {}
+    for i in range(total):
+        glGetActiveUniform(program, <GLuint> i, sizeof(name) - 1, &name_len,
+                           &size, &uniform_type, name)
+        name[name_len] = 0
+        location = glGetUniformLocation(program, name)
+        uniform_name = str(name.decode('utf8'))
+        if uniform_name.endswith('[0]'):
+            uniform_name = uniform_name[:-3]
+        locations[uniform_name] = location
+    return locations
+
+
+cdef GLuint link_program(shaders, str name,
+                         const GLchar* feedback_varying=NULL,
+                         bint retrievable=False) except 0:
+    # links the shaders into a new program, optionally capturing a varying
+    # of the last vertex processing stage by transform feedback and keeping
+    # the program's binary retrievable
+    cdef GLuint program = glCreateProgram()
+    for shader in shaders:
+        glAttachShader(program, shader.get_id())
+    if feedback_varying != NULL:
+        glr_set_feedback_varying(program, feedback_varying)
+    if retrievable:
+        glr_set_program_binary_retrievable(program)
+    glLinkProgram(program)
+    cdef GLint linked = 0
+    glGetProgramiv(program, GL_LINK_STATUS, &linked)
+    if linked != GL_TRUE:
+        glDeleteProgram(program)
+        raise RuntimeError('Failed to link the {} shaders'.format(name))
+    return program
+
+
 cdef class GLUniform:
-    cdef GLuint location
+    cdef GLint location
     cdef np.ndarray value
     cdef str name
+    # whether the value is float32 (rather than int32)
+    cdef bint is_float
+    # whether the value has changed since it was last uploaded
+    cdef bint dirty
     valid_dtypes = (np.float32, np.int32)
 
-    def __cinit__(self, str name, GLuint location, np.ndarray value):
+    def __cinit__(self, str name, GLint location, np.ndarray value):
         r"""A uniform opengl variable
 
         Parameters
         ----------
         name : str
             The variable name as a string
-        location: GLuint
-            The opengl specific identifier of the uniform
+        location: GLint
+            The opengl specific identifier of the uniform. Uploads to -1 (a
+            uniform the program doesn't have) are ignored.
         value : ndarray
             The value has to have a dtype which is a subclass
             of an int32 or a float32. This only accepts one of the following
@@ -45,13 +201,23 @@ cdef class GLUniform:
                 4,4 : a 4x4 matrix array
 
         """
+        self.name = name
+        self.location = location
+        self.set_value(value)
+
+    cdef int set_value(self, np.ndarray value) except -1:
         if not any([value.dtype == x for x in self.valid_dtypes]):
             raise ValueError('The value dtype must be either {}'.format(
                                  ' or '.join(map(str, self.valid_dtypes))))
-
-        self.name = name
-        self.location = location
-        self.value = value
+        if value.ndim == 2 and not (value.shape[0] == value.shape[1] and
+                                    2 <= value.shape[0] <= 4 and
+                                    value.dtype == np.float32):
+            raise ValueError('Only supports 2x2, 3x3 and 4x4 float matrices')
+        if value.ndim > 2:
+            raise ValueError('Uniforms must be scalars, vectors or matrices')
+        self.value = np.ascontiguousarray(value)
+        self.is_float = value.dtype == np.float32
+        return 0
 
     def __hash__(self):
         return self.location
@@ -63,152 +229,1023 @@ cdef class GLUniform:
                                                        self.value.dtype)
 
     cpdef upload(self):
-        dtype = self.value.dtype
+        # the value was checked by set_value, so this is straight C
         cdef np.ndarray value = self.value
-        cdef GLint vector_len = max(self.value.shape[0], 1)
+        cdef GLsizei size = value.size
+        cdef GLfloat* floats = <GLfloat*> value.data
+        cdef GLint* ints = <GLint*> value.data
 
         cdef matrix_fun matrix_funs[3]
-        matrix_funs[0] = glUniformMatrix2fv
-        matrix_funs[1] = glUniformMatrix3fv
-        matrix_funs[2] = glUniformMatrix4fv
+        # cast as the real GL entry points take a const pointer
+        matrix_funs[0] = <matrix_fun> glUniformMatrix2fv
+        matrix_funs[1] = <matrix_fun> glUniformMatrix3fv
+        matrix_funs[2] = <matrix_fun> glUniformMatrix4fv
+
+        self.dirty = False
+        if value.ndim == 2:
+            matrix_funs[value.shape[0] - 2](self.location, 1, GL_TRUE, floats)
+        elif self.is_float:
+            # vectors of up to 4 are a single vecN, longer ones float arrays
+            if size == 2:
+                glUniform2fv(self.location, 1, floats)
+            elif size == 3:
+                glUniform3fv(self.location, 1, floats)
+            elif size == 4:
+                glUniform4fv(self.location, 1, floats)
+            else:
+                glUniform1fv(self.location, size, floats)
+        else:
+            if size == 2:
+                glUniform2iv(self.location, 1, ints)
+            elif size == 3:
+                glUniform3iv(self.location, 1, ints)
+            elif size == 4:
+                glUniform4iv(self.location, 1, ints)
+            else:
+                glUniform1iv(self.location, size, ints)
 
-        vector_funs = [glUniform1f, glUniform1f, glUniform2f, glUniform3f,
-                       glUniform4f]
+    def get_value(self):
+        return self.value
 
-        if value.ndim <= 1:
-            # value is a vector
-            if vector_len <= 4:
-                  vector_funs[vector_len](*([self.location] + list(self.value)))
-            else:
-                if dtype == np.float32:
-                    glUniform1fv(self.location, <GLint>vector_len,
-                                 <GLfloat*> value.data)
+cdef void flip_frames(void* data, Py_ssize_t n_frames, Py_ssize_t height,
+                      size_t frame_bytes) nogil:
+    # turns a stack of framebuffers read from OpenGL (which stores them bottom
+    # row first) the right way up, in place
+    cdef Py_ssize_t i
+    for i in range(n_frames):
+        glr_flip_rows(<char*> data + i * frame_bytes, height,
+                      frame_bytes // height)
+
+
+cdef np.ndarray output_array(out, tuple shape, dtype):
+    # returns out, checking that pixels can be written straight into it, or a
+    # new array if out is None
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if (out.shape != shape or out.dtype != dtype or
+            not out.flags.c_contiguous or not out.flags.writeable):
+        raise ValueError('Output arrays must be writeable, C contiguous '
+                         '{} arrays of shape {}'.format(np.dtype(dtype).name,
+                                                        shape))
+    return out
+
+
+cdef class GLMesh:
+    r"""A triangular mesh whose vertex data is kept on the GPU.
+
+    Instances are built by :meth:`GLScene.upload_mesh`. The VAO and VBOs
+    stay alive until :meth:`free` is called (or the handle is garbage
+    collected), so the mesh can be rendered any number of times without
+    uploading the geometry again.
+    """
+    cdef glr_textured_mesh mesh
+    # hold onto the scene so the context outlives our GPU buffers
+    cdef object scene
+    cdef bool uploaded
+    cdef readonly unsigned n_points
+    cdef readonly unsigned n_tris
+    # the triangles, kept to recompute the normals when the points change
+    cdef object trilist
+    # whether the normals are computed on the GPU
+    cdef readonly bool gpu_normals
+    # whether the f3v data is the points, and so follows them on update
+    cdef readonly bool f3v_is_points
+
+    def __cinit__(self, scene):
+        self.scene = scene
+        self.uploaded = False
+
+    cdef void release(self):
+        if self.uploaded:
+            glr_destroy_vbos_on_trianglar_mesh(&self.mesh)
+            self.uploaded = False
+
+    def free(self):
+        r"""Releases the GPU buffers held by this mesh. The mesh can no longer
+        be rendered afterwards.
+        """
+        if self.uploaded:
+            self.scene.make_current()
+        self.release()
 
-                elif dtype == np.int32:
-                    glUniform1iv(self.location, <GLint>vector_len,
-                                 <GLint*> value.data)
+    def is_uploaded(self):
+        return self.uploaded
 
-                else:
-                    raise RuntimeError()
+    def update(self, points=None, f3v_data=None, normals=None, tcoords=None):
+        r"""Replaces some of the vertex data of the mesh on the GPU - see
+        :meth:`GLScene.update_mesh`.
+        """
+        self.scene.update_mesh(self, points=points, f3v_data=f3v_data,
+                               normals=normals, tcoords=tcoords)
 
+    def __dealloc__(self):
+        cdef GLScene scene = self.scene
+        cdef glr_current_context previous
+        if self.uploaded and scene is not None:
+            # the handle may be collected in the middle of another scene's
+            # work - free it in our context, then hand that one back
+            previous = scene.switch_context()
+            self.release()
+            scene.restore_context(&previous)
         else:
-            # value is a matrix
-            for num, i in enumerate(range(3), start=2):
-                if num == value.shape[0] and num == value.shape[1]:
-                    matrix_funs[i](self.location, 1, GL_TRUE,
-                                   <GLfloat *> value.data)
-                    return
+            self.release()
+
+
+cdef class GLTexture:
+    r"""A texture that has been uploaded to the GPU.
+
+    Instances are built by :meth:`GLScene.upload_texture`. The OpenGL
+    texture is deleted when :meth:`free` is called or the handle is garbage
+    collected.
+    """
+    cdef glr_texture texture
+    # hold onto the scene so the context outlives our GPU texture
+    cdef object scene
+    cdef bool uploaded
+    cdef bool has_mipmaps
+    cdef readonly size_t nbytes
+
+    def __cinit__(self, scene):
+        self.scene = scene
+        self.uploaded = False
+        self.has_mipmaps = False
+
+    cdef void release(self):
+        if self.uploaded:
+            glr_destroy_texture(&self.texture)
+            self.uploaded = False
+
+    def free(self):
+        r"""Deletes the OpenGL texture. The texture can no longer be used for
+        rendering afterwards.
+        """
+        if self.uploaded:
+            self.scene.make_current()
+        self.release()
 
-            raise ValueError('Only supports 2x2, 3x3 and 4x4 float matrices')
+    def is_uploaded(self):
+        return self.uploaded
 
-    def get_value(self):
-        return self.value
+    def __dealloc__(self):
+        cdef GLScene scene = self.scene
+        cdef glr_current_context previous
+        if self.uploaded and scene is not None:
+            # the handle may be collected in the middle of another scene's
+            # work - free it in our context, then hand that one back
+            previous = scene.switch_context()
+            self.release()
+            scene.restore_context(&previous)
+        else:
+            self.release()
+
+
+cdef class GLTextureCache:
+    r"""A least recently used cache of textures resident on the GPU.
+
+    Textures are stored against an arbitrary hashable key. Inserting a
+    texture evicts (and frees) the least recently used textures until the
+    total size of the cache fits within ``max_bytes``. A texture that is
+    larger than the whole budget is never cached.
+
+    Parameters
+    ----------
+    max_bytes : `int`
+        The maximum number of bytes of texture data to keep on the GPU. ``0``
+        disables caching.
+    """
+    cdef object textures
+    cdef readonly size_t max_bytes
+    cdef readonly size_t nbytes
+
+    def __cinit__(self, size_t max_bytes):
+        self.textures = OrderedDict()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.textures)
+
+    def __contains__(self, key):
+        return key in self.textures
+
+    def get(self, key):
+        r"""Returns the :class:`GLTexture` stored against ``key`` (marking
+        it as the most recently used) or ``None`` if there is no such texture.
+        """
+        texture = self.textures.pop(key, None)
+        if texture is not None:
+            self.textures[key] = texture
+        return texture
+
+    def insert(self, key, GLTexture texture not None):
+        r"""Stores ``texture`` against ``key``, evicting the least recently
+        used textures as required. Returns ``True`` if the texture was cached.
+        """
+        self.remove(key)
+        if texture.nbytes > self.max_bytes:
+            return False
+        self.evict(self.max_bytes - texture.nbytes)
+        self.textures[key] = texture
+        self.nbytes += texture.nbytes
+        return True
+
+    def remove(self, key):
+        cdef GLTexture texture = self.textures.pop(key, None)
+        if texture is not None:
+            self.nbytes -= texture.nbytes
+
+    def resize(self, size_t max_bytes):
+        r"""Changes the byte budget of the cache, evicting textures if the
+        cache no longer fits.
+        """
+        self.max_bytes = max_bytes
+        self.evict(max_bytes)
+
+    def clear(self):
+        r"""Frees every texture held by the cache."""
+        cdef GLTexture texture
+        for texture in self.textures.values():
+            texture.release()
+        self.textures.clear()
+        self.nbytes = 0
+
+    cdef void evict(self, size_t max_bytes):
+        cdef GLTexture texture
+        while self.nbytes > max_bytes:
+            _, texture = self.textures.popitem(last=False)
+            self.nbytes -= texture.nbytes
+            texture.release()
+
+
+cdef class GLSamplerRegistry:
+    r"""Builds and owns the OpenGL sampler objects used to sample textures.
+
+    A sampler is built the first time a given combination of filter and wrap
+    mode is requested and is then reused for every subsequent render, so no
+    driver objects are created per render.
+    """
+    cdef dict samplers
+
+    def __cinit__(self):
+        self.samplers = dict()
+
+    def __len__(self):
+        return len(self.samplers)
+
+    cpdef GLuint get(self, str filter='nearest', str wrap='clamp') except? 0:
+        r"""Returns the sampler for the given settings.
+
+        Parameters
+        ----------
+        filter : {'nearest', 'linear', 'mipmap'}
+            How texels are filtered. 'mipmap' uses trilinear filtering.
+        wrap : {'clamp', 'repeat'}
+            How texture coordinates outside of [0, 1] are handled.
+        """
+        key = (filter, wrap)
+        sampler = self.samplers.get(key)
+        if sampler is None:
+            if filter not in TEXTURE_FILTERS:
+                raise ValueError('filter must be one of {}'.format(
+                    ', '.join(sorted(TEXTURE_FILTERS))))
+            if wrap not in TEXTURE_WRAPS:
+                raise ValueError('wrap must be one of {}'.format(
+                    ', '.join(sorted(TEXTURE_WRAPS))))
+            min_filter, mag_filter = TEXTURE_FILTERS[filter]
+            sampler = glr_build_sampler(min_filter, mag_filter,
+                                        TEXTURE_WRAPS[wrap])
+            self.samplers[key] = sampler
+        return sampler
+
+    def clear(self):
+        r"""Deletes every sampler built by the registry."""
+        for sampler in self.samplers.values():
+            glr_destroy_sampler(sampler)
+        self.samplers.clear()
+
+
+cdef class GLProgramCache:
+    r"""Compiles shaders and links programs at most once per set of sources.
+
+    Shaders are kept against their type and source and programs against the
+    sources of their shaders, so switching between shader sets never
+    compiles or links again. With a ``cache_dir`` (and a driver that
+    supports program binaries) the binary of every program linked is saved
+    there, and later processes load it instead of compiling. Binaries that
+    the driver rejects, e.g. after a driver update, are compiled from
+    source as usual and saved again.
+
+    Parameters
+    ----------
+    cache_dir : `str`, optional
+        The directory program binaries are saved to and loaded from.
+    """
+    cdef dict shaders
+    cdef dict programs
+    # the uniform locations of each program, found when it's linked
+    cdef dict locations
+    cdef readonly object cache_dir
+    # identifies the driver that binaries are built by (False if binaries
+    # aren't supported) - None until first needed
+    cdef object driver
+    # the shaders compiled, programs linked from them and programs loaded
+    # from binaries
+    cdef readonly unsigned n_compiled
+    cdef readonly unsigned n_linked
+    cdef readonly unsigned n_loaded
+
+    def __cinit__(self, cache_dir=None):
+        self.shaders = dict()
+        self.programs = dict()
+        self.locations = dict()
+        if cache_dir is not None:
+            cache_dir = os.path.expanduser(cache_dir)
+        self.cache_dir = cache_dir
+
+    def __len__(self):
+        return len(self.programs)
+
+    def add_shader(self, shader):
+        r"""Keeps an already compiled :class:`ShaderSource`, so that its
+        source isn't compiled again.
+        """
+        self.shaders.setdefault((shader.get_type(), shader.source), shader)
+
+    cpdef shader(self, GLenum shader_type, str source):
+        r"""Returns the shader compiled from ``source``, only compiling it
+        the first time it is asked for.
+        """
+        key = (shader_type, source)
+        shader = self.shaders.get(key)
+        if shader is None:
+            shader = SHADER_CLASSES[shader_type](source)
+            self.shaders[key] = shader
+            self.n_compiled += 1
+        return shader
+
+    cpdef GLuint program(self, tuple sources, str name='shader',
+                         bytes feedback_varying=None) except 0:
+        r"""Returns the program of the given shaders, loading its binary or
+        linking it the first time it is asked for.
+
+        Parameters
+        ----------
+        sources : `tuple` of ``(shader_type, source)``
+            The type and source of each shader of the program.
+        name : `str`, optional
+            What the program is called in errors.
+        feedback_varying : `bytes`, optional
+            The varying captured by transform feedback, if any.
+        """
+        key = (sources, feedback_varying)
+        cdef GLuint program = self.programs.get(key, 0)
+        cdef const GLchar* varying = NULL
+        if program != 0:
+            return program
+        path = self.binary_path(key)
+        if path is not None:
+            program = self.load_binary(path)
+        if program != 0:
+            self.n_loaded += 1
+        else:
+            shaders = [self.shader(t, source) for t, source in sources]
+            if feedback_varying is not None:
+                varying = feedback_varying
+            program = link_program(shaders, name, varying, path is not None)
+            self.n_linked += 1
+            if path is not None:
+                self.save_binary(program, path)
+        self.programs[key] = program
+        self.locations[program] = active_uniform_locations(program)
+        return program
+
+    cpdef clear(self):
+        r"""Deletes every program linked or loaded, which must be done with
+        their context current. Shaders compiled are kept.
+        """
+        cdef GLuint program
+        for program in self.programs.values():
+            glDeleteProgram(program)
+        self.programs.clear()
+        self.locations.clear()
+
+    cpdef dict uniform_locations(self, GLuint program):
+        r"""The location of each uniform of a program built by the cache,
+        by name. Names looked up that the program doesn't have are -1.
+        """
+        return self.locations[program]
+
+    cdef binary_path(self, key):
+        # the file the binary of the program is kept in, if any
+        if self.cache_dir is None:
+            return None
+        if self.driver is None:
+            if glr_n_program_binary_formats() > 0:
+                self.driver = b'\n'.join(
+                    <bytes><char*>glGetString(name)
+                    for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+            else:
+                log.info('The driver does not support program binaries')
+                self.driver = False
+        if not self.driver:
+            return None
+        sources, feedback_varying = key
+        digest = hashlib.sha1(self.driver)
+        for shader_type, source in sources:
+            digest.update('\0{}\0{}'.format(shader_type,
+                                              source).encode('utf-8'))
+        if feedback_varying is not None:
+            digest.update(b'\0' + feedback_varying)
+        return os.path.join(self.cache_dir, digest.hexdigest() + '.bin')
+
+    cdef GLuint load_binary(self, path) except? 0:
+        # the program loaded from the binary at path, or 0 if there's none
+        # or the driver rejects it
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return 0
+        if len(data) <= 4:
+            return 0
+        cdef GLenum binary_format = struct.unpack('<I', data[:4])[0]
+        cdef np.ndarray[np.uint8_t, ndim=1] binary = np.frombuffer(
+            data, dtype=np.uint8, offset=4).copy()
+        cdef GLuint program = glCreateProgram()
+        if not glr_load_program_binary(program, binary_format, &binary[0],
+                                       binary.shape[0]):
+            log.info('The driver rejected the program binary {} - compiling '
+                     'from source'.format(path))
+            glDeleteProgram(program)
+            return 0
+        return program
+
+    cdef int save_binary(self, GLuint program, path) except -1:
+        cdef GLint length = glr_get_program_binary_length(program)
+        if length <= 0:
+            return 0
+        cdef np.ndarray[np.uint8_t, ndim=1] binary = np.empty(
+            length, dtype=np.uint8)
+        cdef GLenum binary_format = 0
+        glr_get_program_binary(program, length, &binary_format, &binary[0])
+        # written under a temporary name then renamed, so that other
+        # processes sharing the directory never read part of a binary
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(temp_path, 'wb') as f:
+                f.write(struct.pack('<I', binary_format))
+                f.write(binary.tobytes())
+            os.rename(temp_path, path)
+        except (IOError, OSError) as e:
+            log.warning('Failed to save the program binary {}: {}'.format(
+                path, e))
+        return 0
+
+
+cdef class GLLayeredTarget:
+    r"""A layered framebuffer - colour, f3v and depth texture arrays with a
+    layer per view - that a batch of views is rendered into by a single
+    instanced draw. Built by :meth:`GLScene.get_layered_target`.
+    """
+    cdef GLuint fbo
+    cdef glr_texture rgb
+    cdef glr_texture f3v
+    cdef glr_texture depth
+    cdef readonly int n_layers
+    cdef bool initialised
+
+    def __cinit__(self, int n_layers):
+        self.n_layers = n_layers
+
+    cdef void release(self):
+        if self.initialised:
+            glDeleteFramebuffers(1, &self.fbo)
+            glr_destroy_texture(&self.rgb)
+            glr_destroy_texture(&self.f3v)
+            glr_destroy_texture(&self.depth)
+            self.initialised = False
+
+
+cdef class GLPixelBuffers:
+    r"""One slot of the asynchronous readback ring - the pixel buffer
+    objects that the colour, f3v and depth framebuffers are copied into.
+    """
+    cdef glr_pixel_buffer rgb
+    cdef glr_pixel_buffer f3v
+    cdef glr_pixel_buffer depth
+    cdef bool initialised
+
+    def __cinit__(self, size_t rgb_bytes, size_t f3v_bytes,
+                  size_t depth_bytes):
+        glr_init_pixel_buffer(&self.rgb, rgb_bytes)
+        glr_init_pixel_buffer(&self.f3v, f3v_bytes)
+        glr_init_pixel_buffer(&self.depth, depth_bytes)
+        self.initialised = True
+
+    cdef void release(self):
+        if self.initialised:
+            glr_destroy_pixel_buffer(&self.rgb)
+            glr_destroy_pixel_buffer(&self.f3v)
+            glr_destroy_pixel_buffer(&self.depth)
+            self.initialised = False
 
-def normalize_v3(arr):
-    """ Normalize a numpy array of 3 component vectors shape=(n,3)"""
-    lens = np.sqrt( arr[:,0]**2 + arr[:,1]**2 + arr[:,2]**2 )
-    arr[:,0] /= lens
-    arr[:,1] /= lens
-    arr[:,2] /= lens
-    return arr
-
-
-def vertex_normals(points, trilist):
-    # Create a zeroed array with the same type and shape as our vertices
-    # i.e., per vertex normal
-    cdef np.ndarray[float, ndim=2, mode="c"] norm = np.zeros(
-        (points.shape[0], points.shape[1]), dtype=np.float32)
-    tris = points[trilist]
-
-    # Calculate the normal for all the triangles, by taking the cross product
-    # of the vectors v1-v0, and v2-v0 in each triangle
-    n = np.cross(tris[::,1 ] - tris[::,0]  , tris[::,2 ] - tris[::,0])
-
-    # n is now an array of normals per triangle. The length of each normal is
-    # dependent the vertices, we need to normalize these, so that our next step
-    # weights each normal equally.
-    normalize_v3(n)
-
-    # now we have a normalized array of normals, one per triangle,
-    # i.e., per triangle normals.
-    # But instead of one per triangle (i.e., flat shading), we add to each
-    # vertex in that triangle, the triangles' normal. Multiple triangles would
-    # then contribute to every vertex, so we need to normalize again afterwards.
-    # The cool part, we can actually add the normals through an indexed view of
-    # our (zeroed) per vertex normal array
-    norm[ trilist[:,0] ] += n
-    norm[ trilist[:,1] ] += n
-    norm[ trilist[:,2] ] += n
-    normalize_v3(norm)
-
-    return norm
+    def __dealloc__(self):
+        self.release()
+
+
+cdef class GLReadback:
+    r"""A future-like handle on framebuffers that are being read back from
+    the GPU asynchronously. Built by :meth:`GLScene.render_offscreen_rgb_async`.
+
+    The pixels are copied out of the pixel buffers the first time
+    :meth:`result` is called (or when the scene needs the buffers for a later
+    frame), after which the buffers are handed back to the scene.
+    """
+    cdef object scene
+    cdef GLPixelBuffers buffers
+    # which of the framebuffers are being read back
+    cdef bool read_rgb
+    cdef bool read_f3v
+    cdef bool read_depth
+    # 4 if the alpha channel of the colour framebuffer is read, otherwise 3
+    cdef int rgb_channels
+    cdef object rgb_pixels
+    cdef object f3v_pixels
+    cdef object depth_pixels
+
+    def __cinit__(self, scene, GLPixelBuffers buffers not None,
+                  bool read_rgb, bool read_f3v, bool read_depth,
+                  int rgb_channels=3):
+        self.scene = scene
+        self.buffers = buffers
+        self.read_rgb = read_rgb
+        self.read_f3v = read_f3v
+        self.read_depth = read_depth
+        self.rgb_channels = rgb_channels
+
+    def done(self):
+        r"""Returns ``True`` if the pixels have arrived, i.e. :meth:`result`
+        will not block.
+        """
+        self.scene.make_current()
+        if self.buffers is None:
+            return True
+        return ((not self.read_rgb or
+                 glr_pixel_buffer_ready(&self.buffers.rgb) != 0) and
+                (not self.read_f3v or
+                 glr_pixel_buffer_ready(&self.buffers.f3v) != 0) and
+                (not self.read_depth or
+                 glr_pixel_buffer_ready(&self.buffers.depth) != 0))
+
+    cdef void fetch(self):
+        if self.buffers is None:
+            return
+        cdef int height = self.scene.height
+        cdef int width = self.scene.width
+        cdef np.ndarray rgb
+        cdef np.ndarray f3v
+        cdef np.ndarray depth
+        cdef void* data
+        cdef size_t nbytes_read
+        render_stats = self.scene.render_stats
+        cdef double start = default_timer()
+        cdef size_t nbytes = 0
+        # waiting on the fences, copying the pixels out and flipping them
+        # doesn't need the GIL, so other threads can run in the meantime
+        if self.read_rgb:
+            rgb = np.empty((height, width, self.rgb_channels),
+                           dtype=self.scene.rgb_dtype)
+            data = np.PyArray_DATA(rgb)
+            nbytes_read = rgb.nbytes
+            with nogil:
+                glr_read_pixel_buffer(&self.buffers.rgb, data, nbytes_read)
+                flip_frames(data, 1, height, nbytes_read)
+            self.rgb_pixels = rgb
+        if self.read_f3v:
+            f3v = np.empty((height, width, 3), dtype=np.float32)
+            data = np.PyArray_DATA(f3v)
+            nbytes_read = f3v.nbytes
+            with nogil:
+                glr_read_pixel_buffer(&self.buffers.f3v, data, nbytes_read)
+                flip_frames(data, 1, height, nbytes_read)
+            self.f3v_pixels = f3v
+        if self.read_depth:
+            depth = np.empty((height, width), dtype=np.float32)
+            data = np.PyArray_DATA(depth)
+            nbytes_read = depth.nbytes
+            with nogil:
+                glr_read_pixel_buffer(&self.buffers.depth, data, nbytes_read)
+                flip_frames(data, 1, height, nbytes_read)
+            self.depth_pixels = depth
+        self.buffers = None
+        if render_stats is not None:
+            for pixels in (self.rgb_pixels, self.f3v_pixels,
+                           self.depth_pixels):
+                if pixels is not None:
+                    nbytes += pixels.nbytes
+            render_stats.record('readback', default_timer() - start)
+            render_stats.bytes_read_back += nbytes
+
+    def result(self):
+        r"""Waits for the readback to complete and returns the colour, f3v
+        and depth framebuffers, exactly as
+        :meth:`GLScene.render_offscreen_rgb`.
+        """
+        self.scene.make_current()
+        self.fetch()
+        return self.rgb_pixels, self.f3v_pixels, self.depth_pixels
 
+
+# no_gc_clear ensures the texture cache is still around in __dealloc__ so we
+# can free the textures before the context is torn down
+@cython.no_gc_clear
 cdef class GLScene:
     cdef GLuint program
     cdef GLuint fbo
     cdef bool success
     cdef glr_texture fb_rgb_target
     cdef glr_texture fb_f3v_target
-
-    # store the pixels permanently
-    cdef float[:, :, ::1] rgb_pixels
-    cdef float[:, :, ::1] f3v_pixels
-
-    cdef int width
-    cdef int height
-
-    cdef glr_textured_mesh mesh
-
+    cdef glr_texture fb_depth_target
+
+    # which of the framebuffers are drawn to and read back
+    cdef bool output_rgb
+    cdef bool output_f3v
+    cdef bool output_depth
+    # whether the colour framebuffer is read with its alpha channel (which
+    # the mask is taken from), and so the format and channels it's read as
+    cdef bool output_alpha
+    cdef GLenum rgb_format
+    cdef int rgb_channels
+
+    cdef readonly int width
+    cdef readonly int height
+    # the dtype of the colour framebuffer
+    cdef readonly object rgb_dtype
+
+    # ring of pixel buffers used by asynchronous readback, along with the
+    # readback currently using each slot (if any)
+    cdef list readback_buffers
+    cdef list readbacks
+    cdef int readback_index
+
+    # the source of each type of shader of the program
     cdef dict shaders
     cdef dict uniforms
-
+    # every shader and program built in this context
+    cdef readonly GLProgramCache programs
+    # the name of the program in use, and the shaders, uniforms and program
+    # of every other named program (see add_program)
+    cdef readonly str program_name
+    cdef dict named_programs
+    # the name of the program whose uniforms each linked program holds -
+    # programs of the same shaders are shared between names
+    cdef dict program_owners
+    # the uniform locations of the program in use (see
+    # GLProgramCache.uniform_locations), and that of its texture sampler
+    cdef dict locations
+    cdef GLint texture_location
+    # the uniforms set since the program in use last drew - uniforms are
+    # only uploaded by flush_uniforms, just before a draw
+    cdef list dirty_uniforms
+
+    # the matrices of the Camera uniform block (CAMERA_UNIFORMS) and the
+    # buffer they are written to in one go, for programs that declare the
+    # block. Whether each program does is found the first time it's used.
+    cdef np.ndarray camera
+    cdef GLuint camera_ubo
+    cdef bint camera_block
+    cdef bint camera_dirty
+    cdef dict camera_programs
+
+    # the layered framebuffer used to render batches of views, if any
+    cdef GLLayeredTarget layered_target
+
+    # the framebuffer of barycentric renders - an integer triangle index
+    # target alongside the f3v (barycentric coordinates) and depth targets
+    cdef GLuint barycentric_fbo
+    cdef glr_texture fb_triangle_target
+    cdef bool barycentric_initialised
+
+    # the programs, framebuffer and float target that vertex normals are
+    # computed with on the GPU, along with the (attribute-less) vertex array
+    # that the gather pass is drawn from - see compute_normals
+    cdef GLuint normals_scatter_program
+    cdef GLuint normals_gather_program
+    cdef GLuint normals_fbo
+    cdef glr_texture normals_target
+    cdef GLuint normals_vao
+    cdef bool normals_initialised
+
+    cdef readonly GLTextureCache texture_cache
+    cdef readonly GLSamplerRegistry samplers
+    # the sampler that mesh textures are currently rendered with
+    cdef GLuint sampler
+    cdef bool sampler_mipmaps
+
+    # the context backend (one of BACKENDS) and its context - only the one
+    # for the backend in use is ever built
+    cdef readonly object backend
+    cdef int backend_id
     cdef glr_glfw_context context
-
-    def __cinit__(self, int width, int height, int verbose):
+    cdef glr_egl_context egl_context
+    cdef glr_osmesa_context osmesa_context
+
+    # what has been gathered while profiling (None when not profiling),
+    # along with the GPU timers of draws - either free to be reused or
+    # waiting on their results, oldest first
+    cdef readonly object render_stats
+    cdef list free_timers
+    cdef list pending_timers
+    cdef GLuint running_timer
+
+    def __cinit__(self, int width, int height, int verbose,
+                  rgb_dtype=np.float32, backend='glfw',
+                  program_cache_dir=None):
+        self.rgb_dtype = np.dtype(rgb_dtype)
+        if self.rgb_dtype.name not in PIXEL_DTYPES:
+            raise ValueError('rgb_dtype must be one of {}'.format(
+                PIXEL_DTYPES))
+        if backend not in BACKENDS:
+            raise ValueError('backend must be one of {}, not {}'.format(
+                BACKENDS, backend))
         self.shaders = dict()
+        self.uniforms = dict()
+        self.program_name = DEFAULT_PROGRAM
+        self.named_programs = dict()
+        self.program_owners = dict()
+        self.locations = dict()
+        self.texture_location = -1
+        self.dirty_uniforms = []
+        self.camera = np.zeros((len(CAMERA_UNIFORMS), 4, 4), dtype=np.float32)
+        self.camera_programs = dict()
+        self.texture_cache = GLTextureCache(DEFAULT_TEXTURE_CACHE_BYTES)
+        self.samplers = GLSamplerRegistry()
+        self.readback_buffers = []
+        self.readbacks = []
+        self.readback_index = 0
+        self.free_timers = []
+        self.pending_timers = []
         self.width = width
         self.height = height
 
-        self.context = glr_build_glfw_context_offscreen(width, height)
+        self.backend = backend
+        self.backend_id = BACKENDS.index(backend)
         # init our context
         cdef glr_STATUS status
-        status = glr_glfw_init(&self.context, verbose)
+        if self.backend_id == BACKEND_EGL:
+            self.egl_context = glr_build_egl_context_offscreen(width, height)
+            status = glr_egl_init(&self.egl_context, verbose)
+        elif self.backend_id == BACKEND_OSMESA:
+            self.osmesa_context = glr_build_osmesa_context_offscreen(width,
+                                                                     height)
+            status = glr_osmesa_init(&self.osmesa_context, verbose)
+        else:
+            self.context = glr_build_glfw_context_offscreen(width, height)
+            status = glr_glfw_init(&self.context, verbose)
         cdef bool success = status == GLR_SUCCESS
 
         if not success:
-            raise RuntimeError('glr_glfw_init failed with error {}'.format(status))
+            raise RuntimeError('glr_{}_init failed with error {}'.format(
+                backend, status))
 
-        self.program = glCreateProgram()
+        self.programs = GLProgramCache(program_cache_dir)
 
         self.success = success
 
-        self.rgb_pixels = np.empty((self.height, self.width, 4),
-                                   dtype=np.float32)
-        self.f3v_pixels = np.empty((self.height, self.width, 3),
-                                   dtype=np.float32)
-
-        cdef glr_texture fb_rgb_target = glr_build_float_rgba_texture(
-            &self.rgb_pixels[0, 0, 0], self.width, self.height)
-
+        # the framebuffer targets start out empty - their pixels are read
+        # straight into the arrays handed back by read_framebuffers
+        cdef glr_texture fb_rgb_target = self.build_rgb_target()
 
         cdef glr_texture fb_f3v_target = glr_build_float_rgb_texture(
-            &self.f3v_pixels[0, 0, 0], self.width, self.height)
+            NULL, self.width, self.height)
+
+        cdef glr_texture fb_depth_target = glr_build_float_depth_texture(
+            NULL, self.width, self.height)
 
         self.fb_rgb_target = fb_rgb_target
         self.fb_f3v_target = fb_f3v_target
+        self.fb_depth_target = fb_depth_target
 
         self.init_frame_buffer()
+        self.set_outputs()
+        self.set_texture_sampling()
+
+    cdef glr_texture build_rgb_target(self):
+        # an empty colour framebuffer target of rgb_dtype
+        if self.rgb_dtype == np.uint8:
+            return glr_build_uint_rgba_texture(NULL, self.width, self.height)
+        elif self.rgb_dtype == np.float16:
+            return glr_build_half_rgba_texture(NULL, self.width, self.height)
+        else:
+            return glr_build_float_rgba_texture(NULL, self.width, self.height)
+
+    def set_outputs(self, bool rgb=True, bool f3v=True, bool depth=False,
+                    bool alpha=False):
+        r"""Chooses which framebuffers subsequent renders write to and read
+        back. Disabled colour targets are removed from the draw buffers, so
+        they cost neither fill rate nor readback bandwidth, and are returned
+        as ``None``. The depth buffer is always written (it is required for
+        z-buffering) but is only read back if ``depth`` is ``True``. If
+        ``alpha`` is ``True`` the colour framebuffer is read back as RGBA
+        rather than RGB.
+        """
+        self.make_current()
+        self.output_rgb = rgb
+        self.output_f3v = f3v
+        self.output_depth = depth
+        self.output_alpha = alpha
+        self.rgb_format = GL_RGBA if alpha else GL_RGB
+        self.rgb_channels = 4 if alpha else 3
+        self.register_outputs(self.fbo)
+
+    cdef void register_outputs(self, GLuint fbo):
+        # draw to the colour attachments of fbo that are being read back
+        cdef GLenum buffers[2]
+        buffers[0] = GL_COLOR_ATTACHMENT0 if self.output_rgb else GL_NONE
+        buffers[1] = GL_COLOR_ATTACHMENT1 if self.output_f3v else GL_NONE
+        glr_register_draw_framebuffers(fbo, 2, buffers)
+
+    cdef GLLayeredTarget get_layered_target(self, int n_layers):
+        # returns a layered framebuffer of n_layers, only building a new one
+        # if the number of layers has changed
+        if self.layered_target is not None:
+            if self.layered_target.n_layers == n_layers:
+                return self.layered_target
+            self.layered_target.release()
+            self.layered_target = None
+
+        cdef GLLayeredTarget target = GLLayeredTarget(n_layers)
+        target.rgb = self.build_rgb_target()
+        target.f3v = glr_build_float_rgb_texture(NULL, self.width,
+                                                 self.height)
+        target.depth = glr_build_float_depth_texture(NULL, self.width,
+                                                     self.height)
+        target.rgb.unit = 0
+        target.f3v.unit = 0
+        target.depth.unit = 0
+        glr_init_texture_array(&target.rgb, n_layers)
+        glr_init_texture_array(&target.f3v, n_layers)
+        glr_init_texture_array(&target.depth, n_layers)
+
+        glGenFramebuffers(1, &target.fbo)
+        target.initialised = True
+        glr_init_layered_framebuffer(&target.fbo, &target.rgb,
+                                     GL_COLOR_ATTACHMENT0)
+        glr_init_layered_framebuffer(&target.fbo, &target.f3v,
+                                     GL_COLOR_ATTACHMENT1)
+        glr_init_layered_framebuffer(&target.fbo, &target.depth,
+                                     GL_DEPTH_ATTACHMENT)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, target.fbo)
+        cdef GLenum status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            target.release()
+            raise RuntimeError("Layered framebuffer error: %d 0x%04X" % (
+                status, status))
+        self.layered_target = target
+        return target
+
+    cdef GLuint get_barycentric_fbo(self) except 0:
+        # returns the barycentric framebuffer, building it on first use
+        if self.barycentric_initialised:
+            return self.barycentric_fbo
+        self.fb_triangle_target = glr_build_int_red_texture(
+            NULL, self.width, self.height)
+        self.fb_triangle_target.unit = 0
+        glr_init_texture(&self.fb_triangle_target)
+        glGenFramebuffers(1, &self.barycentric_fbo)
+        self.barycentric_initialised = True
+        glr_init_framebuffer(&self.barycentric_fbo, &self.fb_triangle_target,
+                             GL_COLOR_ATTACHMENT0)
+        glr_init_framebuffer(&self.barycentric_fbo, &self.fb_f3v_target,
+                             GL_COLOR_ATTACHMENT1)
+        glr_init_framebuffer(&self.barycentric_fbo, &self.fb_depth_target,
+                             GL_DEPTH_ATTACHMENT)
+        cdef GLenum buffers[2]
+        buffers[0] = GL_COLOR_ATTACHMENT0
+        buffers[1] = GL_COLOR_ATTACHMENT1
+        glr_register_draw_framebuffers(self.barycentric_fbo, 2, buffers)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, self.barycentric_fbo)
+        cdef GLenum status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.release_barycentric_fbo()
+            raise RuntimeError("Barycentric framebuffer error: %d 0x%04X" % (
+                status, status))
+        return self.barycentric_fbo
+
+    cdef void release_barycentric_fbo(self):
+        if self.barycentric_initialised:
+            glDeleteFramebuffers(1, &self.barycentric_fbo)
+            glr_destroy_texture(&self.fb_triangle_target)
+            self.barycentric_initialised = False
+
+    def set_texture_sampling(self, str filter='nearest', str wrap='clamp'):
+        r"""Sets how mesh textures are sampled in subsequent renders.
+
+        Parameters
+        ----------
+        filter : {'nearest', 'linear', 'mipmap'}
+            How texels are filtered. 'mipmap' uses trilinear filtering - the
+            mipmaps of a texture are built the first time it is rendered
+            with this filter.
+        wrap : {'clamp', 'repeat'}
+            How texture coordinates outside of [0, 1] are handled.
+        """
+        self.make_current()
+        self.sampler = self.samplers.get(filter, wrap)
+        self.sampler_mipmaps = filter == 'mipmap'
+
+    def set_profiling(self, bool enabled=True):
+        r"""Starts (or stops) gathering the timings of each stage of
+        rendering and the bytes transferred to and from the GPU, which are
+        returned by :meth:`stats`. Draws are timed on the GPU by timer
+        queries, whose results are collected without stalling the pipeline.
+        Stopping discards everything gathered.
+        """
+        self.make_current()
+        if enabled:
+            if self.render_stats is None:
+                self.render_stats = RenderStats()
+        else:
+            self.release_timers()
+            self.render_stats = None
+
+    def stats(self):
+        r"""Returns the :class:`RenderStats` gathered since profiling was
+        enabled (``None`` if it isn't), once the GPU timings of every draw
+        so far have arrived.
+        """
+        self.make_current()
+        self.collect_timers(True)
+        return self.render_stats
+
+    cdef void begin_timer(self):
+        # starts timing the GPU commands that follow, if profiling
+        if self.render_stats is None:
+            return
+        self.collect_timers(False)
+        if self.free_timers:
+            self.running_timer = self.free_timers.pop()
+        else:
+            self.running_timer = glr_build_timer()
+        glr_begin_timer(self.running_timer)
+
+    cdef void end_timer(self):
+        if self.running_timer == 0:
+            return
+        glr_end_timer()
+        self.pending_timers.append(self.running_timer)
+        self.running_timer = 0
+
+    cdef void collect_timers(self, bool wait):
+        # records the draw times that have arrived (or all of them, waiting
+        # if necessary). Results arrive in the order the draws were made.
+        cdef GLuint timer
+        while self.pending_timers:
+            timer = self.pending_timers[0]
+            if not wait and not glr_timer_ready(timer):
+                break
+            self.render_stats.record('draw', glr_timer_elapsed(timer) * 1e-9)
+            self.free_timers.append(self.pending_timers.pop(0))
+
+    cdef void release_timers(self):
+        cdef GLuint timer
+        for timer in self.free_timers + self.pending_timers:
+            glr_destroy_timer(timer)
+        self.free_timers = []
+        self.pending_timers = []
+
+    cdef double start_stage(self):
+        # the wall clock time a stage starts at, if profiling
+        return default_timer() if self.render_stats is not None else 0
+
+    cdef void end_stage(self, str stage, double start, size_t nbytes=0):
+        # records the time taken by a stage that transferred nbytes to
+        # (for uploads) or from (for readbacks) the GPU
+        if self.render_stats is None:
+            return
+        self.render_stats.record(stage, default_timer() - start)
+        if stage == 'readback':
+            self.render_stats.bytes_read_back += nbytes
+        else:
+            self.render_stats.bytes_uploaded += nbytes
 
     def attach_shaders(self, shaders):
         for shader in shaders:
             self.attach_shader(shader)
 
-        glLinkProgram(self.program)
+        self.link_shaders()
 
 
     def attach_shader(self, shader):
         """
-        Attaches a shader to the engine.
+        Attaches a shader to the engine. The program isn't relinked until
+        :meth:`attach_shaders` or :meth:`set_shader_sources` is called.
 
         Properties:
 
@@ -220,15 +1257,178 @@ cdef class GLScene:
         if shader.get_type() in self.shaders:
             log.debug('Replacing existing shader!')
 
-            glDetachShader(self.program, self.shaders[shader.get_type()].get_id())
+        self.programs.add_shader(shader)
+        self.shaders[shader.get_type()] = shader.source
 
-        self.shaders[shader.get_type()] = shader
+    def set_shader_sources(self, vertex=None, fragment=None, geometry=None,
+                           bint use_last_uniforms=True):
+        r"""Replaces the given shaders of the program with ones built from
+        their sources, keeping the others.
 
-        glAttachShader(self.program, shader.get_id())
+        Each set of sources is only compiled and linked once (see
+        :class:`GLProgramCache`) - switching back to an earlier set just
+        selects its program again. The uniforms set so far carry over to it
+        unless ``use_last_uniforms`` is ``False``, when it starts out with
+        none set.
+        """
+        self.make_current()
+        for shader_type, source in ((GL_VERTEX_SHADER, vertex),
+                                    (GL_FRAGMENT_SHADER, fragment),
+                                    (GL_GEOMETRY_SHADER, geometry)):
+            if source is not None:
+                self.shaders[shader_type] = source
+        self.link_shaders(use_last_uniforms)
+
+    cdef int link_shaders(self, bint use_last_uniforms=True) except -1:
+        # selects the program of the current shaders, with the current
+        # uniforms or none
+        self.select_program(self.programs.program(
+            tuple(sorted(self.shaders.items()))))
         log.debug(self.get_program_log())
+        self.stage_uniforms(self.uniforms if use_last_uniforms else {})
+        return 0
+
+    cdef int select_program(self, GLuint program) except -1:
+        # makes program the one in use
+        self.program = program
+        self.locations = self.programs.uniform_locations(program)
+        self.texture_location = self.uniform_location('textureImage')
+        camera_block = self.camera_programs.get(program)
+        if camera_block is None:
+            camera_block = glr_bind_uniform_block(
+                program, b'Camera', self.camera_ubo, CAMERA_BLOCK_BINDING) != 0
+            if camera_block and self.camera_ubo == 0:
+                self.camera_ubo = glr_init_uniform_buffer(self.camera.nbytes)
+                glr_bind_uniform_block(program, b'Camera', self.camera_ubo,
+                                       CAMERA_BLOCK_BINDING)
+            self.camera_programs[program] = camera_block
+        self.camera_block = camera_block
+        return 0
+
+    cdef GLint uniform_location(self, str name) except? -2:
+        # the location of a uniform of the program in use, -1 if it has none
+        location = self.locations.get(name)
+        if location is None:
+            location = glGetUniformLocation(self.program,
+                                            name.encode('UTF-8'))
+            self.locations[name] = location
+        return location
+
+    cdef int stage_uniforms(self, dict uniforms) except -1:
+        # makes uniforms (of any program) those of the program in use
+        self.uniforms = dict()
+        self.dirty_uniforms = []
+        for name, uniform in uniforms.items():
+            self.stage_uniform(name, uniform.get_value())
+        self.program_owners[self.program] = self.program_name
+        return 0
+
+    cdef int stage_uniform(self, str name, np.ndarray value) except -1:
+        # sets a uniform of the program in use, to be uploaded just before
+        # its next draw
+        cdef GLint location = self.uniform_location(name)
+        cdef GLUniform uniform = self.uniforms.get(name)
+        if uniform is None or uniform.location != location:
+            uniform = GLUniform(name, location, value)
+            self.uniforms[name] = uniform
+        else:
+            uniform.set_value(value)
+        if location >= 0 and not uniform.dirty:
+            uniform.dirty = True
+            self.dirty_uniforms.append(uniform)
+        if self.camera_block and name in _CAMERA_INDEX:
+            self.camera[_CAMERA_INDEX[name]] = uniform.value
+            self.camera_dirty = True
+        return 0
+
+    cdef int stage_camera(self) except -1:
+        # copies the camera matrices into the Camera block's buffer (on the
+        # next draw)
+        cdef GLUniform uniform
+        for i, name in enumerate(CAMERA_UNIFORMS):
+            uniform = self.uniforms.get(name)
+            if uniform is not None:
+                self.camera[i] = uniform.value
+        self.camera_dirty = True
+        return 0
+
+    cdef int flush_uniforms(self) except -1:
+        # uploads the uniforms set since the last draw - the matrices of a
+        # Camera block with a single buffer write. Leaves the program bound.
+        cdef GLUniform uniform
+        if self.dirty_uniforms:
+            glUseProgram(self.program)
+            for uniform in self.dirty_uniforms:
+                uniform.upload()
+            self.dirty_uniforms = []
+        if self.camera_dirty:
+            glr_update_uniform_buffer(self.camera_ubo, self.camera.nbytes,
+                                      np.PyArray_DATA(self.camera))
+            self.camera_dirty = False
+        return 0
+
+    def add_program(self, str name, vertex=None, fragment=None,
+                    geometry=None):
+        r"""Sets up a named program, that :meth:`use_program` can switch to
+        without any relinking.
+
+        Shaders that aren't given are those of the program in use, and the
+        new program starts out with its uniform values. The program in use
+        is unchanged.
+        """
+        self.make_current()
+        if name == self.program_name or name in self.named_programs:
+            raise ValueError('There is already a program named '
+                             '{}'.format(name))
+        shaders = dict(self.shaders)
+        for shader_type, source in ((GL_VERTEX_SHADER, vertex),
+                                    (GL_FRAGMENT_SHADER, fragment),
+                                    (GL_GEOMETRY_SHADER, geometry)):
+            if source is not None:
+                shaders[shader_type] = source
+        cdef GLuint program = self.programs.program(
+            tuple(sorted(shaders.items())), name)
+        # copies, as the program in use goes on setting its own values (the
+        # locations are looked up when the uniforms are staged)
+        uniforms = {uniform_name: GLUniform(uniform_name, -1,
+                                            uniform.get_value().copy())
+                    for uniform_name, uniform in self.uniforms.items()}
+        self.named_programs[name] = (shaders, uniforms, program)
+
+    def use_program(self, str name):
+        r"""Switches to the program named ``name`` (see :meth:`add_program`),
+        :data:`DEFAULT_PROGRAM` being the one the scene starts out with.
+
+        Each program keeps its own uniform values, so switching doesn't link
+        or upload anything - the program is simply used by the next draw.
+        """
+        self.make_current()
+        if name == self.program_name:
+            return
+        state = self.named_programs.pop(name, None)
+        if state is None:
+            raise ValueError('There is no program named {} - choose from '
+                             '{}'.format(name, self.program_names()))
+        # the pending uniforms belong to the program being left
+        self.flush_uniforms()
+        self.named_programs[self.program_name] = (self.shaders, self.uniforms,
+                                                  self.program)
+        self.shaders, uniforms, program = state
+        self.program_name = name
+        self.select_program(program)
+        if self.program_owners.get(self.program) == name:
+            self.uniforms = uniforms
+            if self.camera_block:
+                # the buffer is shared by every program
+                self.stage_camera()
+        else:
+            # the program is new, or shared with another name that has since
+            # set its uniforms
+            self.stage_uniforms(uniforms)
 
-        if not self.is_linked():
-            self.uniforms = dict()
+    def program_names(self):
+        r"""The names of every program set up, sorted."""
+        return sorted(list(self.named_programs) + [self.program_name])
 
     cpdef get_uniform(self, name):
         try:
@@ -237,32 +1437,24 @@ cdef class GLScene:
             return None
 
     cpdef set_uniform(self, name, value):
+        # nothing is uploaded until the next draw (see flush_uniforms)
         value = np.asarray(value)
 
-        cdef bytes c_name = name.encode('UTF-8')
-
-        location = glGetUniformLocation(self.program, c_name)
-
-        if location < 0:
+        if self.uniform_location(name) < 0 and not (
+                self.camera_block and name in _CAMERA_INDEX):
             raise RuntimeError('The is no uniform named {} inside the source.'.format(name))
 
-        uniform = GLUniform(name, location, value)
-
-        log.debug('Uploading {}...'.format(uniform))
-
-        glUseProgram(self.program)
-        uniform.upload()
-        glUseProgram(0)
-
-        self.uniforms[name] = uniform
+        self.stage_uniform(name, value)
 
 
     cdef void init_frame_buffer(self):
         self.fb_rgb_target.unit = 0
         self.fb_f3v_target.unit = 0
+        self.fb_depth_target.unit = 0
 
         glr_init_texture(&self.fb_rgb_target)
         glr_init_texture(&self.fb_f3v_target)
+        glr_init_texture(&self.fb_depth_target)
 
 
         glGenFramebuffers(1, &self.fbo)
@@ -280,20 +1472,14 @@ cdef class GLScene:
 
         glr_register_draw_framebuffers(self.fbo, 2, buffers)
 
-        cdef GLuint depth_buffer;
-
-        glGenRenderbuffers(1, &depth_buffer)
+        # THIS BEING GL_DEPTH_ATTACHMENT means that the depth information at
+        # each fragment will end up here. Note that we must manually set up the
+        # depth buffer when using framebuffers. It's a texture (rather than a
+        # renderbuffer) so that it can be read back like the colour targets.
+        glr_init_framebuffer(&self.fbo, &self.fb_depth_target,
+                             GL_DEPTH_ATTACHMENT)
 
-        glBindRenderbuffer(GL_RENDERBUFFER, depth_buffer)
-        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT,
-                self.fb_rgb_target.width, self.fb_rgb_target.height)
         glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
-        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT,
-                GL_RENDERBUFFER, depth_buffer)
-
-        # THIS BEING GL_DEPTH_COMPONENT means that the depth information at each
-        # fragment will end up here. Note that we must manually set up the depth
-        # buffer when using framebuffers.
         cdef GLenum status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
 
         if status != GL_FRAMEBUFFER_COMPLETE:
@@ -322,57 +1508,62 @@ cdef class GLScene:
         cdef bytes ret = msg[:length]
         return ret.split(b'\0')[0].decode('utf-8')
 
-    def render_scene(self):
-        glUseProgram(self.program)
-
+    cdef void init_vao(self, glr_textured_mesh* mesh):
         # now we have an instantiated glr_textured_mesh, we have to choose
         # some the OpenGL properties and set them. We decide that the vertices
         # should be bound to input 0 into the shader, while tcoords should be
         # input 1, and the float 3 vec is 2.
+        mesh.vertices.attribute_pointer = 0
+        mesh.tcoords.attribute_pointer = 1
+        mesh.f3v_data.attribute_pointer = 2
+        mesh.normals.attribute_pointer = 3
 
-        self.mesh.vertices.attribute_pointer = 0
-        self.mesh.tcoords.attribute_pointer = 1
-        self.mesh.f3v_data.attribute_pointer = 2
-        self.mesh.normals.attribute_pointer = 3
-
-        # assign the meshes texture to be on unit 1 and initialize the buffer
-        # for the texture mesh
-        self.mesh.texture.unit = 1
-
-        glr_init_vao(&self.mesh)
+        glr_init_vao(mesh)
         glr_check_error()
 
-        glr_init_texture(&self.mesh.texture)
-        glr_check_error()
+    # The draw methods only make C calls, so they can run with the GIL
+    # released (the tracing wrappers of debug builds take it back for
+    # themselves). Note that the OpenGL context belongs to the thread that
+    # created the scene - other threads can only get on with other work.
+    cdef void draw_mesh(self, glr_textured_mesh* mesh,
+                        glr_texture* texture) nogil:
+        self.begin_draw(mesh, texture)
+        self.draw_frame(mesh)
+        self.end_draw()
+
+    cdef void begin_draw(self, glr_textured_mesh* mesh,
+                         glr_texture* texture) nogil:
+        # binds everything a draw needs, so that any number of frames can be
+        # drawn (e.g. under different uniforms) with draw_frame
+        glUseProgram(self.program)
+
+        glr_bind_texture(texture)
 
         glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-        cdef uniform = glGetUniformLocation(self.program, "textureImage")
-        glUniform1i(uniform, self.mesh.texture.unit)
+        glUniform1i(self.texture_location, texture.unit)
 
         # and tcoords are all bound to the attributes and ready to go
-        glBindVertexArray(self.mesh.vao)
-        glDrawElements(GL_TRIANGLES, self.mesh.trilist.n_vectors * 3,
+        glBindVertexArray(mesh.vao)
+
+    cdef void draw_frame(self, glr_textured_mesh* mesh) nogil:
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glDrawElements(GL_TRIANGLES, mesh.trilist.n_vectors * 3,
                 GL_UNSIGNED_INT, <GLvoid*> 0)
 
-        # 3. DETACH + SWAP BUFFERS
+    cdef void end_draw(self) nogil:
+        # 3. DETACH
         # now we're done, can disable the vertex array (for safety)
         glBindVertexArray(0)
 
-        cdef GLFWwindow* window = <GLFWwindow*> self.context.window
-
-        glfwSwapBuffers(<GLFWwindow *> window)
-        # We should poll for events after buffering but before rendering.
-        glfwPollEvents()
-
+        # Everything is drawn into our framebuffer object, so there is no
+        # need to swap the buffers of the (hidden) window. Nor do we poll for
+        # window events, which GLFW only allows on the main thread.
         glBindFramebuffer(GL_FRAMEBUFFER, 0)
 
-        glr_destroy_vbos_on_trianglar_mesh(&self.mesh)
-        glDeleteTextures(1, &self.mesh.texture.id)
-
 
     def get_active_uniforms(self):
+        self.make_current()
         cdef int total = -1;
         glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS, &total)
 
@@ -399,13 +1590,13 @@ cdef class GLScene:
             np.ndarray[float, ndim=2, mode="c"] f3v_data not None,
             np.ndarray[unsigned, ndim=2, mode="c"] trilist not None,
             np.ndarray[float, ndim=2, mode="c"] tcoords not None,
-            np.ndarray[float, ndim=3, mode="c"] texture not None):
+            texture not None, out=None):
 
         # Calculate the per-vertex normals...
         cdef np.ndarray[float, ndim=2, mode="c"] normals = vertex_normals(points, trilist)
         # ...and then call the more flexible custom_vertex_normals code.
         return self.render_offscreen_rgb_custom_vertex_normals(
-            points, normals, f3v_data, trilist, tcoords, texture)
+            points, normals, f3v_data, trilist, tcoords, texture, out=out)
 
     # A more flexible version of render_offscreen_rgb where custom
     # per-vertex normals can be provided.
@@ -415,39 +1606,546 @@ cdef class GLScene:
             np.ndarray[float, ndim=2, mode="c"] f3v_data not None,
             np.ndarray[unsigned, ndim=2, mode="c"] trilist not None,
             np.ndarray[float, ndim=2, mode="c"] tcoords not None,
-            np.ndarray[float, ndim=3, mode="c"] texture not None):
-
-        self.mesh = glr_build_f3_f3_rgb_float_mesh(
-            &points[0, 0], &normals[0, 0], &f3v_data[0, 0], points.shape[0],
-            &trilist[0, 0], trilist.shape[0], &tcoords[0, 0],
-            &texture[0, 0, 0], texture.shape[1], texture.shape[0])
+            texture not None, out=None):
+        mesh = self.upload_mesh(points, normals, f3v_data, trilist, tcoords)
+        try:
+            return self.render_offscreen_rgb_mesh(mesh, texture, out=out)
+        finally:
+            mesh.free()
+
+    def upload_texture(self, np.ndarray texture not None):
+        r"""Uploads an RGB texture to the GPU, returning a
+        :class:`GLTexture` that can be passed to any of the render methods in
+        place of the raw array. The texture is uploaded in its own dtype,
+        which must be one of :data:`PIXEL_DTYPES`.
+        """
+        self.make_current()
+        if (texture.ndim != 3 or texture.shape[2] != 3 or
+                not texture.flags.c_contiguous):
+            raise ValueError('Textures must be C contiguous arrays of shape '
+                             '(height, width, 3)')
+        cdef void* data = np.PyArray_DATA(texture)
+        cdef size_t width = texture.shape[1]
+        cdef size_t height = texture.shape[0]
+        cdef GLTexture gl_texture = GLTexture(self)
+        if texture.dtype == np.uint8:
+            gl_texture.texture = glr_build_uint_rgb_texture(
+                <uint8_t*> data, width, height)
+        elif texture.dtype == np.float16:
+            gl_texture.texture = glr_build_half_rgb_texture(
+                data, width, height)
+        elif texture.dtype == np.float32:
+            gl_texture.texture = glr_build_float_rgb_texture(
+                <float*> data, width, height)
+        else:
+            raise ValueError('Textures must have a dtype in {}'.format(
+                PIXEL_DTYPES))
+        # all mesh textures are bound on unit 1
+        gl_texture.texture.unit = 1
+        cdef double start = self.start_stage()
+        glr_init_texture(&gl_texture.texture)
+        glr_check_error()
+        self.end_stage('upload_texture', start, texture.nbytes)
+        # the pixels now live on the GPU - don't hold onto the array memory
+        gl_texture.texture.data = NULL
+        gl_texture.uploaded = True
+        gl_texture.nbytes = texture.nbytes
+        return gl_texture
+
+    def upload_mesh(self,
+            np.ndarray[float, ndim=2, mode="c"] points not None,
+            np.ndarray[float, ndim=2, mode="c"] normals,
+            np.ndarray[float, ndim=2, mode="c"] f3v_data,
+            np.ndarray[unsigned, ndim=2, mode="c"] trilist not None,
+            np.ndarray[float, ndim=2, mode="c"] tcoords,
+            bool gpu_normals=False, bool with_normals=True):
+        r"""Uploads the geometry of a mesh to the GPU once, returning a
+        :class:`GLMesh` that can be rendered repeatedly with
+        :meth:`render_offscreen_rgb_mesh`.
+
+        If ``normals`` is ``None`` the per-vertex normals are computed from
+        the topology - on the GPU (see :meth:`compute_normals`) if
+        ``gpu_normals`` is ``True`` - unless ``with_normals`` is ``False``,
+        for meshes that are never lit (e.g. by the barycentric shaders).
+        Likewise ``f3v_data`` and ``tcoords`` may be ``None`` for meshes
+        whose shaders don't read them. Attributes left out get no buffer,
+        and can't be updated later.
+        """
+        self.make_current()
+        cdef unsigned n_points = points.shape[0]
+        cdef float* normals_vectors = NULL
+        cdef unsigned n_normals = n_points
+        cdef float* f3v_vectors = NULL
+        cdef unsigned n_f3v = 0
+        cdef float* tcoords_vectors = NULL
+        cdef unsigned n_tcoords = 0
+        cdef size_t nbytes = points.nbytes + trilist.nbytes
+        if normals is None and with_normals and not gpu_normals:
+            normals = vertex_normals(points, trilist)
+        if normals is not None:
+            normals_vectors = &normals[0, 0]
+            nbytes += normals.nbytes
+        elif not with_normals:
+            n_normals = 0
+        if f3v_data is not None:
+            f3v_vectors = &f3v_data[0, 0]
+            n_f3v = n_points
+            nbytes += f3v_data.nbytes
+        if tcoords is not None:
+            tcoords_vectors = &tcoords[0, 0]
+            n_tcoords = n_points
+            nbytes += tcoords.nbytes
+
+        cdef double start = self.start_stage()
+        cdef GLMesh mesh = GLMesh(self)
+        mesh.mesh.vertices = glr_build_float_3v(&points[0, 0], n_points)
+        # without data the normal buffer is allocated, ready to be computed
+        mesh.mesh.normals = glr_build_float_3v(normals_vectors, n_normals)
+        mesh.mesh.f3v_data = glr_build_float_3v(f3v_vectors, n_f3v)
+        mesh.mesh.tcoords = glr_build_float_2v(tcoords_vectors, n_tcoords)
+        mesh.mesh.trilist = glr_build_unsigned_3v(&trilist[0, 0],
+                                                  trilist.shape[0])
+        self.init_vao(&mesh.mesh)
+        self.end_stage('upload_mesh', start, nbytes)
+        mesh.uploaded = True
+        mesh.n_points = n_points
+        mesh.n_tris = trilist.shape[0]
+        mesh.trilist = trilist
+        mesh.gpu_normals = normals is None and with_normals
+        mesh.f3v_is_points = f3v_data is points
+        if mesh.gpu_normals:
+            self.compute_normals(mesh)
+        return mesh
+
+    def update_mesh(self, GLMesh mesh not None, points=None, f3v_data=None,
+                    normals=None, tcoords=None):
+        r"""Replaces some of the per-vertex data of an uploaded mesh,
+        leaving the rest (and the triangles) on the GPU. Only the arrays
+        given are uploaded, e.g. just the points of a deforming mesh.
+
+        If the points change but no ``normals`` are given, the normals are
+        recomputed from the new points - on the GPU if the mesh was uploaded
+        with ``gpu_normals``, otherwise on the CPU (and uploaded). If the
+        mesh's f3v data was its points, it is updated along with them unless
+        ``f3v_data`` is given.
 
-        self.render_scene()
+        Parameters
+        ----------
+        mesh : :class:`GLMesh`
+            The mesh to update.
+        points, f3v_data, normals : ndarray, shape (n_points, 3), optional
+            The new points, f3v data and normals.
+        tcoords : ndarray, shape (n_points, 2), optional
+            The new texture coordinates.
+        """
+        self.make_current()
+        if not mesh.uploaded:
+            raise ValueError('The mesh has been freed')
+        cdef bint has_normals = mesh.mesh.normals.n_vectors > 0
+        if points is not None:
+            points = self.vertex_data(points, mesh.n_points, 3, 'points')
+            if f3v_data is None and mesh.f3v_is_points:
+                f3v_data = points
+            if normals is None and has_normals and not mesh.gpu_normals:
+                normals = vertex_normals(points, mesh.trilist)
+        elif f3v_data is not None:
+            # the f3v data no longer follows the points
+            mesh.f3v_is_points = False
+
+        cdef double start = self.start_stage()
+        cdef size_t nbytes = 0
+        nbytes += self.update_vertex_data(&mesh.mesh.vertices, points,
+                                          'points')
+        nbytes += self.update_vertex_data(&mesh.mesh.f3v_data, f3v_data,
+                                          'f3v_data')
+        nbytes += self.update_vertex_data(&mesh.mesh.normals, normals,
+                                          'normals')
+        nbytes += self.update_vertex_data(&mesh.mesh.tcoords, tcoords,
+                                          'tcoords')
+        glr_check_error()
+        self.end_stage('upload_mesh', start, nbytes)
+        if points is not None and normals is None and has_normals:
+            self.compute_normals(mesh)
+
+    cdef vertex_data(self, array, unsigned n_points, unsigned n_dims,
+                     str name):
+        # the array as the float32 (n_points, n_dims) C array OpenGL expects
+        array = np.require(array, dtype=np.float32, requirements='C')
+        if array.shape != (n_points, n_dims):
+            raise ValueError('{} must have shape ({}, {}), not {}'.format(
+                name, n_points, n_dims, array.shape))
+        return array
+
+    cdef size_t update_vertex_data(self, glr_vectorset* vectors, array,
+                                   str name) except? 0:
+        # uploads the array (if any) over the buffer, returning its size
+        if array is None:
+            return 0
+        if vectors.n_vectors == 0:
+            raise ValueError('The mesh was uploaded without '
+                             '{}'.format(name))
+        cdef np.ndarray[float, ndim=2, mode="c"] data = self.vertex_data(
+            array, vectors.n_vectors, vectors.n_dims, name)
+        glr_update_array_buffer(vectors, &data[0, 0])
+        return data.nbytes
+
+    def compute_normals(self, GLMesh mesh not None):
+        r"""Computes the vertex normals of an uploaded mesh from its points
+        and triangles on the GPU, overwriting its normal buffer. The normals
+        are those of :func:`vertex_normals`, but nothing is computed on (or
+        transferred from) the CPU, which makes this the cheap way to relight
+        a mesh whose points change every frame.
+
+        The unit normal of each triangle is summed onto its vertices by
+        drawing the mesh as points into a float target (a texel per vertex)
+        with additive blending. A second pass normalizes the sums, writing
+        them into the normal buffer by transform feedback.
+        """
+        self.make_current()
+        if not mesh.uploaded:
+            raise ValueError('The mesh has been freed')
+        if mesh.mesh.normals.n_vectors == 0:
+            raise ValueError('The mesh was uploaded without normals')
+        if mesh.n_points == 0:
+            return
+        self.prepare_normals(mesh.n_points)
+        glr_scatter_normals(self.normals_scatter_program, self.normals_fbo,
+                            &self.normals_target, &mesh.mesh)
+        glr_gather_normals(self.normals_gather_program, self.normals_vao,
+                           &self.normals_target, mesh.mesh.normals.vbo,
+                           mesh.n_points)
+        glUseProgram(0)
+        glr_check_error()
 
-        glr_get_framebuffer(&self.fb_rgb_target)
-        glr_get_framebuffer(&self.fb_f3v_target)
+    cdef int prepare_normals(self, unsigned n_points) except -1:
+        # builds the normals programs on first use, and a target with a
+        # texel for each of n_points
+        if self.normals_scatter_program == 0:
+            self.normals_scatter_program = self.programs.program(
+                ((GL_VERTEX_SHADER, NORMALS_SCATTER_VERTEX_SHADER_SRC),
+                 (GL_GEOMETRY_SHADER, NORMALS_SCATTER_GEOMETRY_SHADER_SRC),
+                 (GL_FRAGMENT_SHADER, NORMALS_SCATTER_FRAGMENT_SHADER_SRC)),
+                'normals scatter')
+            self.normals_gather_program = self.programs.program(
+                ((GL_VERTEX_SHADER, NORMALS_GATHER_VERTEX_SHADER_SRC),),
+                'normals gather', b'normal')
+            self.normals_vao = glr_build_vertex_array()
+
+        cdef GLsizei height = ((n_points + NORMALS_TARGET_WIDTH - 1) //
+                               NORMALS_TARGET_WIDTH)
+        if self.normals_initialised and height <= self.normals_target.height:
+            return 0
+        cdef GLint max_size = 0
+        glGetIntegerv(GL_MAX_TEXTURE_SIZE, &max_size)
+        if height > max_size:
+            raise ValueError('Normals can only be computed on the GPU for '
+                             'meshes of up to {} points'.format(
+                                 max_size * NORMALS_TARGET_WIDTH))
+        self.release_normals_target()
+        self.normals_target = glr_build_float_rgba_texture(
+            NULL, NORMALS_TARGET_WIDTH, height)
+        self.normals_target.unit = NORMALS_TEXTURE_UNIT
+        glr_init_texture(&self.normals_target)
+        glGenFramebuffers(1, &self.normals_fbo)
+        self.normals_initialised = True
+        glr_init_framebuffer(&self.normals_fbo, &self.normals_target,
+                             GL_COLOR_ATTACHMENT0)
+        cdef GLenum buffers[1]
+        buffers[0] = GL_COLOR_ATTACHMENT0
+        glr_register_draw_framebuffers(self.normals_fbo, 1, buffers)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.normals_fbo)
+        cdef GLenum status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.release_normals_target()
+            raise RuntimeError("Normals framebuffer error: %d 0x%04X" % (
+                status, status))
+
+        # the uniforms only depend on the size of the target
+        glUseProgram(self.normals_scatter_program)
+        glUniform1i(glGetUniformLocation(self.normals_scatter_program,
+                                         'targetWidth'), NORMALS_TARGET_WIDTH)
+        glUniform1i(glGetUniformLocation(self.normals_scatter_program,
+                                         'targetHeight'), height)
+        glUseProgram(self.normals_gather_program)
+        glUniform1i(glGetUniformLocation(self.normals_gather_program,
+                                         'targetWidth'), NORMALS_TARGET_WIDTH)
+        glUniform1i(glGetUniformLocation(self.normals_gather_program,
+                                         'normalSums'), NORMALS_TEXTURE_UNIT)
+        glUseProgram(0)
+        return 0
+
+    cdef void release_normals_target(self):
+        if self.normals_initialised:
+            glDeleteFramebuffers(1, &self.normals_fbo)
+            glr_destroy_texture(&self.normals_target)
+            self.normals_initialised = False
+
+    def render_offscreen_rgb_mesh(self, GLMesh mesh not None,
+                                  texture not None, out=None):
+        r"""Renders a mesh previously uploaded with :meth:`upload_mesh`. The
+        geometry is simply bound and drawn. ``texture`` is either a
+        :class:`GLTexture` or an array that is uploaded for this render only.
+
+        Returns the ``(rgb, f3v, depth)`` framebuffers (``None`` for those
+        disabled by :meth:`set_outputs`). ``out`` optionally provides the
+        C contiguous float32 arrays that the pixels are read straight into,
+        with ``None`` entries allocated afresh.
+        """
+        self.make_current()
+        self.draw(mesh, texture)
+        return self.read_framebuffers(out)
+
+    def render_offscreen_rgb_async(self, GLMesh mesh not None,
+                                   texture not None):
+        r"""As :meth:`render_offscreen_rgb_mesh`, but returns a
+        :class:`GLReadback` straight after the draw has been submitted. The
+        framebuffers are transferred into a ring of pixel buffers while the
+        caller carries on (e.g. submitting the next frame).
+        """
+        self.make_current()
+        self.draw(mesh, texture)
+        return self.read_framebuffers_async()
 
-        return np.array(self.rgb_pixels), np.array(self.f3v_pixels)
+    def set_readback_buffers(self, int n_buffers):
+        r"""Sets the number of frames that can be in flight for asynchronous
+        readback. Any pending readbacks are completed first.
+        """
+        self.make_current()
+        if n_buffers < 1:
+            raise ValueError('At least one readback buffer is required')
+        self.release_readback_buffers()
+        cdef size_t n_pixels = self.width * self.height
+        # room for the alpha channel, whether it is read or not
+        self.readback_buffers = [
+            GLPixelBuffers(n_pixels * 4 * self.rgb_dtype.itemsize,
+                           n_pixels * 3 * sizeof(float),
+                           n_pixels * sizeof(float))
+            for _ in range(n_buffers)]
+        self.readbacks = [None] * n_buffers
+        self.readback_index = 0
+
+    cdef void release_readback_buffers(self):
+        cdef GLReadback readback
+        cdef GLPixelBuffers buffers
+        for readback in self.readbacks:
+            if readback is not None:
+                readback.fetch()
+        for buffers in self.readback_buffers:
+            buffers.release()
+        self.readback_buffers = []
+        self.readbacks = []
+
+    cdef read_framebuffers_async(self):
+        if not self.readback_buffers:
+            self.set_readback_buffers(DEFAULT_READBACK_BUFFERS)
+        cdef int i = self.readback_index
+        self.readback_index = (i + 1) % len(self.readback_buffers)
+
+        # the oldest frame must be copied out before its buffers are reused
+        cdef GLReadback readback = self.readbacks[i]
+        if readback is not None:
+            readback.fetch()
+
+        cdef GLPixelBuffers buffers = self.readback_buffers[i]
+        if self.output_rgb:
+            glr_get_framebuffer_async(&self.fb_rgb_target, self.rgb_format,
+                                      &buffers.rgb)
+        if self.output_f3v:
+            glr_get_framebuffer_async(&self.fb_f3v_target, GL_RGB,
+                                      &buffers.f3v)
+        if self.output_depth:
+            glr_get_framebuffer_async(&self.fb_depth_target,
+                                      GL_DEPTH_COMPONENT, &buffers.depth)
+
+        readback = GLReadback(self, buffers, self.output_rgb, self.output_f3v,
+                              self.output_depth, self.rgb_channels)
+        self.readbacks[i] = readback
+        return readback
+
+    cdef draw(self, GLMesh mesh, texture):
+        cdef GLTexture gl_texture = self.prepare_draw(mesh, texture)
+        self.begin_timer()
+        with nogil:
+            self.draw_mesh(&mesh.mesh, &gl_texture.texture)
+        self.end_timer()
+
+    cdef GLTexture prepare_draw(self, GLMesh mesh, texture):
+        # checks the mesh and texture are usable, returning the texture as
+        # uploaded and ready to be sampled
+        if not mesh.uploaded:
+            raise ValueError('The mesh has been freed')
+
+        cdef GLTexture gl_texture
+        if isinstance(texture, GLTexture):
+            gl_texture = texture
+        else:
+            gl_texture = self.upload_texture(texture)
+        if not gl_texture.uploaded:
+            raise ValueError('The texture has been freed')
+        if self.sampler_mipmaps and not gl_texture.has_mipmaps:
+            glr_generate_mipmaps(&gl_texture.texture)
+            gl_texture.has_mipmaps = True
+        gl_texture.texture.sampler = self.sampler
+        self.flush_uniforms()
+        return gl_texture
+
+    cdef read_framebuffers(self, out=None):
+        rgb, f3v, depth = (None, None, None) if out is None else out
+        if self.output_rgb:
+            # unless it's needed, the alpha channel is dropped on the way out
+            # of OpenGL
+            rgb = self.read_framebuffer(&self.fb_rgb_target, self.rgb_format,
+                                        (self.height, self.width,
+                                         self.rgb_channels),
+                                        self.rgb_dtype, rgb)
+        else:
+            rgb = None
+        if self.output_f3v:
+            f3v = self.read_framebuffer(&self.fb_f3v_target, GL_RGB,
+                                        (self.height, self.width, 3),
+                                        np.float32, f3v)
+        else:
+            f3v = None
+        if self.output_depth:
+            depth = self.read_framebuffer(&self.fb_depth_target,
+                                          GL_DEPTH_COMPONENT,
+                                          (self.height, self.width),
+                                          np.float32, depth)
+        else:
+            depth = None
+        return rgb, f3v, depth
+
+    cdef read_framebuffer(self, glr_texture* target, GLenum format,
+                          tuple shape, dtype, out):
+        out = output_array(out, shape, dtype)
+        cdef void* data = np.PyArray_DATA(out)
+        cdef size_t nbytes = out.nbytes
+        cdef Py_ssize_t height = shape[0]
+        cdef double start = self.start_stage()
+        with nogil:
+            glr_read_framebuffer(target, format, data)
+            flip_frames(data, 1, height, nbytes)
+        self.end_stage('readback', start, nbytes)
+        return out
+
+    cdef size_t frame_bytes(self):
+        # the bytes read back per frame with the current outputs
+        cdef size_t n_pixels = self.width * self.height
+        cdef size_t nbytes = 0
+        if self.output_rgb:
+            nbytes += n_pixels * self.rgb_channels * self.rgb_dtype.itemsize
+        if self.output_f3v:
+            nbytes += n_pixels * 3 * sizeof(float)
+        if self.output_depth:
+            nbytes += n_pixels * sizeof(float)
+        return nbytes
 
     cpdef set_clear_color(self, np.ndarray[float, ndim=1, mode='c'] clear_c):
+        self.make_current()
         if clear_c.size != 4:
             raise ValueError("colour vector must be 4 elements long")
         glr_set_clear_color(&clear_c[0])
 
     cpdef get_clear_color(self):
+        self.make_current()
         cdef np.ndarray[float, ndim=1, mode='c'] clear_color
         clear_color = np.empty(4, dtype=np.float32)
         glr_get_clear_color(&clear_color[0])
         return clear_color
 
     def get_width(self):
-        return self.context.window_width
+        return self.width
 
     def get_height(self):
-        return self.context.window_height
+        return self.height
+
+    cpdef make_current(self):
+        r"""Makes this scene's OpenGL context current on the calling
+        thread. All GL calls (and so all use of this scene and its meshes
+        and textures) must be made from the thread the context is current
+        on. The context is current on the creating thread to begin with.
+
+        Each method that touches the GPU makes the context current itself,
+        so several scenes can be used in turn from one thread.
+        """
+        if self.backend_id == BACKEND_EGL:
+            glr_egl_make_current(&self.egl_context)
+        elif self.backend_id == BACKEND_OSMESA:
+            glr_osmesa_make_current(&self.osmesa_context)
+        else:
+            glr_glfw_make_current(&self.context)
+
+    def release_current(self):
+        r"""Releases the OpenGL context current on the calling thread, so
+        that it can be made current on another thread.
+        """
+        if self.backend_id == BACKEND_EGL:
+            glr_egl_release_current()
+        elif self.backend_id == BACKEND_OSMESA:
+            glr_osmesa_release_current()
+        else:
+            glr_glfw_release_current()
+
+    cdef glr_current_context switch_context(self):
+        # makes our context current, returning whichever context it
+        # replaces so that restore_context can switch back
+        cdef glr_current_context previous
+        if self.backend_id == BACKEND_EGL:
+            previous = glr_egl_get_current()
+        elif self.backend_id == BACKEND_OSMESA:
+            previous = glr_osmesa_get_current()
+        else:
+            previous = glr_glfw_get_current()
+        self.make_current()
+        return previous
+
+    cdef void restore_context(self, glr_current_context* previous):
+        if self.backend_id == BACKEND_EGL:
+            glr_egl_restore_current(previous)
+        elif self.backend_id == BACKEND_OSMESA:
+            glr_osmesa_restore_current(previous)
+        else:
+            glr_glfw_restore_current(previous)
+
+    cdef void terminate_context(self):
+        if self.backend_id == BACKEND_EGL:
+            glr_egl_terminate(&self.egl_context)
+        elif self.backend_id == BACKEND_OSMESA:
+            glr_osmesa_terminate(&self.osmesa_context)
+        else:
+            glr_glfw_terminate(&self.context)
 
     def __dealloc__(self):
-        glr_glfw_terminate(&self.context)
+        cdef glr_current_context previous
+        if not self.success:
+            # the context was never (fully) created - there is nothing of
+            # ours in it to free
+            self.terminate_context()
+            return
+        # other scenes' contexts may be current - our objects live in ours,
+        # and whichever was current is handed back before ours goes
+        previous = self.switch_context()
+        if self.readback_buffers is not None:
+            self.release_readback_buffers()
+        if self.layered_target is not None:
+            self.layered_target.release()
+        self.release_barycentric_fbo()
+        self.release_normals_target()
+        if self.normals_vao != 0:
+            glr_destroy_vertex_array(self.normals_vao)
+        if self.free_timers is not None:
+            self.release_timers()
+        if self.texture_cache is not None:
+            self.texture_cache.clear()
+        if self.samplers is not None:
+            self.samplers.clear()
+        if self.programs is not None:
+            self.programs.clear()
+        if self.camera_ubo != 0:
+            glr_destroy_buffer(self.camera_ubo)
+        self.restore_context(&previous)
+        self.terminate_context()
 
     def successfully_initialized(self):
         return self.success
@@ -460,17 +2158,66 @@ cdef class GLScene:
         self.set_projection_matrix(orthogonal)
 
 
-cdef class GLRasterizer(GLScene):
+cdef void read_framebuffer_slice(glr_texture* target, GLenum format,
+                                 np.ndarray out, Py_ssize_t i):
+    # reads a framebuffer into out[i] of a stack of C contiguous frames
+    cdef char* data = <char*> np.PyArray_DATA(out) + i * out.strides[0]
+    cdef size_t frame_bytes = out.strides[0]
+    cdef Py_ssize_t height = out.shape[1]
+    with nogil:
+        glr_read_framebuffer(target, format, data)
+        flip_frames(data, 1, height, frame_bytes)
+
+
+cdef read_texture_array_slice(glr_texture* target, GLenum format,
+                              np.ndarray out, Py_ssize_t start, Py_ssize_t n,
+                              int n_layers):
+    # reads the first n layers of a texture array of n_layers into
+    # out[start:start + n] of a stack of C contiguous frames
+    cdef char* data = <char*> np.PyArray_DATA(out) + start * out.strides[0]
+    cdef size_t frame_bytes = out.strides[0]
+    cdef Py_ssize_t height = out.shape[1]
+    cdef np.ndarray layers
+    if n == n_layers:
+        with nogil:
+            glr_read_texture_array(target, format, data)
+            flip_frames(data, n, height, frame_bytes)
+    else:
+        # only a partial batch was drawn, but the whole array is read
+        layers = np.empty((n_layers,) + (<object> out).shape[1:],
+                          dtype=out.dtype)
+        data = <char*> np.PyArray_DATA(layers)
+        with nogil:
+            glr_read_texture_array(target, format, data)
+            flip_frames(data, n, height, frame_bytes)
+        out[start:start + n] = layers[:n]
 
-    def __init__(self, int width, int height, int verbose):
-        default_vertex_shader = VertexShader(DEFAULT_VERTEX_SHADER_SRC)
-        default_fragment_shader = FragmentShader(DEFAULT_FRAGMENT_SHADER_SRC)
 
-        self.attach_shaders((default_vertex_shader, default_fragment_shader))
+cdef class GLRasterizer(GLScene):
+    # the uniform buffer of layered rendering and the matrices staged for it
+    # - all the projection matrices then all the views
+    cdef GLuint views_ubo
+    cdef np.ndarray views_block
+    # the program of barycentric rendering
+    cdef GLuint barycentric_program
+
+    def __init__(self, int width, int height, int verbose,
+                 rgb_dtype=np.float32, backend='glfw',
+                 program_cache_dir=None):
+        self.set_shader_sources(vertex=DEFAULT_VERTEX_SHADER_SRC,
+                                fragment=DEFAULT_FRAGMENT_SHADER_SRC)
 
         # Initialise camera/projection matrices
         self.reset_view()
 
+    def __dealloc__(self):
+        # runs before GLScene.__dealloc__ terminates the context
+        cdef glr_current_context previous
+        if self.views_ubo != 0:
+            previous = self.switch_context()
+            glr_destroy_buffer(self.views_ubo)
+            self.restore_context(&previous)
+
     cpdef get_model_matrix(self):
         return self.get_uniform('modelMatrix')
 
@@ -500,3 +2247,300 @@ cdef class GLRasterizer(GLScene):
                     np.ndarray[float, ndim=2, mode="c"] m):
 
         return self.set_uniform('projectionMatrix', m)
+
+    def set_camera(self, np.ndarray[float, ndim=2, mode="c"] model,
+                   np.ndarray[float, ndim=2, mode="c"] view,
+                   np.ndarray[float, ndim=2, mode="c"] projection):
+        r"""Sets the model, view and projection matrices together, leaving
+        any given as ``None`` as they are. All of them are uploaded at the
+        next draw - with a Camera block, in a single buffer write.
+        """
+        for name, m in zip(CAMERA_UNIFORMS, (model, view, projection)):
+            if m is not None:
+                self.set_uniform(name, m)
+
+    def render_views(self, GLMesh mesh not None, texture not None,
+                     np.ndarray[float, ndim=3, mode="c"] view_matrices not None,
+                     projection_matrices=None, out=None, bool layered=False):
+        r"""Renders a mesh previously uploaded with :meth:`upload_mesh`
+        under each of ``view_matrices`` (and ``projection_matrices``, if
+        given, else the current projection matrix).
+
+        The program, texture, framebuffer and mesh are bound once, after
+        which each view only costs a uniform upload, a draw and a readback
+        straight into its slice of the stacked ``(n_views, height, width,
+        ...)`` framebuffers. These are returned as the ``(rgb, f3v, depth)``
+        triple of :meth:`render_offscreen_rgb_mesh`, with ``out`` optionally
+        providing the stacked arrays to read into. The view and projection
+        uniforms are left as they were.
+
+        If ``layered`` is ``True`` the views are instead drawn in batches of
+        up to :data:`MAX_LAYERED_VIEWS` by a single instanced draw into a
+        layered framebuffer, with one readback per batch (see
+        :meth:`render_views_layered`).
+        """
+        self.make_current()
+        cdef Py_ssize_t n_views = view_matrices.shape[0]
+        if view_matrices.shape[1] != 4 or view_matrices.shape[2] != 4:
+            raise ValueError('view_matrices must have shape (n_views, 4, 4)')
+        if n_views == 0:
+            raise ValueError('At least one view matrix is required')
+        cdef np.ndarray[float, ndim=3, mode="c"] projections = None
+        if projection_matrices is not None:
+            projections = np.require(projection_matrices, dtype=np.float32,
+                                     requirements='C')
+            if projections.shape[0] != n_views:
+                raise ValueError('A projection matrix is required per view')
+
+        rgb, f3v, depth = (None, None, None) if out is None else out
+        if self.output_rgb:
+            rgb = output_array(rgb, (n_views, self.height, self.width,
+                                     self.rgb_channels), self.rgb_dtype)
+        if self.output_f3v:
+            f3v = output_array(f3v, (n_views, self.height, self.width, 3),
+                               np.float32)
+        if self.output_depth:
+            depth = output_array(depth, (n_views, self.height, self.width),
+                                 np.float32)
+        if layered:
+            self.render_views_layered(mesh, texture, view_matrices,
+                                      projections, rgb, f3v, depth)
+            return (rgb if self.output_rgb else None,
+                    f3v if self.output_f3v else None,
+                    depth if self.output_depth else None)
+
+        cdef GLint view_location = self.uniform_location('viewMatrix')
+        cdef GLint projection_location = self.uniform_location(
+            'projectionMatrix')
+        # with a Camera block each view rewrites the block's buffer instead
+        cdef bint camera_block = self.camera_block
+        if not camera_block and (view_location < 0 or (
+                projections is not None and projection_location < 0)):
+            raise RuntimeError('The shaders have no viewMatrix and '
+                               'projectionMatrix uniforms')
+
+        cdef GLTexture gl_texture = self.prepare_draw(mesh, texture)
+        cdef Py_ssize_t i
+        cdef double start
+        cdef size_t frame_bytes = self.frame_bytes()
+        # the matrices of view i start 16 floats after those of view i - 1
+        cdef float* views = &view_matrices[0, 0, 0]
+        cdef float* projection = NULL
+        if projections is not None:
+            projection = &projections[0, 0, 0]
+        cdef float* camera = <float*> np.PyArray_DATA(self.camera)
+        cdef GLsizeiptr camera_bytes = self.camera.nbytes
+        self.begin_draw(&mesh.mesh, &gl_texture.texture)
+        try:
+            for i in range(n_views):
+                self.begin_timer()
+                with nogil:
+                    if camera_block:
+                        memcpy(camera + 16, views + 16 * i, 16 * sizeof(float))
+                        if projection != NULL:
+                            memcpy(camera + 32, projection + 16 * i,
+                                   16 * sizeof(float))
+                        glr_update_uniform_buffer(self.camera_ubo,
+                                                  camera_bytes, camera)
+                    else:
+                        glUniformMatrix4fv(view_location, 1, GL_TRUE,
+                                           views + 16 * i)
+                        if projection != NULL:
+                            glUniformMatrix4fv(projection_location, 1,
+                                               GL_TRUE, projection + 16 * i)
+                    self.draw_frame(&mesh.mesh)
+                self.end_timer()
+                start = self.start_stage()
+                if self.output_rgb:
+                    read_framebuffer_slice(&self.fb_rgb_target,
+                                           self.rgb_format, rgb, i)
+                if self.output_f3v:
+                    read_framebuffer_slice(&self.fb_f3v_target, GL_RGB, f3v, i)
+                if self.output_depth:
+                    read_framebuffer_slice(&self.fb_depth_target,
+                                           GL_DEPTH_COMPONENT, depth, i)
+                self.end_stage('readback', start, frame_bytes)
+        finally:
+            # restore the uniforms the views replaced
+            for name in ('viewMatrix', 'projectionMatrix'):
+                if name in self.uniforms:
+                    self.uniforms[name].upload()
+            if camera_block:
+                self.stage_camera()
+            self.end_draw()
+        return (rgb if self.output_rgb else None,
+                f3v if self.output_f3v else None,
+                depth if self.output_depth else None)
+
+    cdef render_views_layered(self, GLMesh mesh, texture,
+                              np.ndarray[float, ndim=3, mode="c"] view_matrices,
+                              np.ndarray[float, ndim=3, mode="c"] projections,
+                              rgb, f3v, depth):
+        # Each batch of views is an instanced draw of the mesh - instance i
+        # takes its matrices from the Views uniform block and is routed to
+        # layer i of the layered framebuffer by layered.geom - followed by a
+        # single readback of every layer.
+        cdef Py_ssize_t n_views = view_matrices.shape[0]
+        cdef int n_layers = min(n_views, MAX_LAYERED_VIEWS)
+        cdef GLuint program = self.get_layered_program()
+        cdef GLLayeredTarget target = self.get_layered_target(n_layers)
+        self.register_outputs(target.fbo)
+        cdef GLTexture gl_texture = self.prepare_draw(mesh, texture)
+
+        # only the matrices of the views drawn are read, so the block can
+        # hold those of earlier batches
+        cdef np.ndarray[float, ndim=3, mode="c"] block = self.views_block
+        if projections is None:
+            # the projection matrix set on the scene
+            projection = self.get_uniform('projectionMatrix')
+            if projection is None:
+                raise RuntimeError('No projection matrix has been set')
+            block[:MAX_LAYERED_VIEWS] = projection
+
+        glUseProgram(program)
+        if not glr_bind_uniform_block(program, b'Views', self.views_ubo, 0):
+            raise RuntimeError('The layered shaders have no Views block')
+        # the remaining uniforms (e.g. the model matrix and light) are shared
+        # with the main program
+        cdef dict locations = self.programs.uniform_locations(program)
+        cdef GLint location
+        for name, uniform in self.uniforms.items():
+            if name in ('viewMatrix', 'projectionMatrix'):
+                continue
+            location = locations.get(name, -1)
+            if location >= 0:
+                GLUniform(name, location, uniform.get_value()).upload()
+        glr_bind_texture(&gl_texture.texture)
+        glUniform1i(locations.get('textureImage', -1), gl_texture.texture.unit)
+        glBindFramebuffer(GL_FRAMEBUFFER, target.fbo)
+        glBindVertexArray(mesh.mesh.vao)
+
+        cdef Py_ssize_t start, n
+        cdef double read_start
+        cdef size_t frame_bytes = self.frame_bytes()
+        try:
+            for start in range(0, n_views, n_layers):
+                n = min(n_layers, n_views - start)
+                if projections is not None:
+                    block[:n] = projections[start:start + n]
+                block[MAX_LAYERED_VIEWS:MAX_LAYERED_VIEWS + n] = \
+                    view_matrices[start:start + n]
+                glr_update_uniform_buffer(self.views_ubo, block.nbytes,
+                                          np.PyArray_DATA(block))
+                self.begin_timer()
+                with nogil:
+                    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+                    glr_draw_instanced(&mesh.mesh, n)
+                self.end_timer()
+                read_start = self.start_stage()
+                if self.output_rgb:
+                    read_texture_array_slice(&target.rgb, self.rgb_format,
+                                             rgb, start, n, n_layers)
+                if self.output_f3v:
+                    read_texture_array_slice(&target.f3v, GL_RGB, f3v, start,
+                                             n, n_layers)
+                if self.output_depth:
+                    read_texture_array_slice(&target.depth,
+                                             GL_DEPTH_COMPONENT, depth,
+                                             start, n, n_layers)
+                self.end_stage('readback', read_start, n * frame_bytes)
+        finally:
+            glBindVertexArray(0)
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+            glUseProgram(0)
+
+    def render_barycentric(self, GLMesh mesh not None, out=None):
+        r"""Renders which triangle of a mesh previously uploaded with
+        :meth:`upload_mesh` covers each pixel, and where.
+
+        The mesh is drawn with its own shaders (barycentric.vert/.geom/.frag)
+        under the current model, view and projection matrices. The triangle
+        index (``gl_PrimitiveID``) goes to an integer target and the
+        perspective correct barycentric coordinates to the f3v target.
+
+        Parameters
+        ----------
+        mesh : GLMesh
+            The mesh to render.
+        out : (ndarray, ndarray), optional
+            An int32 array of shape (height, width) and a float32 array of
+            shape (height, width, 3) to read the framebuffers into.
+
+        Returns
+        -------
+        triangle_index : ndarray, shape (height, width)
+            The index into the trilist of the triangle at each pixel, -1
+            where there is none.
+        barycentric : ndarray, shape (height, width, 3)
+            The weights of the triangle's three vertices at each pixel, 0
+            where there is no triangle.
+        """
+        self.make_current()
+        triangle_out, barycentric_out = (None, None) if out is None else out
+        cdef np.ndarray triangle_index = output_array(
+            triangle_out, (self.height, self.width), np.int32)
+        cdef np.ndarray barycentric = output_array(
+            barycentric_out, (self.height, self.width, 3), np.float32)
+        cdef GLuint fbo = self.get_barycentric_fbo()
+        cdef GLuint program = self.get_barycentric_program()
+
+        glUseProgram(program)
+        # the matrices set on the main program
+        for name in ('modelMatrix', 'viewMatrix', 'projectionMatrix'):
+            uniform = self.uniforms.get(name)
+            if uniform is None:
+                raise RuntimeError('No {} has been set'.format(name))
+            GLUniform(name, glGetUniformLocation(program, name.encode('UTF-8')),
+                      uniform.get_value()).upload()
+        glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+        glBindVertexArray(mesh.mesh.vao)
+        try:
+            self.begin_timer()
+            with nogil:
+                glr_clear_int_draw_buffer(0, -1)
+                glr_clear_float_draw_buffer(1, 0)
+                glClear(GL_DEPTH_BUFFER_BIT)
+                glDrawElements(GL_TRIANGLES, mesh.mesh.trilist.n_vectors * 3,
+                               GL_UNSIGNED_INT, <GLvoid*> 0)
+            self.end_timer()
+            self.read_framebuffer(&self.fb_triangle_target,
+                                  self.fb_triangle_target.format,
+                                  (self.height, self.width), np.int32,
+                                  triangle_index)
+            self.read_framebuffer(&self.fb_f3v_target, GL_RGB,
+                                  (self.height, self.width, 3), np.float32,
+                                  barycentric)
+        finally:
+            glBindVertexArray(0)
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+            glUseProgram(0)
+        return triangle_index, barycentric
+
+    cdef GLuint get_barycentric_program(self) except 0:
+        # builds the barycentric program on first use
+        if self.barycentric_program == 0:
+            self.barycentric_program = self.programs.program(
+                ((GL_VERTEX_SHADER, BARYCENTRIC_VERTEX_SHADER_SRC),
+                 (GL_GEOMETRY_SHADER, BARYCENTRIC_GEOMETRY_SHADER_SRC),
+                 (GL_FRAGMENT_SHADER, BARYCENTRIC_FRAGMENT_SHADER_SRC)),
+                'barycentric')
+        return self.barycentric_program
+
+    cdef GLuint get_layered_program(self) except 0:
+        # the layered shaders linked with the current fragment shader
+        fragment = self.shaders.get(GL_FRAGMENT_SHADER)
+        if fragment is None:
+            raise RuntimeError('No fragment shader is attached')
+        if self.views_ubo == 0:
+            self.views_block = np.zeros((2 * MAX_LAYERED_VIEWS, 4, 4),
+                                        dtype=np.float32)
+            self.views_ubo = glr_init_uniform_buffer(self.views_block.nbytes)
+        try:
+            return self.programs.program(
+                ((GL_VERTEX_SHADER, LAYERED_VERTEX_SHADER_SRC),
+                 (GL_GEOMETRY_SHADER, LAYERED_GEOMETRY_SHADER_SRC),
+                 (GL_FRAGMENT_SHADER, fragment)), 'layered')
+        except RuntimeError:
+            raise RuntimeError('Failed to link the layered shaders - the '
+                               'fragment shader must accept the outputs of '
+                               'blinnphong.vert')
@@ -0,0 +1,146 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+r"""Per-vertex normals of triangle meshes, as used for lighting by both the
+OpenGL and the software rasterizers.
+"""
+from collections import OrderedDict
+import numpy as np
+cimport numpy as np
+from libc.math cimport sqrt
+
+
+# the number of meshes whose normals the rasterizers keep by default - none,
+# as meshes are identified by a sampled fingerprint that misses most edits
+# made to their points in place
+DEFAULT_NORMALS_CACHE_SIZE = 0
+
+
+def vertex_normals(points, trilist):
+    r"""The normal of each vertex - the normalized sum of the unit normals of
+    the triangles it belongs to.
+
+    The face normals are scattered onto the vertices in a single pass over
+    the triangles, without building any per-triangle temporaries.
+
+    Parameters
+    ----------
+    points : ndarray, shape (n_points, 3)
+        The vertices of the mesh.
+    trilist : ndarray, shape (n_tris, 3)
+        The triangles of the mesh, wound counter-clockwise.
+
+    Returns
+    -------
+    normals : ndarray, shape (n_points, 3)
+        The float32 unit normal of each vertex. Vertices that are in no
+        (non-degenerate) triangle have a normal of 0.
+    """
+    cdef const float[:, ::1] p = np.require(points, dtype=np.float32,
+                                            requirements='C')
+    cdef const unsigned[:, ::1] t = np.require(trilist, dtype=np.uint32,
+                                               requirements='C')
+    if p.shape[1] != 3 or t.shape[1] != 3:
+        raise ValueError('points and trilist must have shapes (n_points, 3) '
+                         'and (n_tris, 3)')
+    cdef Py_ssize_t n_points = p.shape[0]
+    cdef np.ndarray normals = np.zeros((n_points, 3), dtype=np.float32)
+    cdef float[:, ::1] n = normals
+
+    cdef Py_ssize_t i, j, k
+    cdef unsigned v
+    cdef float ax, ay, az, bx, by, bz, nx, ny, nz, length
+    cdef bint out_of_range = False
+    with nogil:
+        for i in range(t.shape[0]):
+            if (t[i, 0] >= n_points or t[i, 1] >= n_points or
+                    t[i, 2] >= n_points):
+                out_of_range = True
+                break
+            # the cross product of the edges v0 -> v1 and v0 -> v2
+            ax = p[t[i, 1], 0] - p[t[i, 0], 0]
+            ay = p[t[i, 1], 1] - p[t[i, 0], 1]
+            az = p[t[i, 1], 2] - p[t[i, 0], 2]
+            bx = p[t[i, 2], 0] - p[t[i, 0], 0]
+            by = p[t[i, 2], 1] - p[t[i, 0], 1]
+            bz = p[t[i, 2], 2] - p[t[i, 0], 2]
+            nx = ay * bz - az * by
+            ny = az * bx - ax * bz
+            nz = ax * by - ay * bx
+            length = sqrt(nx * nx + ny * ny + nz * nz)
+            if length == 0:
+                # degenerate triangles have no normal to contribute
+                continue
+            # every triangle is weighted equally, whatever its size
+            nx = nx / length
+            ny = ny / length
+            nz = nz / length
+            for k in range(3):
+                v = t[i, k]
+                n[v, 0] += nx
+                n[v, 1] += ny
+                n[v, 2] += nz
+        if not out_of_range:
+            for j in range(n_points):
+                length = sqrt(n[j, 0] * n[j, 0] + n[j, 1] * n[j, 1] +
+                              n[j, 2] * n[j, 2])
+                if length > 0:
+                    n[j, 0] = n[j, 0] / length
+                    n[j, 1] = n[j, 1] / length
+                    n[j, 2] = n[j, 2] / length
+    if out_of_range:
+        raise ValueError('trilist refers to points beyond the {} '
+                         'given'.format(n_points))
+    return normals
+
+
+cdef class NormalsCache:
+    r"""A least recently used cache of the vertex normals of meshes, so that
+    repeated renders of a static mesh only compute its normals once.
+
+    Normals are stored against an arbitrary hashable key that identifies the
+    ``(points, trilist)`` pair they were computed from.
+
+    Parameters
+    ----------
+    max_size : `int`
+        The number of meshes to keep the normals of. ``0`` disables caching.
+    """
+    cdef object normals
+    cdef readonly size_t max_size
+
+    def __cinit__(self, size_t max_size):
+        self.normals = OrderedDict()
+        self.max_size = max_size
+
+    def __len__(self):
+        return len(self.normals)
+
+    def __contains__(self, key):
+        return key in self.normals
+
+    def get(self, key, points, trilist):
+        r"""Returns the normals stored against ``key`` (marking them as the
+        most recently used), computing and storing them from ``points`` and
+        ``trilist`` if there are none.
+        """
+        normals = self.normals.pop(key, None)
+        if normals is None:
+            normals = vertex_normals(points, trilist)
+        if self.max_size > 0:
+            self.normals[key] = normals
+            self.evict(self.max_size)
+        return normals
+
+    def resize(self, size_t max_size):
+        r"""Changes the number of meshes kept, evicting the least recently
+        used as required.
+        """
+        self.max_size = max_size
+        self.evict(max_size)
+
+    def clear(self):
+        r"""Forgets every mesh's normals."""
+        self.normals.clear()
+
+    cdef void evict(self, size_t max_size):
+        while len(self.normals) > max_size:
+            self.normals.popitem(last=False)
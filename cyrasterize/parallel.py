@@ -0,0 +1,282 @@
+import os
+import shutil
+import tempfile
+import traceback
+import multiprocessing
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy as np
+
+from .base import OUTPUTS
+
+
+# the arrays that make up a mesh job - see render_dataset
+MESH_ARRAYS = ('points', 'trilist', 'tcoords', 'texture', 'normals',
+               'per_vertex_f3v')
+
+# meshes are staged for the workers as .npy files that are memory mapped on
+# the other side. Where there is a RAM backed filesystem they are put there,
+# which makes the maps plain shared memory.
+_SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# how often (in seconds) a blocked queue operation checks the workers are
+# still alive
+_POLL_INTERVAL = 1
+
+
+def _process_context():
+    # workers are spawned rather than forked - a forked child would inherit
+    # (and fight over) any OpenGL state of the parent
+    try:
+        return multiprocessing.get_context('spawn')
+    except AttributeError:
+        # Python 2 can only fork
+        return multiprocessing
+
+
+def _output_spec(output, n_meshes, n_cameras, width, height, rgb_dtype):
+    shape = (n_meshes, n_cameras, height, width)
+    if output in ('rgb', 'f3v'):
+        shape += (3,)
+    if output == 'rgb':
+        dtype = np.dtype(rgb_dtype)
+    elif output == 'mask':
+        dtype = np.dtype(bool)
+    else:
+        dtype = np.dtype(np.float32)
+    return shape, dtype
+
+
+def _stage_mesh(mesh, scratch_dir, index):
+    mesh_dir = os.path.join(scratch_dir, str(index))
+    os.mkdir(mesh_dir)
+    for name in MESH_ARRAYS:
+        value = mesh.get(name)
+        if value is not None:
+            np.save(os.path.join(mesh_dir, name + '.npy'), np.asarray(value))
+    return mesh_dir
+
+
+def _load_mesh(mesh_dir):
+    mesh = dict.fromkeys(MESH_ARRAYS)
+    for name in MESH_ARRAYS:
+        path = os.path.join(mesh_dir, name + '.npy')
+        if os.path.exists(path):
+            mesh[name] = np.load(path, mmap_mode='r')
+    return mesh
+
+
+def _check_alive(workers):
+    if not any(worker.is_alive() for worker in workers):
+        raise RuntimeError('All render_dataset workers died')
+
+
+def _put(jobs, job, workers):
+    while True:
+        try:
+            jobs.put(job, timeout=_POLL_INTERVAL)
+            return
+        except queue.Full:
+            _check_alive(workers)
+
+
+def _get(results, workers):
+    while True:
+        try:
+            return results.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            _check_alive(workers)
+
+
+def _render_worker(jobs, results, width, height, view_matrices,
+                   projection_matrices, outputs, output_paths, shaders,
+                   layered, kwargs):
+    # runs in each worker process - one rasterizer renders every job it takes
+    try:
+        from .base import CyRasterizer
+        rasterizer = CyRasterizer(width=width, height=height, **kwargs)
+        if shaders:
+            rasterizer.set_shaders(**shaders)
+        images = [np.load(path, mmap_mode='r+') for path in output_paths]
+        setup_error = None
+    except Exception:
+        # keep taking jobs so the parent isn't left waiting on them
+        setup_error = traceback.format_exc()
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        index, mesh_dir = job
+        error = setup_error
+        try:
+            if error is None:
+                mesh = _load_mesh(mesh_dir)
+                gl_mesh = rasterizer.upload_mesh(
+                    mesh['points'], mesh['trilist'], mesh['tcoords'],
+                    normals=mesh['normals'],
+                    per_vertex_f3v=mesh['per_vertex_f3v'])
+                rasterizer.rasterize_views(
+                    gl_mesh, view_matrices, texture=mesh['texture'],
+                    projection_matrices=projection_matrices,
+                    outputs=outputs, out=[image[index] for image in images],
+                    layered=layered)
+                gl_mesh.free()
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            shutil.rmtree(mesh_dir, ignore_errors=True)
+        results.put((index, error))
+
+    if setup_error is None:
+        for image in images:
+            image.flush()
+
+
+def render_dataset(meshes, cameras, n_workers, width=256, height=256,
+                   outputs=('rgb', 'mask'), n_meshes=None, output_dir=None,
+                   shaders=None, layered=False, **kwargs):
+    r"""Renders every mesh under every camera, spread over a number of
+    worker processes that each own a rasterizer.
+
+    Meshes are streamed to the workers through memory mapped files (in
+    shared memory where the platform has a RAM backed filesystem) and the
+    workers render straight into memory mapped ``.npy`` output arrays, so no
+    images are pickled between processes.
+
+    Parameters
+    ----------
+    meshes : iterable of `dict`
+        The meshes to render. Each has the arrays of
+        :meth:`CyRasterizer.upload_mesh` under the keys ``'points'``,
+        ``'trilist'`` and ``'tcoords'`` (and optionally ``'normals'`` and
+        ``'per_vertex_f3v'``) along with its ``'texture'``. Meshes are read
+        from the iterable lazily, so it may be a generator.
+    cameras : sequence of ``(view_matrix, projection_matrix)``
+        The cameras every mesh is rendered under, each a pair of 4x4
+        matrices.
+    n_workers : `int`
+        The number of worker processes (and so rasterizers).
+    width : `int`, optional
+        The width of the rendered images.
+    height : `int`, optional
+        The height of the rendered images.
+    outputs : iterable of {'rgb', 'f3v', 'mask', 'depth'}, optional
+        The images to render.
+
+        Default ('rgb', 'mask').
+    n_meshes : `int`, optional
+        The number of meshes.
+
+        Default None - ``len(meshes)`` is used.
+    output_dir : `str`, optional
+        The directory the output arrays are written to (as
+        ``<output>.npy``).
+
+        Default None - a new temporary directory is made.
+    shaders : `dict`, optional
+        Shader sources passed to :meth:`CyRasterizer.set_shaders` in each
+        worker, e.g. ``{'vertex': src, 'fragment': src}``.
+    layered : `bool`, optional
+        Render the cameras of each mesh in layered batches (see
+        :meth:`CyRasterizer.rasterize_views`).
+    kwargs : `dict`, optional
+        Passed on to each worker's :class:`CyRasterizer`.
+
+    Returns
+    -------
+    images : tuple of `np.memmap`
+        A memory mapped array for each output, of shape
+        (n_meshes, n_cameras, height, width, 3) for rgb and f3v and
+        (n_meshes, n_cameras, height, width) for mask and depth.
+
+    Raises
+    ------
+    RuntimeError
+        If rendering any mesh fails. The traceback from the worker is
+        included in the message.
+    """
+    if n_workers < 1:
+        raise ValueError('n_workers must be at least 1, not '
+                         '{}'.format(n_workers))
+    outputs = tuple(outputs)
+    for output in outputs:
+        if output not in OUTPUTS:
+            raise ValueError('Unknown output {} - outputs must be drawn from '
+                             '{}'.format(output, OUTPUTS))
+    if n_meshes is None:
+        try:
+            n_meshes = len(meshes)
+        except TypeError:
+            raise ValueError('n_meshes must be given when meshes has no len()')
+    view_matrices, projection_matrices = zip(*cameras)
+    view_matrices = np.require(view_matrices, dtype=np.float32,
+                               requirements='C')
+    projection_matrices = np.require(projection_matrices, dtype=np.float32,
+                                     requirements='C')
+    n_cameras = view_matrices.shape[0]
+
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp(prefix='cyrasterize-')
+    output_paths = []
+    rgb_dtype = kwargs.get('rgb_dtype', np.float32)
+    for output in outputs:
+        shape, dtype = _output_spec(output, n_meshes, n_cameras, width,
+                                    height, rgb_dtype)
+        path = os.path.join(output_dir, output + '.npy')
+        # only the header is written here - the workers fill the data in
+        image = np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                          shape=shape)
+        del image
+        output_paths.append(path)
+
+    context = _process_context()
+    # bound the queue so that only a few meshes are staged at any one time
+    jobs = context.Queue(maxsize=2 * n_workers)
+    results = context.Queue()
+    workers = [context.Process(target=_render_worker,
+                               args=(jobs, results, width, height,
+                                     view_matrices, projection_matrices,
+                                     outputs, output_paths, shaders,
+                                     layered, kwargs))
+               for _ in range(n_workers)]
+    scratch_dir = tempfile.mkdtemp(prefix='cyrasterize-meshes-',
+                                   dir=_SHARED_MEMORY_DIR)
+    errors = []
+    try:
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        n_submitted = 0
+        for index, mesh in enumerate(meshes):
+            if index >= n_meshes:
+                raise ValueError('meshes yielded more than n_meshes '
+                                 '({}) meshes'.format(n_meshes))
+            _put(jobs, (index, _stage_mesh(mesh, scratch_dir, index)),
+                 workers)
+            n_submitted += 1
+        for _ in workers:
+            _put(jobs, None, workers)
+        for _ in range(n_submitted):
+            index, error = _get(results, workers)
+            if error is not None:
+                errors.append((index, error))
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if errors:
+        index, error = min(errors)
+        raise RuntimeError('Rendering failed for {} mesh(es), e.g. mesh {}:'
+                           '\n{}'.format(len(errors), index, error))
+    if n_submitted != n_meshes:
+        raise ValueError('meshes yielded {} meshes, not n_meshes '
+                         '({})'.format(n_submitted, n_meshes))
+    return tuple(np.load(path, mmap_mode='r+') for path in output_paths)
@@ -0,0 +1,133 @@
+import threading
+from concurrent.futures import Future
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .base import CyRasterizer
+
+
+class RasterizerPool(object):
+    r"""A pool of rasterizers, each with its own OpenGL context and pinned to
+    its own worker thread, for rendering several jobs at once.
+
+    Jobs are callables that are handed a rasterizer, e.g. ::
+
+        def render(rasterizer):
+            rasterizer.set_shaders(vertex=vert_src, fragment=frag_src)
+            return rasterizer.rasterize(points, trilist, texture, tcoords)
+
+        with RasterizerPool(4, width=256, height=256) as pool:
+            futures = [pool.submit(render) for _ in range(100)]
+            images = [f.result() for f in futures]
+
+    Whichever worker is free runs the next job, so jobs should not depend on
+    state left on a rasterizer by an earlier job (shaders, matrices, ...).
+    OpenGL objects (e.g. uploaded meshes) belong to one context, so they must
+    be built inside the job that uses them and not be returned from it.
+
+    Parameters
+    ----------
+    n_rasterizers : `int`
+        The number of rasterizers (and so worker threads) in the pool.
+    width : `int`, optional
+        The width of the framebuffers rendered.
+    height : `int`, optional
+        The height of the framebuffers rendered.
+    kwargs : `dict`, optional
+        Passed on to each :class:`CyRasterizer`.
+
+    Notes
+    -----
+    All contexts are created (and destroyed) on the thread that builds the
+    pool, as some platforms only allow windows to be managed from the main
+    thread. With GLFW every context runs on the default GPU.
+    """
+    def __init__(self, n_rasterizers, width=1024, height=768, **kwargs):
+        if n_rasterizers < 1:
+            raise ValueError('A pool needs at least one rasterizer, '
+                             'not {}'.format(n_rasterizers))
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.rasterizers = []
+        self._threads = []
+        for _ in range(n_rasterizers):
+            rasterizer = CyRasterizer(width=width, height=height, **kwargs)
+            # hand the context over to the worker thread
+            rasterizer.release_current()
+            self.rasterizers.append(rasterizer)
+        for i, rasterizer in enumerate(self.rasterizers):
+            thread = threading.Thread(target=self._work, args=(rasterizer,),
+                                      name='cyrasterize-worker-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __len__(self):
+        return len(self.rasterizers)
+
+    def submit(self, render_job, *args, **kwargs):
+        r"""Schedules ``render_job(rasterizer, *args, **kwargs)`` to run on
+        the next free rasterizer.
+
+        Parameters
+        ----------
+        render_job : `callable`
+            The job, called with the rasterizer as its first argument.
+        args, kwargs
+            Further arguments for the job.
+
+        Returns
+        -------
+        future : `concurrent.futures.Future`
+            Resolves to the job's return value (or the exception it raised).
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Cannot submit jobs to a closed '
+                                   'RasterizerPool')
+            self._jobs.put((future, render_job, args, kwargs))
+        return future
+
+    def _work(self, rasterizer):
+        rasterizer.make_current()
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                future, render_job, args, kwargs = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = render_job(rasterizer, *args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            rasterizer.release_current()
+
+    def close(self):
+        r"""Waits for all submitted jobs to finish, then stops the workers
+        and destroys their contexts.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for _ in self._threads:
+                self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        # the contexts are torn down here, on the thread that created them
+        del self.rasterizers[:]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
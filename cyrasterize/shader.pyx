@@ -1,6 +1,8 @@
 from libcpp cimport bool
 from .c_opengl cimport *
-from .c_opengl_debug cimport *
+# GL call tracing is only compiled into debug builds (CYRASTERIZE_GL_DEBUG=1)
+IF GL_DEBUG:
+    from .c_opengl_debug cimport *
 import logging as log
 
 
@@ -15,9 +17,12 @@ cdef class ShaderSource:
 
     cpdef GLenum uid
     cpdef GLenum shader_type
+    # the source the shader was compiled from
+    cdef readonly str source
 
     def __init__(self, str py_source, GLenum shader_type):
         self.shader_type = shader_type
+        self.source = py_source
 
         cdef GLint success = 0
         cdef GLuint error
@@ -93,4 +98,4 @@ class FragmentShader(ShaderSource):
 
 class GeometryShader(ShaderSource):
     def __init__(self, src):
-        super(FragmentShader, self).__init__(src, GL_GEOMETRY_SHADER)
\ No newline at end of file
+        super(GeometryShader, self).__init__(src, GL_GEOMETRY_SHADER)
\ No newline at end of file
@@ -0,0 +1,13 @@
+#version 330
+#extension GL_ARB_explicit_attrib_location : require
+
+smooth in vec3 barycentric;
+
+// the index of the triangle in the trilist and the weights of its vertices
+layout(location = 0) out int triangleIndex;
+layout(location = 1) out vec3 outputBarycentric;
+
+void main() {
+    triangleIndex = gl_PrimitiveID;
+    outputBarycentric = barycentric;
+}
@@ -0,0 +1,15 @@
+#version 330
+#extension GL_ARB_explicit_attrib_location : require
+
+// Positions each vertex as blinnphong.vert does - barycentric.geom then
+// gives every corner of a triangle its barycentric coordinates.
+
+uniform mat4 projectionMatrix;
+uniform mat4 viewMatrix;
+uniform mat4 modelMatrix;
+
+layout(location = 0) in vec4 point;
+
+void main() {
+    gl_Position = projectionMatrix * viewMatrix * modelMatrix * point;
+}
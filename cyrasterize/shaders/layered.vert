@@ -0,0 +1,41 @@
+#version 330
+#extension GL_ARB_explicit_attrib_location : require
+
+// A variant of blinnphong.vert for instanced, layered rendering - each
+// instance is one view, drawn into the layer of the same index. Paired with
+// layered.geom, which routes triangles to their layer.
+
+// the views drawn by one draw call. Both arrays fit in the 16KB that every
+// implementation supports for a uniform block (MAX_LAYERED_VIEWS).
+#define MAX_VIEWS 128
+
+layout(std140, row_major) uniform Views {
+    mat4 projectionMatrices[MAX_VIEWS];
+    mat4 viewMatrices[MAX_VIEWS];
+};
+uniform mat4 modelMatrix;
+
+layout(location = 0) in vec4 point;
+layout(location = 1) in vec2 tcoordIn;
+layout(location = 2) in vec3 linearMappingCoordIn;
+layout(location = 3) in vec3 normal;
+
+out VertexData {
+    vec2 tcoord;
+    vec3 linearMappingCoord;
+    vec3 normalInterp;
+    vec3 FragPos;
+    flat int layer;
+} vertexOut;
+
+void main() {
+    mat4 viewMatrix = viewMatrices[gl_InstanceID];
+    gl_Position = projectionMatrices[gl_InstanceID] * viewMatrix *
+                  modelMatrix * point;
+    vertexOut.tcoord = tcoordIn;
+
+    vertexOut.FragPos = (viewMatrix * modelMatrix * point).xyz;
+    vertexOut.normalInterp = normal;
+    vertexOut.linearMappingCoord = linearMappingCoordIn;
+    vertexOut.layer = gl_InstanceID;
+}
@@ -0,0 +1,17 @@
+#version 330
+
+// Drawn as one point per vertex with rasterization disabled - normalizes the
+// face normals summed for the vertex by normals_scatter, the result being
+// captured by transform feedback straight into the mesh's normal buffer.
+
+uniform sampler2D normalSums;
+uniform int targetWidth;
+
+out vec3 normal;
+
+void main() {
+    ivec2 texel = ivec2(gl_VertexID % targetWidth, gl_VertexID / targetWidth);
+    vec3 sum = texelFetch(normalSums, texel, 0).xyz;
+    float len = length(sum);
+    normal = len > 0.0 ? sum / len : vec3(0.0);
+}
@@ -0,0 +1,10 @@
+#version 330
+#extension GL_ARB_explicit_attrib_location : require
+
+flat in vec3 faceNormal;
+
+layout(location = 0) out vec4 normalSum;
+
+void main() {
+    normalSum = vec4(faceNormal, 0.0);
+}
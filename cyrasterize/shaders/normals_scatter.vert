@@ -0,0 +1,15 @@
+#version 330
+#extension GL_ARB_explicit_attrib_location : require
+
+// Passes each vertex's index and model space position (the space normals
+// are computed in) on to normals_scatter.geom.
+
+layout(location = 0) in vec4 point;
+
+flat out int vertexIndex;
+out vec3 position;
+
+void main() {
+    vertexIndex = gl_VertexID;
+    position = point.xyz;
+}
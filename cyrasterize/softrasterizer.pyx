@@ -0,0 +1,433 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+r"""A software implementation of the rasterizer's default pipeline (see
+:class:`cyrasterize.cpu.CPURasterizer`).
+
+Triangles are set up once and binned into the square tiles that the image
+is split into, then the tiles are rasterized in parallel (with OpenMP, where
+the compiler supports it). Each tile walks its triangles in order, so the
+depth test resolves exactly as it does in OpenGL, and tiles never write to
+the same pixels.
+"""
+import numpy as np
+cimport numpy as np
+from cython.parallel cimport prange
+from libc.math cimport floor, ceil, sqrt, pow
+from libc.stdlib cimport malloc, calloc, free
+from libc.string cimport memcpy
+
+
+# the side of the square tiles the image is split into
+DEFAULT_TILE_SIZE = 32
+
+# shading models - the unlit texture_shader and the default blinnphong
+SHADINGS = ('texture', 'blinnphong')
+cdef enum:
+    SHADE_TEXTURE
+    SHADE_BLINNPHONG
+
+# as in blinnphong.frag
+cdef float AMBIENT = 0.05
+cdef float SPECULAR = 0.3
+cdef float SHININESS = 16.0
+
+
+cdef struct triangle:
+    # the vertex indices, ordered so that the triangle winds clockwise in
+    # image space (y down)
+    int v[3]
+    # image space position (pixel centres are at + 0.5), window depth and
+    # 1 / w_clip of each vertex
+    float x[3]
+    float y[3]
+    float z[3]
+    float inv_w[3]
+    # twice the area in image space - 0 for triangles that are culled (or
+    # cover no pixel centres)
+    float area
+    # whether the edge opposite each vertex is a top or left edge
+    bint top_left[3]
+    # the pixel bounds (inclusive) covered
+    int x0
+    int x1
+    int y0
+    int y1
+
+
+cdef inline float edge(float ax, float ay, float bx, float by,
+                       float px, float py) nogil:
+    return (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+
+
+cdef inline bint is_top_left(float ax, float ay, float bx, float by) nogil:
+    # for clockwise triangles in image space, top edges run left to right
+    # and left edges run upwards
+    return (by < ay) or (by == ay and bx > ax)
+
+
+cdef inline int clamp_int(int i, int lo, int hi) nogil:
+    if i < lo:
+        return lo
+    if i > hi:
+        return hi
+    return i
+
+
+cdef inline int wrap_texel(int i, int n, bint repeat) nogil:
+    if repeat:
+        i = i % n
+        return i + n if i < 0 else i
+    return clamp_int(i, 0, n - 1)
+
+
+cdef void setup_triangle(triangle* t, const float[:, ::1] clip,
+                         const unsigned[:, ::1] trilist, int i,
+                         int width, int height) nogil:
+    cdef int k, a, b
+    cdef float w
+    t.area = 0
+    for k in range(3):
+        t.v[k] = trilist[i, k]
+        w = clip[t.v[k], 3]
+        if w <= 0:
+            # (partly) behind the camera - such triangles are dropped rather
+            # than clipped against the near plane
+            return
+        t.inv_w[k] = 1 / w
+        t.x[k] = (clip[t.v[k], 0] * t.inv_w[k] + 1) * 0.5 * width
+        t.y[k] = (1 - clip[t.v[k], 1] * t.inv_w[k]) * 0.5 * height
+        t.z[k] = (clip[t.v[k], 2] * t.inv_w[k] + 1) * 0.5
+    cdef float area = edge(t.x[0], t.y[0], t.x[1], t.y[1], t.x[2], t.y[2])
+    # front faces wind anticlockwise in clip space, which (as y points down)
+    # is clockwise in the image - cull the back faces, as OpenGL does
+    if area >= 0:
+        return
+    # swap to a clockwise order so every edge function is positive inside
+    t.v[1], t.v[2] = t.v[2], t.v[1]
+    t.x[1], t.x[2] = t.x[2], t.x[1]
+    t.y[1], t.y[2] = t.y[2], t.y[1]
+    t.z[1], t.z[2] = t.z[2], t.z[1]
+    t.inv_w[1], t.inv_w[2] = t.inv_w[2], t.inv_w[1]
+    for k in range(3):
+        a = (k + 1) % 3
+        b = (k + 2) % 3
+        t.top_left[k] = is_top_left(t.x[a], t.y[a], t.x[b], t.y[b])
+    # pixels whose centres may be covered
+    t.x0 = clamp_int(<int> ceil(min(t.x[0], t.x[1], t.x[2]) - 0.5), 0,
+                     width)
+    t.x1 = clamp_int(<int> floor(max(t.x[0], t.x[1], t.x[2]) - 0.5), -1,
+                     width - 1)
+    t.y0 = clamp_int(<int> ceil(min(t.y[0], t.y[1], t.y[2]) - 0.5), 0,
+                     height)
+    t.y1 = clamp_int(<int> floor(max(t.y[0], t.y[1], t.y[2]) - 0.5), -1,
+                     height - 1)
+    if t.x0 <= t.x1 and t.y0 <= t.y1:
+        t.area = -area
+
+
+cdef void sample_texture(const float[:, :, ::1] texture, float u, float v,
+                         bint linear, bint repeat, float* colour) nogil:
+    # textures are stored top row first, but texture coordinates start at
+    # the bottom left (OpenGL sees the texture flipped upside down)
+    cdef int tw = texture.shape[1], th = texture.shape[0]
+    cdef int i0, j0, i1, j1, c
+    cdef float fu, fv, a, b
+    if not linear:
+        i0 = wrap_texel(<int> floor(u * tw), tw, repeat)
+        j0 = th - 1 - wrap_texel(<int> floor(v * th), th, repeat)
+        for c in range(3):
+            colour[c] = texture[j0, i0, c]
+        return
+    fu = u * tw - 0.5
+    fv = v * th - 0.5
+    a = fu - floor(fu)
+    b = fv - floor(fv)
+    i0 = wrap_texel(<int> floor(fu), tw, repeat)
+    i1 = wrap_texel(<int> floor(fu) + 1, tw, repeat)
+    j0 = th - 1 - wrap_texel(<int> floor(fv), th, repeat)
+    j1 = th - 1 - wrap_texel(<int> floor(fv) + 1, th, repeat)
+    for c in range(3):
+        colour[c] = ((1 - a) * (1 - b) * texture[j0, i0, c] +
+                     a * (1 - b) * texture[j0, i1, c] +
+                     (1 - a) * b * texture[j1, i0, c] +
+                     a * b * texture[j1, i1, c])
+
+
+cdef inline void normalize3(float* v) nogil:
+    cdef float length = sqrt(v[0] * v[0] + v[1] * v[1] + v[2] * v[2])
+    v[0] /= length
+    v[1] /= length
+    v[2] /= length
+
+
+cdef void shade_blinnphong(float* colour, const float* normal,
+                           const float* position, const float* light) nogil:
+    cdef float n[3]
+    cdef float light_dir[3]
+    cdef float view_dir[3]
+    cdef float halfway[3]
+    cdef int c
+    for c in range(3):
+        n[c] = normal[c]
+        light_dir[c] = light[c] - position[c]
+        view_dir[c] = -position[c]
+    normalize3(n)
+    normalize3(light_dir)
+    normalize3(view_dir)
+    for c in range(3):
+        halfway[c] = light_dir[c] + view_dir[c]
+    normalize3(halfway)
+    cdef float lambertian = max(light_dir[0] * n[0] + light_dir[1] * n[1] +
+                                light_dir[2] * n[2], 0)
+    cdef float spec = pow(max(halfway[0] * n[0] + halfway[1] * n[1] +
+                              halfway[2] * n[2], 0), SHININESS)
+    for c in range(3):
+        colour[c] = min(AMBIENT * colour[c] + lambertian * colour[c] +
+                        SPECULAR * spec, 1)
+
+
+cdef void rasterize_tile(const triangle* triangles, const int* tile_tris,
+                         int n_tile_tris,
+                         int tx0, int ty0, int tx1, int ty1,
+                         const float[:, ::1] tcoords,
+                         const float[:, ::1] f3v,
+                         const float[:, ::1] normals,
+                         const float[:, ::1] eye,
+                         const float[:, :, ::1] texture,
+                         bint linear, bint repeat, int shading,
+                         const float* light,
+                         float[:, :, ::1] rgb_out, float[:, :, ::1] f3v_out,
+                         float[:, ::1] depth_out,
+                         bint write_rgb, bint write_f3v) nogil:
+    cdef const triangle* t
+    cdef int i, k, c, row, col, x0, x1, y0, y1
+    cdef float px, py, depth, total
+    cdef float b[3]
+    cdef float p[3]
+    cdef float uv[2]
+    cdef float colour[3]
+    cdef float normal[3]
+    cdef float position[3]
+    cdef bint inside
+    for i in range(n_tile_tris):
+        t = &triangles[tile_tris[i]]
+        x0 = max(t.x0, tx0)
+        x1 = min(t.x1, tx1)
+        y0 = max(t.y0, ty0)
+        y1 = min(t.y1, ty1)
+        for row in range(y0, y1 + 1):
+            py = row + 0.5
+            for col in range(x0, x1 + 1):
+                px = col + 0.5
+                b[0] = edge(t.x[1], t.y[1], t.x[2], t.y[2], px, py)
+                b[1] = edge(t.x[2], t.y[2], t.x[0], t.y[0], px, py)
+                b[2] = edge(t.x[0], t.y[0], t.x[1], t.y[1], px, py)
+                inside = True
+                for k in range(3):
+                    if b[k] < 0 or (b[k] == 0 and not t.top_left[k]):
+                        inside = False
+                if not inside:
+                    continue
+                for k in range(3):
+                    b[k] /= t.area
+                depth = b[0] * t.z[0] + b[1] * t.z[1] + b[2] * t.z[2]
+                # fragments beyond the near and far planes are clipped
+                if depth < 0 or depth > 1 or depth > depth_out[row, col]:
+                    continue
+                depth_out[row, col] = depth
+                # perspective correct interpolation weights
+                total = 0
+                for k in range(3):
+                    p[k] = b[k] * t.inv_w[k]
+                    total += p[k]
+                for k in range(3):
+                    p[k] /= total
+                if write_f3v:
+                    for c in range(3):
+                        f3v_out[row, col, c] = (p[0] * f3v[t.v[0], c] +
+                                                p[1] * f3v[t.v[1], c] +
+                                                p[2] * f3v[t.v[2], c])
+                if not write_rgb:
+                    continue
+                for c in range(2):
+                    uv[c] = (p[0] * tcoords[t.v[0], c] +
+                             p[1] * tcoords[t.v[1], c] +
+                             p[2] * tcoords[t.v[2], c])
+                sample_texture(texture, uv[0], uv[1], linear, repeat, colour)
+                if shading == SHADE_BLINNPHONG:
+                    for c in range(3):
+                        normal[c] = (p[0] * normals[t.v[0], c] +
+                                     p[1] * normals[t.v[1], c] +
+                                     p[2] * normals[t.v[2], c])
+                        position[c] = (p[0] * eye[t.v[0], c] +
+                                       p[1] * eye[t.v[1], c] +
+                                       p[2] * eye[t.v[2], c])
+                    shade_blinnphong(colour, normal, position, light)
+                for c in range(3):
+                    rgb_out[row, col, c] = colour[c]
+
+
+cdef Py_ssize_t max_index(const unsigned[:, ::1] trilist) nogil:
+    # -1 for an empty trilist
+    cdef Py_ssize_t i, k, largest = -1
+    for i in range(trilist.shape[0]):
+        for k in range(3):
+            largest = max(largest, <Py_ssize_t> trilist[i, k])
+    return largest
+
+
+def rasterize_triangles(const float[:, ::1] clip not None,
+                        const unsigned[:, ::1] trilist not None,
+                        const float[:, ::1] tcoords not None,
+                        const float[:, ::1] f3v not None,
+                        const float[:, :, ::1] texture not None,
+                        float[:, :, ::1] rgb_out, float[:, :, ::1] f3v_out,
+                        float[:, ::1] depth_out not None,
+                        const float[:, ::1] normals=None,
+                        const float[:, ::1] eye=None,
+                        light_position=(0, 0, 0), shading='texture',
+                        bint linear=False, bint repeat=False,
+                        int tile_size=DEFAULT_TILE_SIZE):
+    r"""Rasterizes triangles into the given framebuffers, which must already
+    be cleared (the depth buffer to 1).
+
+    Parameters
+    ----------
+    clip : ndarray, shape (n_points, 4)
+        The clip space position of each vertex.
+    trilist : ndarray, shape (n_tris, 3)
+        The connectivity of the triangles.
+    tcoords : ndarray, shape (n_points, 2)
+        The texture coordinates of each vertex.
+    f3v : ndarray, shape (n_points, 3)
+        The float 3-vector interpolated into ``f3v_out``.
+    texture : ndarray, shape (texture_height, texture_width, 3)
+        The texture, top row first, with values in [0, 1].
+    rgb_out : ndarray, shape (height, width, 3) or None
+        The colour framebuffer. ``None`` skips texturing and shading.
+    f3v_out : ndarray, shape (height, width, 3) or None
+        The f3v framebuffer. ``None`` skips its interpolation.
+    depth_out : ndarray, shape (height, width)
+        The depth buffer, in window space ([0, 1]).
+    normals : ndarray, shape (n_points, 3), optional
+        The normal of each vertex, for 'blinnphong' shading.
+    eye : ndarray, shape (n_points, 3), optional
+        The eye space position of each vertex, for 'blinnphong' shading.
+    light_position : (3,) array_like, optional
+        The eye space position of the light for 'blinnphong' shading.
+    shading : {'texture', 'blinnphong'}, optional
+        'texture' returns the texture colour (``texture_shader.frag``),
+        'blinnphong' lights it as ``blinnphong.frag`` does.
+    linear : `bool`, optional
+        Bilinearly filter the texture rather than take the nearest texel.
+    repeat : `bool`, optional
+        Repeat the texture outside of [0, 1] rather than clamp to its edge.
+    tile_size : `int`, optional
+        The side of the square tiles rasterized in parallel.
+    """
+    if shading not in SHADINGS:
+        raise ValueError('shading must be one of {}'.format(SHADINGS))
+    cdef int shade = SHADINGS.index(shading)
+    # shading only happens when there is a colour framebuffer to write
+    if (shade == SHADE_BLINNPHONG and rgb_out is not None and
+            (normals is None or eye is None)):
+        raise ValueError('blinnphong shading needs normals and eye positions')
+    if tile_size < 1:
+        raise ValueError('tile_size must be positive')
+    cdef int i, tile, tx, ty, row, col
+    cdef int height = depth_out.shape[0], width = depth_out.shape[1]
+    # bounds are not checked as the triangles are rasterized
+    cdef Py_ssize_t n_points = clip.shape[0]
+    if clip.shape[1] != 4 or trilist.shape[1] != 3:
+        raise ValueError('clip must have shape (n_points, 4) and trilist '
+                         '(n_tris, 3)')
+    if (tcoords.shape[0] != n_points or tcoords.shape[1] != 2 or
+            f3v.shape[0] != n_points or f3v.shape[1] != 3):
+        raise ValueError('tcoords and f3v must have a row of 2 and 3 values '
+                         'for each of the {} points'.format(n_points))
+    if shade == SHADE_BLINNPHONG and rgb_out is not None:
+        if (normals.shape[0] != n_points or normals.shape[1] != 3 or
+                eye.shape[0] != n_points or eye.shape[1] != 3):
+            raise ValueError('normals and eye must have shape '
+                             '({}, 3)'.format(n_points))
+    if rgb_out is not None and (texture.shape[0] == 0 or
+                                texture.shape[1] == 0 or
+                                texture.shape[2] != 3):
+        raise ValueError('texture must have shape (height, width, 3)')
+    if ((rgb_out is not None and (rgb_out.shape[0] != height or
+                                  rgb_out.shape[1] != width or
+                                  rgb_out.shape[2] != 3)) or
+            (f3v_out is not None and (f3v_out.shape[0] != height or
+                                      f3v_out.shape[1] != width or
+                                      f3v_out.shape[2] != 3))):
+        raise ValueError('rgb_out and f3v_out must have shape '
+                         '({}, {}, 3)'.format(height, width))
+    if max_index(trilist) >= n_points:
+        raise ValueError('trilist indexes points beyond the {} '
+                         'given'.format(n_points))
+    cdef bint write_rgb = rgb_out is not None
+    cdef bint write_f3v = f3v_out is not None
+    cdef float light[3]
+    for i in range(3):
+        light[i] = light_position[i]
+
+    cdef int n_tris = trilist.shape[0]
+    cdef triangle* triangles = <triangle*> malloc(
+        max(n_tris, 1) * sizeof(triangle))
+    if triangles == NULL:
+        raise MemoryError()
+    cdef int n_tiles_x = (width + tile_size - 1) // tile_size
+    cdef int n_tiles = n_tiles_x * ((height + tile_size - 1) // tile_size)
+    # the triangles of tile i are bins[offsets[i]:offsets[i + 1]], in order
+    cdef int* offsets = <int*> calloc(n_tiles + 1, sizeof(int))
+    cdef int* bins = NULL
+    cdef int* cursors = NULL
+    cdef const triangle* t
+    try:
+        if offsets == NULL:
+            raise MemoryError()
+        with nogil:
+            for i in prange(n_tris, schedule='static'):
+                setup_triangle(&triangles[i], clip, trilist, i, width,
+                               height)
+            for i in range(n_tris):
+                t = &triangles[i]
+                if t.area == 0:
+                    continue
+                for row in range(t.y0 // tile_size, t.y1 // tile_size + 1):
+                    for col in range(t.x0 // tile_size,
+                                     t.x1 // tile_size + 1):
+                        offsets[row * n_tiles_x + col + 1] += 1
+            for tile in range(n_tiles):
+                offsets[tile + 1] += offsets[tile]
+        bins = <int*> malloc(max(offsets[n_tiles], 1) * sizeof(int))
+        cursors = <int*> malloc(max(n_tiles, 1) * sizeof(int))
+        if bins == NULL or cursors == NULL:
+            raise MemoryError()
+        with nogil:
+            memcpy(cursors, offsets, n_tiles * sizeof(int))
+            for i in range(n_tris):
+                t = &triangles[i]
+                if t.area == 0:
+                    continue
+                for row in range(t.y0 // tile_size, t.y1 // tile_size + 1):
+                    for col in range(t.x0 // tile_size,
+                                     t.x1 // tile_size + 1):
+                        tile = row * n_tiles_x + col
+                        bins[cursors[tile]] = i
+                        cursors[tile] += 1
+            for tile in prange(n_tiles, schedule='dynamic'):
+                tx = (tile % n_tiles_x) * tile_size
+                ty = (tile // n_tiles_x) * tile_size
+                rasterize_tile(triangles, bins + offsets[tile],
+                               offsets[tile + 1] - offsets[tile], tx, ty,
+                               min(tx + tile_size, width) - 1,
+                               min(ty + tile_size, height) - 1,
+                               tcoords, f3v, normals, eye, texture,
+                               linear, repeat, shade, light,
+                               rgb_out, f3v_out, depth_out,
+                               write_rgb, write_f3v)
+    finally:
+        free(triangles)
+        free(offsets)
+        free(bins)
+        free(cursors)
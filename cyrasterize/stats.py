@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+# the stages of a rasterization that are timed when profiling. The draw is
+# timed on the GPU, the rest by the wall clock.
+STAGES = ('upload_mesh', 'upload_texture', 'draw', 'readback', 'postprocess')
+
+# the upper bounds (in seconds) of the buckets the timings of each stage are
+# counted in. The last bucket is unbounded.
+TIMING_BUCKETS = (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2,
+                  5e-2, 0.1, 0.25, 0.5, 1.0, float('inf'))
+
+
+class StageTimings(object):
+    r"""A histogram of the time taken by one stage of rendering.
+
+    Parameters
+    ----------
+    buckets : sequence of `float`
+        The increasing upper bounds (in seconds) of the histogram buckets.
+    """
+    def __init__(self, buckets=TIMING_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def record(self, seconds):
+        r"""Counts one timing of the stage."""
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        r"""The timings as a `dict` of plain numbers, with the histogram as
+        a list of ``(upper_bound, count)`` pairs.
+        """
+        return {'count': self.count,
+                'total': self.total,
+                'mean': self.total / self.count if self.count else 0.0,
+                'min': self.min if self.count else 0.0,
+                'max': self.max,
+                'histogram': list(zip(self.buckets, self.counts))}
+
+
+class RenderStats(object):
+    r"""Timings and data volumes gathered while a rasterizer is profiling.
+
+    Each stage (see :data:`STAGES`) keeps a histogram of its timings, and the
+    bytes uploaded to and read back from the GPU are counted.
+
+    Parameters
+    ----------
+    buckets : sequence of `float`, optional
+        The upper bounds (in seconds) of the timing histogram buckets.
+    """
+    def __init__(self, buckets=TIMING_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        r"""Forgets everything recorded so far."""
+        self.stages = dict((stage, StageTimings(self.buckets))
+                           for stage in STAGES)
+        self.bytes_uploaded = 0
+        self.bytes_read_back = 0
+
+    def record(self, stage, seconds):
+        r"""Records that ``stage`` took ``seconds``."""
+        self.stages[stage].record(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        r"""Times the body of a ``with`` statement as ``stage``."""
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.record(stage, default_timer() - start)
+
+    def summary(self):
+        r"""Everything recorded as a `dict` of plain Python values, e.g. to
+        feed to a monitoring system.
+
+        Returns
+        -------
+        summary : `dict`
+            ``'stages'`` maps each stage to its timings (see
+            :meth:`StageTimings.summary`), ``'bytes_uploaded'`` and
+            ``'bytes_read_back'`` are the totals transferred.
+        """
+        return {'stages': dict((stage, timings.summary())
+                               for stage, timings in self.stages.items()),
+                'bytes_uploaded': self.bytes_uploaded,
+                'bytes_read_back': self.bytes_read_back}
@@ -1,13 +1,30 @@
 import numpy as np
 import os
 import sys
-from cyrasterize import CyRasterizer
+from cyrasterize import (CPURasterizer, CyRasterizer, RasterizerPool,
+                         interpolate_barycentric)
+from cyrasterize.parallel import render_dataset
 from numpy.testing import assert_allclose
 
 SHADER_BASEPATH = os.path.join(os.path.dirname(sys.modules['cyrasterize'].__file__), 'shaders', 'texture_shader')
 DEFAULT_VERTEX_SHADER_SRC = open(SHADER_BASEPATH + '.vert', 'rt').read()
 DEFAULT_FRAGMENT_SHADER_SRC = open(SHADER_BASEPATH + '.frag', 'rt').read()
 
+# the square that fills the image, quads covering its left and top halves
+# and one that isn't flat, so the f3v and depth vary across it
+SQUARE = [[-1, -1, 0], [1, -1, 0], [1, 1, 0], [-1, 1, 0]]
+LEFT_HALF = [[-1, -1, 0], [0, -1, 0], [0, 1, 0], [-1, 1, 0]]
+TOP_HALF = [[-1, 0, 0], [1, 0, 0], [1, 1, 0], [-1, 1, 0]]
+SKEWED = [[-1, -1, 0], [1, -1, 0], [1, 1, 0], [-0.5, 0.5, 0.5]]
+
+
+def _quad(points=SQUARE):
+    # the points, trilist, a random 100x100 texture and the tcoords of a quad
+    # that the whole texture is mapped onto
+    return (np.array(points), np.array([[0, 1, 2], [2, 3, 0]]),
+            np.random.uniform(size=(100, 100, 3)),
+            np.array([[0, 0], [1, 0], [1, 1], [0, 1]]))
+
 
 def test_basic_random():
     c = CyRasterizer(width=100, height=100)
@@ -23,3 +40,659 @@ def test_basic_random():
     rgb_image, float_image, mask = c.rasterize(points, trilist, colours, tcoords)
 
     assert_allclose(rgb_image, colours)
+
+
+def test_uploaded_mesh_matches_immediate():
+    c = CyRasterizer(width=100, height=100)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    points, trilist, colours, tcoords = _quad()
+
+    expected = c.rasterize(points, trilist, colours, tcoords)
+
+    mesh = c.upload_mesh(points, trilist, tcoords)
+    for _ in range(2):
+        for a, b in zip(c.rasterize(mesh, texture=colours), expected):
+            assert_allclose(a, b)
+    mesh.free()
+
+
+def test_texture_cache_reuses_uploads():
+    c = CyRasterizer(width=100, height=100, texture_cache_bytes=1024 ** 2)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    points, trilist, colours, tcoords = _quad()
+    other_colours = np.random.uniform(size=(100, 100, 3))
+
+    cache = c._opengl.texture_cache
+    c.rasterize(points, trilist, colours, tcoords)
+    assert len(cache) == 0
+    for _ in range(2):
+        rgb_image, _, _ = c.rasterize(points, trilist, colours, tcoords,
+                                      texture_key='colours')
+        assert_allclose(rgb_image, colours)
+    assert len(cache) == 1
+
+    rgb_image, _, _ = c.rasterize(points, trilist, other_colours, tcoords,
+                                  texture_key='other_colours')
+    assert_allclose(rgb_image, other_colours)
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+
+    c.clear_texture_cache()
+    assert len(cache) == 0
+
+
+def test_samplers_are_reused():
+    c = CyRasterizer(width=100, height=100)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    points, trilist, colours, tcoords = _quad()
+
+    samplers = c._opengl.samplers
+    for _ in range(3):
+        c.rasterize(points, trilist, colours, tcoords)
+    assert len(samplers) == 1
+
+    c.set_texture_sampling(filter='linear', wrap='repeat')
+    c.rasterize(points, trilist, colours, tcoords)
+    c.set_texture_sampling()
+    c.rasterize(points, trilist, colours, tcoords)
+    assert len(samplers) == 2
+
+
+def test_rasterize_async_matches_sync():
+    c = CyRasterizer(width=100, height=100)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    points, trilist, _, tcoords = _quad()
+    textures = [np.random.uniform(size=(100, 100, 3)) for _ in range(4)]
+
+    mesh = c.upload_mesh(points, trilist, tcoords)
+    # more frames than readback buffers, so the ring has to wrap
+    futures = [c.rasterize_async(mesh, texture=t) for t in textures]
+    for future, texture in zip(futures, textures):
+        rgb_image, _, mask = future.result()
+        assert future.done()
+        assert_allclose(rgb_image, texture)
+        assert mask.all()
+
+
+def test_selected_outputs_match_full_rasterization():
+    c = CyRasterizer(width=100, height=100)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    # only covers the left half of the image
+    points, trilist, colours, tcoords = _quad(LEFT_HALF)
+
+    rgb_image, f3v_image, mask = c.rasterize(points, trilist, colours, tcoords)
+    mask_only, = c.rasterize(points, trilist, colours, tcoords,
+                             outputs=('mask',))
+    f3v_only, depth = c.rasterize(points, trilist, colours, tcoords,
+                                  outputs=('f3v', 'depth'))
+
+    assert_allclose(mask_only, mask)
+    assert_allclose(f3v_only[mask], f3v_image[mask])
+    assert np.all(depth[~mask] == 1)
+    assert np.all(depth[mask] < 1)
+
+
+def test_alpha_mask_matches_depth_mask():
+    points, trilist, colours, tcoords = _quad(LEFT_HALF)
+    expected = CyRasterizer(width=100, height=100).rasterize(
+        points, trilist, colours, tcoords)
+
+    c = CyRasterizer(width=100, height=100, alpha_mask=True)
+    rgb_image, f3v_image, mask = c.rasterize(points, trilist, colours,
+                                             tcoords)
+    assert mask[:, :45].all() and not mask[:, 55:].any()
+    for a, b in zip((rgb_image, f3v_image, mask), expected):
+        assert_allclose(a, b)
+
+
+def test_custom_projection_uniform_renders_right_way_up():
+    c = CyRasterizer(width=100, height=100)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    # only covers the top half of the image
+    points, trilist, colours, tcoords = _quad(TOP_HALF)
+
+    expected = c.rasterize(points, trilist, colours, tcoords)
+    # a shader that projects through a uniform of its own
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC.replace(
+        'projectionMatrix', 'clipMatrix'))
+    c.uniforms.clipMatrix = np.eye(4, dtype=np.float32)
+    rgb_image, f3v_image, mask = c.rasterize(points, trilist, colours,
+                                             tcoords)
+
+    assert mask[:45].all() and not mask[55:].any()
+    for a, b in zip((rgb_image, f3v_image, mask), expected):
+        assert_allclose(a, b)
+
+
+def test_rasterize_into_preallocated_buffers():
+    c = CyRasterizer(width=100, height=100)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    # only covers the top half of the image
+    points, trilist, colours, tcoords = _quad(TOP_HALF)
+
+    rgb = np.empty((100, 100, 3), dtype=np.float32)
+    f3v = np.empty((100, 100, 3), dtype=np.float32)
+    mask = np.empty((100, 100), dtype=bool)
+    images = c.rasterize(points, trilist, colours, tcoords,
+                         out=(rgb, f3v, mask))
+    assert images[0] is rgb and images[1] is f3v and images[2] is mask
+
+    expected = c.rasterize(points, trilist, colours, tcoords)
+    assert_allclose(rgb, expected[0])
+    assert_allclose(f3v, expected[1])
+    assert mask[:50].all() and not mask[50:].any()
+
+
+def test_uint8_texture_and_framebuffer():
+    c = CyRasterizer(width=100, height=100, rgb_dtype=np.uint8)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    points, trilist, _, tcoords = _quad()
+    colours = np.random.randint(0, 256, size=(100, 100, 3)).astype(np.uint8)
+
+    rgb_image, _, mask = c.rasterize(points, trilist, colours, tcoords)
+    assert rgb_image.dtype == np.uint8
+    assert_allclose(rgb_image, colours)
+    assert mask.all()
+
+
+def test_rasterize_views_matches_rasterize():
+    c = CyRasterizer(width=100, height=100)
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC, fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    points, trilist, colours, tcoords = _quad()
+
+    # slide the quad across the image
+    views = np.tile(np.eye(4), (3, 1, 1))
+    views[:, 0, 3] = [-1, 0, 0.5]
+
+    mesh = c.upload_mesh(points, trilist, tcoords)
+    rgb_images, f3v_images, masks = c.rasterize_views(mesh, views,
+                                                      texture=colours)
+    assert rgb_images.shape == (3, 100, 100, 3)
+    assert masks.shape == (3, 100, 100)
+    for view, rgb_image, f3v_image, mask in zip(views, rgb_images,
+                                                f3v_images, masks):
+        c.set_view_matrix(view)
+        expected = c.rasterize(mesh, texture=colours)
+        assert_allclose(rgb_image, expected[0])
+        assert_allclose(f3v_image, expected[1])
+        assert_allclose(mask, expected[2])
+
+
+def test_layered_rasterize_views_matches_sequential():
+    c = CyRasterizer(width=100, height=100)
+
+    points, trilist, colours, tcoords = _quad()
+
+    # more views than fit in one layered draw
+    views = np.tile(np.eye(4), (130, 1, 1))
+    views[:, 0, 3] = np.linspace(-1, 1, 130)
+
+    mesh = c.upload_mesh(points, trilist, tcoords)
+    expected = c.rasterize_views(mesh, views, texture=colours)
+    layered = c.rasterize_views(mesh, views, texture=colours, layered=True)
+    for image, expected_image in zip(layered, expected):
+        assert_allclose(image, expected_image)
+
+
+def _render_textured_square(rasterizer, texture):
+    rasterizer.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC,
+                           fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+    points, trilist, _, tcoords = _quad()
+    return rasterizer.rasterize(points, trilist, texture, tcoords)
+
+
+def test_rasterizer_pool_renders_jobs_on_every_context():
+    textures = [np.random.uniform(size=(100, 100, 3)) for _ in range(8)]
+    with RasterizerPool(2, width=100, height=100) as pool:
+        futures = [pool.submit(_render_textured_square, t) for t in textures]
+        for future, texture in zip(futures, textures):
+            rgb_image, _, mask = future.result()
+            assert_allclose(rgb_image, texture)
+            assert mask.all()
+
+
+def test_interleaved_rasterizers_keep_their_own_contexts():
+    a = CyRasterizer(width=100, height=100)
+    b = CyRasterizer(width=100, height=100)
+    points, trilist, colours, tcoords = _quad()
+    # a's mesh is uploaded while b's context is current, and freed (by the
+    # garbage collector) in the middle of b's work
+    mesh = a.upload_mesh(points, trilist, tcoords)
+    expected = b.rasterize(points, trilist, colours, tcoords)
+    assert_allclose(a.rasterize(mesh, texture=colours)[0], colours)
+    b_mesh = b.upload_mesh(points, trilist, tcoords)
+    del mesh
+    for x, y in zip(b.rasterize(b_mesh, texture=colours), expected):
+        assert_allclose(x, y)
+    b_mesh.free()
+
+
+def test_render_dataset_matches_rasterize_views():
+    points, trilist, _, tcoords = _quad()
+    meshes = [dict(points=points, trilist=trilist, tcoords=tcoords,
+                   texture=np.random.uniform(size=(100, 100, 3)))
+              for _ in range(3)]
+    views = np.tile(np.eye(4), (2, 1, 1))
+    views[:, 0, 3] = [0, 0.5]
+    cameras = [(view, np.eye(4)) for view in views]
+
+    rgb_images, masks = render_dataset(meshes, cameras, 2, width=100,
+                                       height=100)
+    assert rgb_images.shape == (3, 2, 100, 100, 3)
+
+    c = CyRasterizer(width=100, height=100)
+    for mesh, rgb_image, mask in zip(meshes, rgb_images, masks):
+        gl_mesh = c.upload_mesh(points, trilist, tcoords)
+        expected = c.rasterize_views(gl_mesh, views, texture=mesh['texture'],
+                                     outputs=('rgb', 'mask'))
+        assert_allclose(rgb_image, expected[0])
+        assert_allclose(mask, expected[1])
+
+
+def test_cpu_rasterizer_matches_opengl():
+    points, trilist, colours, tcoords = _quad(SKEWED)
+
+    c = CyRasterizer(width=100, height=100)
+    cpu = CPURasterizer(width=100, height=100)
+    for shaders, shading in [({}, 'blinnphong'),
+                             (dict(vertex=DEFAULT_VERTEX_SHADER_SRC,
+                                   fragment=DEFAULT_FRAGMENT_SHADER_SRC),
+                              'texture')]:
+        if shaders:
+            c.set_shaders(**shaders)
+        cpu.shading = shading
+        expected = c.rasterize(points, trilist, colours, tcoords,
+                               outputs=('rgb', 'f3v', 'mask', 'depth'))
+        images = cpu.rasterize(points, trilist, colours, tcoords,
+                               outputs=('rgb', 'f3v', 'mask', 'depth'))
+        assert_allclose(images[2], expected[2])
+        for image, gl_image in zip(images[:2] + images[3:],
+                                   expected[:2] + expected[3:]):
+            assert_allclose(image[expected[2]], gl_image[expected[2]],
+                            atol=1e-4)
+
+
+def test_cpu_rasterizer_known_pixels():
+    # a quad over the left half of a 4x2 image - no OpenGL context needed
+    points, trilist, _, tcoords = _quad(LEFT_HALF)
+    texture = np.tile(np.array([0.25, 0.5, 0.75]), (2, 2, 1))
+
+    cpu = CPURasterizer(width=4, height=2, shading='texture')
+    rgb, f3v, mask, depth = cpu.rasterize(
+        points, trilist, texture, tcoords,
+        outputs=('rgb', 'f3v', 'mask', 'depth'))
+    assert mask[:, :2].all() and not mask[:, 2:].any()
+    assert_allclose(rgb[:, :2], texture[:, :2])
+    assert_allclose(rgb[:, 2:], 1)
+    # pixel centres, top row first
+    assert_allclose(f3v[:, :2], [[[-0.75, 0.5, 0], [-0.25, 0.5, 0]],
+                                 [[-0.75, -0.5, 0], [-0.25, -0.5, 0]]])
+    assert_allclose(depth, [[0.5, 0.5, 1, 1], [0.5, 0.5, 1, 1]])
+
+    # the default shading doesn't need normals unless rgb is wanted
+    cpu.shading = 'blinnphong'
+    only_mask, = cpu.rasterize(points, trilist, texture, tcoords,
+                               outputs=('mask',))
+    assert_allclose(only_mask, mask)
+
+    for bad_trilist, bad_tcoords in [(trilist + 1, tcoords),
+                                     (trilist, tcoords[:3])]:
+        try:
+            cpu.rasterize(points, bad_trilist, texture, bad_tcoords)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('invalid meshes should raise ValueError')
+
+
+def test_barycentric_interpolation_matches_f3v():
+    c = CyRasterizer(width=100, height=100)
+    points, trilist, colours, tcoords = _quad(SKEWED)
+
+    _, f3v, mask = c.rasterize(points, trilist, colours, tcoords)
+    triangle_index, barycentric = c.rasterize_barycentric(points, trilist)
+
+    assert_allclose(triangle_index >= 0, mask)
+    assert np.all(triangle_index[mask] < trilist.shape[0])
+    assert_allclose(barycentric[mask].sum(axis=-1), 1, atol=1e-5)
+    image = interpolate_barycentric(points, trilist, triangle_index,
+                                    barycentric)
+    assert_allclose(image[mask], f3v[mask], atol=1e-4)
+
+
+def test_positions_only_mesh_renders_barycentric():
+    c = CyRasterizer(width=100, height=100)
+    points, trilist, _, _ = _quad(SKEWED)
+    points = points.astype(np.float32)
+    trilist = trilist.astype(np.uint32)
+
+    expected = c.rasterize_barycentric(points, trilist)
+    # neither the normals, f3v data nor tcoords get a buffer
+    mesh = c._opengl.upload_mesh(points, None, None, trilist, None,
+                                 with_normals=False)
+    for a, b in zip(c.rasterize_barycentric(mesh), expected):
+        assert_allclose(a, b)
+    try:
+        mesh.update(tcoords=np.zeros((4, 2), dtype=np.float32))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Updated tcoords that were never uploaded')
+    mesh.free()
+
+
+def test_profiling_counts_every_stage():
+    c = CyRasterizer(width=100, height=100, profile=True)
+    points, trilist, colours, tcoords = _quad()
+
+    c.rasterize(points, trilist, colours, tcoords)
+    stats = c.stats()
+    for stage in ('upload_mesh', 'upload_texture', 'draw', 'postprocess'):
+        assert stats['stages'][stage]['count'] == 1
+    # the rgb, f3v and (for the mask) depth framebuffers
+    assert stats['stages']['readback']['count'] == 3
+    assert stats['bytes_read_back'] == 7 * 100 * 100 * 4
+    # at least the float32 texture
+    assert stats['bytes_uploaded'] >= 100 * 100 * 3 * 4
+
+    c.reset_stats()
+    assert c.stats()['stages']['draw']['count'] == 0
+
+
+def test_gl_calls_are_only_traced_in_debug_builds():
+    import logging
+    from cyrasterize import glrasterizer
+    points, trilist, colours, tcoords = _quad()
+    c = CyRasterizer(width=100, height=100)
+
+    messages = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())
+    root = logging.getLogger()
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    try:
+        c.rasterize(points, trilist, colours, tcoords)
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+    # the tracing wrappers log every call
+    traced = any('GL gl' in message for message in messages)
+    assert traced == glrasterizer.GL_DEBUG_BUILD
+
+
+def test_other_threads_run_while_rendering():
+    import threading
+    points, trilist, colours, tcoords = _quad()
+    c = CyRasterizer(width=100, height=100)
+    mesh = c.upload_mesh(points, trilist, tcoords)
+    views = np.tile(np.eye(4), (64, 1, 1))
+    expected = c.rasterize(mesh, texture=colours)
+
+    # the GIL is released while drawing and reading back
+    ticks = [0]
+    started = threading.Event()
+    done = threading.Event()
+
+    def tick():
+        started.set()
+        while not done.is_set():
+            ticks[0] += 1
+    thread = threading.Thread(target=tick)
+    thread.start()
+    started.wait()
+    try:
+        # only the ticks made while the views are rendered count
+        before = ticks[0]
+        rgb_images, f3v_images, masks = c.rasterize_views(mesh, views,
+                                                          texture=colours)
+        after = ticks[0]
+    finally:
+        done.set()
+        thread.join()
+    assert after > before
+    for image, expected_image in zip((rgb_images[-1], f3v_images[-1],
+                                      masks[-1]), expected):
+        assert_allclose(image, expected_image)
+
+
+def test_benchmark_case_reports_throughput():
+    from cyrasterize.benchmarks import BASELINE, run_case
+    config = dict(BASELINE, n_vertices=100, resolution=(64, 64),
+                  texture_size=16, n_views=2)
+    result = run_case(CyRasterizer(width=64, height=64), config, n_frames=2)
+    assert result['frames_per_second'] > 0
+    assert result['readback_mb_per_s'] > 0
+    assert result['resolution'] == [64, 64]
+    assert 'rss_increase_mb' in result
+
+
+def test_vertex_normals_sum_every_shared_triangle():
+    from cyrasterize.normals import NormalsCache, vertex_normals
+    # a pyramid - the apex is shared by all four sides
+    points = np.array([[0, 0, 1], [-1, -1, 0], [1, -1, 0], [1, 1, 0],
+                       [-1, 1, 0]], dtype=np.float32)
+    trilist = np.array([[0, 1, 2], [0, 2, 3], [0, 3, 4], [0, 4, 1]])
+    tris = points[trilist]
+    n = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    n /= np.sqrt((n ** 2).sum(axis=1))[:, None]
+    expected = np.zeros_like(points)
+    for i in range(3):
+        np.add.at(expected, trilist[:, i], n)
+    expected /= np.sqrt((expected ** 2).sum(axis=1))[:, None]
+
+    normals = vertex_normals(points, trilist)
+    assert_allclose(normals, expected, atol=1e-6)
+    assert_allclose(normals[0], [0, 0, 1], atol=1e-6)
+
+    cache = NormalsCache(1)
+    assert cache.get('pyramid', points, trilist) is \
+        cache.get('pyramid', points, trilist)
+
+
+def test_normals_follow_points_edited_in_place():
+    # a pyramid seen from above, lit from the camera, with enough unused
+    # points that a fingerprint of the array wouldn't sample every value
+    points = np.zeros((3000, 3))
+    points[:5] = [[-1, -1, -0.5], [0, 0, -0.25], [1, -1, -0.5],
+                  [1, 1, -0.5], [-1, 1, -0.5]]
+    trilist = np.array([[1, 0, 2], [1, 2, 3], [1, 3, 4], [1, 4, 0]])
+    texture = np.ones((4, 4, 3))
+    tcoords = np.zeros((3000, 2))
+    cpu = CPURasterizer(width=20, height=20)
+    cpu.rasterize(points, trilist, texture, tcoords)
+
+    # by default the normals aren't cached, so none go stale
+    points[1, 2] = 0.5
+    rgb, _, _ = cpu.rasterize(points, trilist, texture, tcoords)
+    expected, _, _ = CPURasterizer(width=20, height=20).rasterize(
+        points.copy(), trilist, texture, tcoords)
+    assert_allclose(rgb, expected)
+
+
+def test_gpu_normals_match_cpu_normals():
+    from cyrasterize.benchmarks import synthetic_mesh
+    # a bumpy grid, so the (default, lit) shading depends on every normal
+    points, trilist, tcoords = synthetic_mesh(2500)
+    texture = np.random.uniform(size=(64, 64, 3)).astype(np.float32)
+    cpu = CyRasterizer(width=100, height=100)
+    gpu = CyRasterizer(width=100, height=100, gpu_normals=True)
+
+    expected = cpu.rasterize(points, trilist, texture, tcoords)
+    for a, b in zip(gpu.rasterize(points, trilist, texture, tcoords),
+                    expected):
+        assert_allclose(a, b, atol=1e-4)
+
+    # a deformed frame of the same mesh updates the mesh already uploaded
+    mesh = gpu._gpu_normals_mesh
+    moved = points * [0.5, 0.8, 2.0]
+    expected = cpu.rasterize(moved, trilist, texture, tcoords)
+    for a, b in zip(gpu.rasterize(moved, trilist, texture, tcoords),
+                    expected):
+        assert_allclose(a, b, atol=1e-4)
+    assert gpu._gpu_normals_mesh is mesh
+
+
+def test_mesh_update_matches_new_upload():
+    from cyrasterize.benchmarks import synthetic_mesh
+    points, trilist, tcoords = synthetic_mesh(2500)
+    moved = points * [0.5, 0.8, 2.0]
+    texture = np.random.uniform(size=(64, 64, 3)).astype(np.float32)
+    for gpu_normals in (False, True):
+        c = CyRasterizer(width=100, height=100, gpu_normals=gpu_normals)
+        expected = c.rasterize(moved, trilist, texture, tcoords)
+        mesh = c.upload_mesh(points, trilist, tcoords)
+        mesh.update(points=moved)
+        for a, b in zip(c.rasterize(mesh, texture=texture), expected):
+            assert_allclose(a, b, atol=1e-4)
+        mesh.free()
+
+
+def test_programs_are_compiled_once_and_saved():
+    import shutil
+    import tempfile
+    from cyrasterize import glrasterizer
+    points, trilist, colours, tcoords = _quad()
+    cache_dir = tempfile.mkdtemp()
+    try:
+        c = CyRasterizer(width=100, height=100, program_cache_dir=cache_dir)
+        programs = c._opengl.programs
+        shaded = c.rasterize(points, trilist, colours, tcoords)
+        c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC,
+                      fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+        n_compiled, n_linked = programs.n_compiled, programs.n_linked
+        # switching back and forth reuses both programs
+        for _ in range(2):
+            c.set_shaders(vertex=glrasterizer.DEFAULT_VERTEX_SHADER_SRC,
+                          fragment=glrasterizer.DEFAULT_FRAGMENT_SHADER_SRC)
+            for a, b in zip(c.rasterize(points, trilist, colours, tcoords),
+                            shaded):
+                assert_allclose(a, b)
+            c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC,
+                          fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+        assert programs.n_compiled == n_compiled
+        assert programs.n_linked == n_linked
+
+        if os.listdir(cache_dir):
+            # the driver supports program binaries - a new rasterizer loads
+            # the default program rather than compiling it
+            d = CyRasterizer(width=100, height=100,
+                             program_cache_dir=cache_dir)
+            assert d._opengl.programs.n_compiled == 0
+            assert d._opengl.programs.n_loaded == 1
+            for a, b in zip(d.rasterize(points, trilist, colours, tcoords),
+                            shaded):
+                assert_allclose(a, b)
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_set_shaders_can_drop_the_last_uniforms():
+    points, trilist, colours, tcoords = _quad()
+    c = CyRasterizer(width=100, height=100)
+    c.set_projection_matrix(np.diag([2, 2, 1, 1]))
+    c.set_shaders(vertex=DEFAULT_VERTEX_SHADER_SRC,
+                  fragment=DEFAULT_FRAGMENT_SHADER_SRC,
+                  use_last_uniforms=False)
+    # the zoom was dropped along with the other uniforms
+    _, f3v, mask = c.rasterize(points, trilist, colours, tcoords)
+    assert np.abs(f3v[..., :2]).max() > 0.9
+    assert_allclose(c.projection_matrix, np.eye(4))
+
+
+def test_named_programs_keep_their_uniforms():
+    points, trilist, colours, tcoords = _quad()
+    c = CyRasterizer(width=100, height=100)
+    shaded = c.rasterize(points, trilist, colours, tcoords)
+    c.add_program('textured', vertex=DEFAULT_VERTEX_SHADER_SRC,
+                  fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+    n_linked = c._opengl.programs.n_linked
+
+    # a zoom set on the textured program doesn't affect the default one
+    c.use_program('textured')
+    c.set_projection_matrix(np.diag([2, 2, 1, 1]))
+    c.use_program('default')
+    for _ in range(2):
+        for a, b in zip(c.rasterize(points, trilist, colours, tcoords,
+                                    program='default'), shaded):
+            assert_allclose(a, b)
+        _, f3v, mask = c.rasterize(points, trilist, colours, tcoords,
+                                   program='textured')
+        # only the middle half of the square is in view
+        assert mask.all()
+        assert np.abs(f3v[..., :2]).max() < 0.51
+    assert c._opengl.programs.n_linked == n_linked
+
+
+def test_added_programs_copy_the_uniforms_in_use():
+    points, trilist, colours, tcoords = _quad()
+    c = CyRasterizer(width=100, height=100)
+    c.add_program('textured', vertex=DEFAULT_VERTEX_SHADER_SRC,
+                  fragment=DEFAULT_FRAGMENT_SHADER_SRC)
+
+    # zooming the default program after the textured one was added leaves
+    # the textured program as it started out
+    c.set_projection_matrix(np.diag([2, 2, 1, 1]))
+    _, f3v, mask = c.rasterize(points, trilist, colours, tcoords,
+                               program='textured')
+    assert np.abs(f3v[..., :2]).max() > 0.9
+
+
+def test_camera_block_matches_separate_uniforms():
+    points, trilist, colours, tcoords = _quad()
+    views = np.array([np.diag([s, s, 1, 1]) for s in (0.5, 1, 2)],
+                     dtype=np.float32)
+    rasterizers = [CyRasterizer(width=100, height=100, camera_block=b)
+                   for b in (False, True)]
+    results = []
+    for c in rasterizers:
+        c.set_model_matrix(np.diag([0.8, 0.8, 1, 1]))
+        c.set_projection_matrix(np.diag([1, 1.5, 1, 1]))
+        mesh = c.upload_mesh(points, trilist, tcoords)
+        results.append(c.rasterize(mesh, texture=colours) +
+                       c.rasterize_views(mesh, views, texture=colours))
+        mesh.free()
+    for a, b in zip(*results):
+        assert_allclose(a, b)
+
+
+def test_set_camera_matches_separate_setters():
+    points, trilist, colours, tcoords = _quad()
+    model = np.diag([0.8, 0.8, 1, 1])
+    view = np.diag([0.5, 0.5, 1, 1])
+    projection = np.diag([1, 1.5, 1, 1])
+    eye = np.eye(4)
+    for camera_block in (False, True):
+        c = CyRasterizer(width=100, height=100, camera_block=camera_block)
+
+        def reset():
+            c.set_model_matrix(eye)
+            c.set_view_matrix(eye)
+            c.set_projection_matrix(eye)
+        c.set_model_matrix(model)
+        c.set_view_matrix(view)
+        c.set_projection_matrix(projection)
+        separate = c.rasterize(points, trilist, colours, tcoords)
+        reset()
+        c.set_camera(model, view, projection)
+        for a, b in zip(c.rasterize(points, trilist, colours, tcoords),
+                        separate):
+            assert_allclose(a, b)
+        reset()
+        for a, b in zip(c.rasterize(points, trilist, colours, tcoords,
+                                    model=model, view=view,
+                                    projection=projection), separate):
+            assert_allclose(a, b)
+        # the matrices persist, and those not given are left as they are
+        c.set_camera(view=view)
+        assert_allclose(c.projection_matrix, projection)
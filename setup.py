@@ -18,6 +18,13 @@ IS_LINUX = 'linux' in SYS_PLATFORM
 IS_OSX = 'darwin' == SYS_PLATFORM
 IS_UNIX = IS_LINUX or IS_OSX
 IS_CONDA = os.environ.get('CONDA_BUILD', False)
+# Route every OpenGL call through the tracing wrappers in c_opengl_debug.
+# This is very slow and so is only for debugging the GL code itself.
+GL_DEBUG = os.environ.get('CYRASTERIZE_GL_DEBUG', '0') == '1'
+# Build the headless context backends, which need libEGL/libOSMesa (and a
+# GLEW that can load functions from them).
+EGL = os.environ.get('CYRASTERIZE_EGL', '0') == '1'
+OSMESA = os.environ.get('CYRASTERIZE_OSMESA', '0') == '1'
 
 
 def walk_for_package_data(ext_pattern):
@@ -30,7 +37,7 @@ def walk_for_package_data(ext_pattern):
     return paths
 
 
-def gen_extension(path_name, sources):
+def gen_extension(path_name, sources, backends=False, openmp=False):
     kwargs = {
         'sources': sources,
         'include_dirs': INCLUDE_DIRS,
@@ -52,18 +59,42 @@ def gen_extension(path_name, sources):
             kwargs['include_dirs'] += [os.environ.get('LIBRARY_INC', '')]
             kwargs['library_dirs'] += [os.environ.get('LIBRARY_LIB', ''),
                                        os.environ.get('LIBRARY_BIN', '')]
+    if backends:
+        kwargs['define_macros'] = []
+        if EGL:
+            kwargs['define_macros'].append(('GLR_EGL', None))
+            kwargs['libraries'].append('EGL')
+        if OSMESA:
+            kwargs['define_macros'].append(('GLR_OSMESA', None))
+            kwargs['libraries'].append('OSMesa')
+    # parallel (prange) loops run serially where OpenMP isn't available, as
+    # with the Apple compilers
+    if openmp and IS_LINUX:
+        kwargs['extra_compile_args'] += ['-fopenmp']
+        kwargs['extra_link_args'] = ['-fopenmp']
+    if openmp and IS_WIN:
+        kwargs['extra_compile_args'] = ['/openmp']
     return Extension(path_name, **kwargs)
 
 
 cy_extensions = [
     gen_extension('cyrasterize.glrasterizer',
-                  [op.join('cyrasterize', 'cpp', 'glrglfw.cpp'),
+                  [op.join('cyrasterize', 'cpp', 'glrcontext.cpp'),
+                   op.join('cyrasterize', 'cpp', 'glrglfw.cpp'),
+                   op.join('cyrasterize', 'cpp', 'glregl.cpp'),
+                   op.join('cyrasterize', 'cpp', 'glrosmesa.cpp'),
                    op.join('cyrasterize', 'cpp', 'glr.cpp'),
-                   op.join('cyrasterize', 'glrasterizer.pyx')]),
+                   op.join('cyrasterize', 'glrasterizer.pyx')],
+                  backends=True),
     gen_extension('cyrasterize.shader',
                   [op.join('cyrasterize', 'shader.pyx')]),
     gen_extension('cyrasterize.c_opengl_debug',
-                  [op.join('cyrasterize', 'c_opengl_debug.pyx')])
+                  [op.join('cyrasterize', 'c_opengl_debug.pyx')]),
+    gen_extension('cyrasterize.softrasterizer',
+                  [op.join('cyrasterize', 'softrasterizer.pyx')],
+                  openmp=True),
+    gen_extension('cyrasterize.normals',
+                  [op.join('cyrasterize', 'normals.pyx')])
 ]
 
 
@@ -73,6 +104,7 @@ package_files += walk_for_package_data('*.h')
 package_files += walk_for_package_data('*.cpp')
 package_files += walk_for_package_data('*.frag')
 package_files += walk_for_package_data('*.vert')
+package_files += walk_for_package_data('*.geom')
 
 
 setup(
@@ -97,9 +129,14 @@ setup(
       'Programming Language :: Python :: 3.4',
       'Programming Language :: Python :: 3.5'
     ],
-    ext_modules=cythonize(cy_extensions, force=IS_CONDA),
+    # force a re-cythonize when the debug switch is given, as the generated
+    # code depends on it but the pyx files have not changed
+    ext_modules=cythonize(cy_extensions,
+                          force=IS_CONDA or 'CYRASTERIZE_GL_DEBUG' in os.environ,
+                          compile_time_env={'GL_DEBUG': GL_DEBUG}),
     packages=find_packages(),
     package_data={'cyrasterize': package_files},
     setup_requires=['numpy>=1.10'],
-    install_requires=['numpy>=1.10']
+    install_requires=['numpy>=1.10',
+                      'futures; python_version < "3"']
 )